@@ -3,10 +3,10 @@ from flask_cors import CORS
 import requests
 from datetime import datetime, date, timedelta
 import json
-from collections import defaultdict
 import os
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import atexit
 import uuid
 from functools import wraps
@@ -17,6 +17,21 @@ import hashlib
 # Import unified PermGuard module
 from permguard_auth import permguard_auth, require_permission, check_permission, get_auth_stats, get_auth_logs, get_permguard_status, get_traffic_stats, get_traffic_logs
 
+# Shared pooled client for upstream APIs
+from upstream_client import upstream_client, fetch_upstream_many, get_upstream_metrics
+
+# Unified game catalog
+from catalog_service import CatalogService, StoreCatalog
+from launcher_presence import LauncherPresence, DEFAULT_FLUSH_INTERVAL
+from launcher_events import LauncherEventBus, DEFAULT_WAIT_TIMEOUT
+from user_index import UserIndex
+from promo_index import PromoIndex, normalize_expiry, redemption_entries
+from promo_generator import PromoCodeGenerator, append_to_json_array, iter_csv
+from file_lock import FileLock
+from game_stats import PeriodAggregator, summarize_day, time_of, format_hour_range
+from game_events import GameEventStore
+from ttl_cache import CacheRegistry
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'swa-dev-secret-key-change-in-prod')
 CORS(app)
@@ -131,55 +146,121 @@ USERS_FILE = 'users.json'
 # Promo codes file
 PROMO_CODES_FILE = 'promo_codes.json'
 
-# Cache data structures
-data_cache = {
-    "stats": None,
-    "last_stats_update": 0,
-    "daily_data": {},  # Cache for daily data {date_str: data}
-    "last_daily_update": {},  # Last update for each day {date_str: timestamp}
-    "period_data": {
-        "7": None,  # Weekly data
-        "30": None  # Monthly data
-    },
-    "last_period_update": {
-        "7": 0,
-        "30": 0
-    },
-    "games": {
-        "free": None,
-        "premium": None
-    },
-    "last_games_update": {
-        "free": 0,
-        "premium": 0
-    }
-}
+# Per-user redemptions derived from the promo store, saved alongside it
+PROMO_REDEMPTIONS_FILE = 'promo_redemptions.json'
+
+# Most promo codes created by one bulk request
+PROMO_BULK_MAX_COUNT = 100000
+
+# Bulk batches up to this size also return their codes in the JSON response
+PROMO_BULK_INLINE_CODES = 100
 
 # Cache update period in seconds
 CACHE_LIFETIME = {
     "stats": 300,  # 5 minutes for main statistics
     "daily": 3600,  # 1 hour for daily data
-    "period": 7200,  # 2 hours for periods (week/month)
-    "games": 3600  # 1 hour for game data
+    "period": 7200  # 2 hours for periods (week/month)
 }
 
-# API URLs for games
-GAMES_API = {
-    "free": "https://swa-recloud.fun/static/games.json",  # Use an alternative working API if available
-    "premium": "https://swa-recloud.fun/static/game2.json"  # Use an alternative working API if available
+# Maximum age (seconds) of cached stats before handlers stop serving them
+STATS_MAX_STALE = int(os.environ.get('STATS_MAX_STALE', 3600))
+
+# Most days kept in the daily stats cache (any date can be requested through /api/game_stats)
+DAILY_CACHE_MAX_DAYS = 62
+
+# Maximum age (seconds) of expired game stats still served when a reload fails
+GAME_STATS_MAX_STALE = int(os.environ.get('GAME_STATS_MAX_STALE', 86400))
+
+# Window lengths (days) of the period statistics
+PERIOD_WINDOWS = (7, 30)
+
+# Cache data structures, bounded in size and age; metrics at /api/admin/upstream/stats
+caches = CacheRegistry()
+stats_cache = caches.create('stats', max_entries=1, ttl=CACHE_LIFETIME["stats"], max_stale=STATS_MAX_STALE)
+daily_cache = caches.create('daily', max_entries=DAILY_CACHE_MAX_DAYS, ttl=CACHE_LIFETIME["daily"],
+                            max_stale=GAME_STATS_MAX_STALE)  # {date_str: (data, DaySummary)}
+period_cache = caches.create('period', max_entries=2 * len(PERIOD_WINDOWS), ttl=CACHE_LIFETIME["period"],
+                             max_stale=GAME_STATS_MAX_STALE)  # {(days, today): (today's load time, result)}
+
+# Rolling weekly/monthly windows over the per-day summaries
+period_aggregator = PeriodAggregator(windows=PERIOD_WINDOWS)
+
+# Games-added events in per-day columns; past days are loaded once
+game_events = GameEventStore()
+
+# Stats served when nothing usable is cached
+DEFAULT_STATS = {
+    'daily_users': 0,
+    'total_users': 0,
+    'online_users': 0
 }
 
-# Cache for game data from the external API
-games_api_cache = {
-    "data": None,
-    "last_updated": 0,
-    "free_games": None,
-    "premium_games": None
+# Upstream statistics endpoints
+STATS_API = {
+    "online": "http://api.swa-recloud.fun/api/v3/info/online",
+    "users": "http://api.swa-recloud.fun/api/v3/info/users"
 }
 
+# Upstream game catalog endpoint
+GAMES_FETCH_API = "http://api.swa-recloud.fun/api/v3/fetch/"
+
 # Cache lifetime for game data (in seconds)
 GAMES_CACHE_LIFETIME = 3600  # 1 hour
 
+# Last good processed catalog, persisted after every successful refresh
+CATALOG_SNAPSHOT_FILE = os.environ.get('CATALOG_SNAPSHOT_FILE', 'catalog_snapshot.json')
+
+# Optional JSON list of placeholder name rules: [{"name", "pattern", "ignore_case"}]
+CATALOG_FILTER_RULES_FILE = os.environ.get('CATALOG_FILTER_RULES_FILE')
+
+# Single owner of the game catalog for admin pages, public APIs and session records
+catalog = CatalogService(
+    GAMES_FETCH_API,
+    CATALOG_SNAPSHOT_FILE,
+    lifetime=GAMES_CACHE_LIFETIME,
+    placeholder_rules=(load_json_file(CATALOG_FILTER_RULES_FILE) or None) if CATALOG_FILTER_RULES_FILE else None
+)
+
+# Store games sold through /api/games/purchase, keyed by 'free-NNN' / 'premium-NNN'
+store_catalog = StoreCatalog({
+    'free': os.path.join(os.path.dirname(__file__), 'games_free_backup.json'),
+    'premium': os.path.join(os.path.dirname(__file__), 'games_premium_backup.json')
+})
+
+# Seconds between writes of launcher heartbeats to the user store
+LAUNCHER_PRESENCE_FLUSH_INTERVAL = int(os.environ.get('LAUNCHER_PRESENCE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+
+# Serializes read-modify-write of the user store across threads and worker
+# processes, through a lock file next to users.json
+users_store_lock = FileLock(USERS_FILE + '.lock')
+
+# Answers launcher status/connection polls without reading users.json; heartbeats
+# are written back by a thread the first heartbeat of each process starts
+launcher_presence = LauncherPresence(USERS_FILE, lambda: get_users(), lambda users: save_users(users),
+                                     lock=users_store_lock, flush_interval=LAUNCHER_PRESENCE_FLUSH_INTERVAL)
+
+# Longest hold (seconds) of a /api/launcher/events long-poll; raise it only when
+# serving with threaded or async workers (gunicorn -k gthread / -k gevent)
+LAUNCHER_EVENTS_TIMEOUT = float(os.environ.get('LAUNCHER_EVENTS_TIMEOUT', DEFAULT_WAIT_TIMEOUT))
+
+# Pushes premium revocations, device disconnects and primary resets to waiting launchers
+launcher_events_bus = LauncherEventBus(check_for_changes=launcher_presence.ensure_current)
+launcher_presence.add_listener(launcher_events_bus.publish)
+
+# Counters and activity buckets for admin pages, refreshed on every save
+user_index = UserIndex(USERS_FILE, lambda: get_users())
+
+# Group membership and counts for the admin promo pages, refreshed on every save
+promo_index = PromoIndex(PROMO_CODES_FILE, lambda: get_promo_codes(), PROMO_REDEMPTIONS_FILE)
+
+# Random promo and launcher codes from the secrets CSPRNG
+code_generator = PromoCodeGenerator()
+
+# Serializes read-modify-write of the promo store across threads and worker
+# processes, through a lock file next to the store; a redemption holding it
+# takes users_store_lock second, so users.json writers must not take it
+promo_store_lock = FileLock(PROMO_CODES_FILE + '.lock')
+
 # Helper functions for promo codes
 def get_promo_codes():
     """Load promo codes from JSON file"""
@@ -194,23 +275,43 @@ def get_promo_codes():
     except (json.JSONDecodeError, FileNotFoundError):
         return []
 
-def save_promo_codes(promo_codes):
-    """Save promo codes to JSON file"""
-    with open(PROMO_CODES_FILE, 'w') as f:
-        json.dump(promo_codes, f, indent=4)
+def save_promo_codes(promo_codes, reindex=True):
+    """
+    Save promo codes to JSON file
+    
+    Callers that already applied their change to promo_index (add/update/remove)
+    pass reindex=False to skip the rebuild. If the write fails, the index is
+    rebuilt from the file that is still on disk before the error is raised.
+    """
+    temp_file = PROMO_CODES_FILE + '.tmp'
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(promo_codes, f, indent=4)
+        os.replace(temp_file, PROMO_CODES_FILE)
+    except Exception:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        if not reindex:
+            promo_index.sync(get_promo_codes())
+        raise
+    if reindex:
+        promo_index.sync(promo_codes)
+    else:
+        promo_index.mark_current()
+    promo_index.persist_redemptions()
 
 def generate_promo_code(length=14):
     """Generate a random promo code"""
-    chars = string.ascii_uppercase + string.digits
-    return ''.join(random.choice(chars) for _ in range(length))
+    return code_generator.token(length)
 
 def find_promo_code(code):
     """Find a promo code by its code"""
-    promo_codes = get_promo_codes()
-    for promo in promo_codes:
-        if promo['code'].upper() == code.upper():
-            return promo
-    return None
+    promo_id = promo_index.find(code)
+    if promo_id is None:
+        return None
+    return next((promo for promo in get_promo_codes() if promo.get('id') == promo_id), None)
 
 # Helper functions for user authentication
 def get_users():
@@ -281,6 +382,10 @@ def save_users(users):
         # Log error and re-raise
         print(f"Error saving users: {e}")
         raise
+    
+    # Keep the launcher presence table and admin aggregates in step with the store
+    launcher_presence.sync(users)
+    user_index.sync(users)
 
 def hash_password(password):
     """Hash a password for storing"""
@@ -369,12 +474,20 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def users_store_transaction(f):
+    """Decorator for routes and helpers that load, change and save users.json (holds users_store_lock)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with users_store_lock:
+            return f(*args, **kwargs)
+    return decorated_function
+
 def generate_launcher_code():
     """Generate a unique launcher connection code"""
     prefix = "SWA2"
     # Generate two blocks of 4 alphanumeric characters
-    block1 = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    block2 = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
+    block1 = code_generator.token(4)
+    block2 = code_generator.token(4)
     return f"{prefix}-{block1}-{block2}"
 
 def generate_unique_id(user_id):
@@ -389,6 +502,7 @@ def find_user_by_launcher_code(code):
             return user
     return None
 
+@users_store_transaction
 def add_or_update_device(user_id, device_id, device_name, device_os):
     """Add or update a device for a user"""
     users = get_users()
@@ -424,66 +538,136 @@ def add_or_update_device(user_id, device_id, device_name, device_os):
     
     return False
 
-def update_user_stats(user_id, game_id, playtime_minutes):
-    """Update user stats based on game session data"""
-    users = get_users()
-    for user in users:
-        if user['id'] == user_id:
-            # Initialize stats fields if they don't exist
-            if 'games_played' not in user:
-                user['games_played'] = 0
-            if 'total_play_time' not in user:
-                user['total_play_time'] = "0h 0m"
-            if 'game_sessions' not in user:
-                user['game_sessions'] = []
-            
-            # Update games played count
-            game_ids = [session['game_id'] for session in user.get('game_sessions', [])]
-            if game_id not in game_ids:
-                user['games_played'] += 1
-            
-            # Update total play time
-            current_time = user['total_play_time'].split('h ')
-            current_hours = int(current_time[0])
-            current_minutes = int(current_time[1].replace('m', ''))
-            
-            total_minutes = current_hours * 60 + current_minutes + playtime_minutes
-            new_hours = total_minutes // 60
-            new_minutes = total_minutes % 60
-            user['total_play_time'] = f"{new_hours}h {new_minutes}m"
-            
-            # Get game data for recording session
-            games_data = get_games_data(force_update=False)
-            game_info = None
-            for game in games_data.values():
-                if game['id'] == game_id:
-                    game_info = game
-                    break
-            
-            # Create session record
-            session_record = {
-                'game_id': game_id,
-                'game_name': game_info['name'] if game_info else f"Game {game_id}",
-                'game_image': game_info['image'] if game_info else "",
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'duration': f"{playtime_minutes//60}h {playtime_minutes%60}m",
-                'date': datetime.now().strftime('%Y-%m-%d')
-            }
-            
-            # Add to game sessions
-            user['game_sessions'].append(session_record)
+# Most session events accepted per batch request
+LAUNCHER_SESSION_BATCH_MAX = 200
+
+# Client event ids remembered per user to make batch retries idempotent
+LAUNCHER_SESSION_IDS_KEPT = 1000
+
+def record_game_session(user, game_id, playtime_minutes, played_game_ids, timestamp=None):
+    """Apply one game session to a user record in place"""
+    timestamp = timestamp or datetime.now()
+    
+    # Initialize stats fields if they don't exist
+    if 'games_played' not in user:
+        user['games_played'] = 0
+    if 'total_play_time' not in user:
+        user['total_play_time'] = "0h 0m"
+    if 'game_sessions' not in user:
+        user['game_sessions'] = []
+    
+    # Update games played count
+    if game_id not in played_game_ids:
+        user['games_played'] += 1
+        played_game_ids.add(game_id)
+    
+    # Update total play time
+    current_time = user['total_play_time'].split('h ')
+    current_hours = int(current_time[0])
+    current_minutes = int(current_time[1].replace('m', ''))
+    
+    total_minutes = current_hours * 60 + current_minutes + playtime_minutes
+    new_hours = total_minutes // 60
+    new_minutes = total_minutes % 60
+    user['total_play_time'] = f"{new_hours}h {new_minutes}m"
+    
+    # Get game data for recording session
+    game_info, _ = catalog.get_game(game_id)
+    
+    # Create session record
+    session_record = {
+        'game_id': game_id,
+        'game_name': game_info.get('name', f"Game {game_id}") if game_info else f"Game {game_id}",
+        'game_image': game_info.get('image', "") if game_info else "",
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration': f"{playtime_minutes//60}h {playtime_minutes%60}m",
+        'date': timestamp.strftime('%Y-%m-%d')
+    }
+    
+    # Add to game sessions
+    user['game_sessions'].append(session_record)
+    
+    # Update last session
+    user['last_session'] = session_record
+
+def parse_session_event(event):
+    """Validate one launcher session event; returns (game_id, playtime, timestamp, event_id) or raises ValueError"""
+    if not isinstance(event, dict) or 'game_id' not in event or 'playtime' not in event:
+        raise ValueError('game_id and playtime are required')
+    
+    playtime = int(event['playtime'])  # playtime in minutes
+    if playtime < 0:
+        raise ValueError('playtime must not be negative')
+    
+    timestamp = None
+    if event.get('timestamp'):
+        timestamp = datetime.strptime(event['timestamp'], '%Y-%m-%d %H:%M:%S')
+    
+    event_id = event.get('event_id')
+    return str(event['game_id']), playtime, timestamp, str(event_id) if event_id is not None else None
+
+def ingest_session_events(user_id, device_id, events):
+    """
+    Apply a batch of launcher session events in one user store write
+    
+    Events carrying an event_id already applied for this user are skipped,
+    so a client can resend a batch after a timeout without double counting.
+    Returns {'found', 'applied', 'duplicates', 'rejected'}.
+    """
+    result = {'found': False, 'applied': 0, 'duplicates': [], 'rejected': []}
+    
+    with users_store_lock:
+        users = get_users()
+        user = next((u for u in users if u['id'] == user_id), None)
+        if user is None:
+            return result
+        result['found'] = True
+        
+        seen_ids = user.get('session_event_ids', [])
+        seen = set(seen_ids)
+        played_game_ids = {session['game_id'] for session in user.get('game_sessions', [])}
+        
+        for index, event in enumerate(events):
+            try:
+                game_id, playtime, timestamp, event_id = parse_session_event(event)
+            except (TypeError, ValueError) as e:
+                result['rejected'].append({'index': index, 'error': str(e)})
+                continue
             
-            # Update last session
-            user['last_session'] = session_record
+            if event_id is not None:
+                if event_id in seen:
+                    result['duplicates'].append(event_id)
+                    continue
+                seen.add(event_id)
+                seen_ids.append(event_id)
             
-            # Save changes
+            record_game_session(user, game_id, playtime, played_game_ids, timestamp)
+            result['applied'] += 1
+        
+        # Update device's last connection time in the same write
+        device_changed = False
+        if device_id:
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for device in user.get('devices', []):
+                if device['device_id'] == device_id and device.get('last_connection') != now:
+                    device['last_connection'] = now
+                    device_changed = True
+        
+        # A batch of duplicates or rejects for an unknown device changes nothing
+        if result['applied'] or device_changed:
+            user['session_event_ids'] = seen_ids[-LAUNCHER_SESSION_IDS_KEPT:]
             save_users(users)
-            return True
     
-    return False
+    return result
+
+def update_user_stats(user_id, game_id, playtime_minutes):
+    """Update user stats based on game session data"""
+    result = ingest_session_events(user_id, None, [{'game_id': game_id, 'playtime': playtime_minutes}])
+    return result['applied'] > 0
 
 # User authentication routes
 @app.route('/register', methods=['GET', 'POST'])
+@users_store_transaction
 def register():
     """User registration"""
     if request.method == 'POST':
@@ -601,6 +785,7 @@ def logout():
 
 @app.route('/profile')
 @login_required
+@users_store_transaction
 def profile():
     """User profile page"""
     user = find_user_by_id(session['user_id'])
@@ -815,11 +1000,13 @@ def profile():
                           slots_info=slots_info,
                           premium_history=premium_history,
                           expired_slots_info=expired_slots_info,
-                          available_slots=available_slots
+                          available_slots=available_slots,
+                          redeemed_promo_codes=promo_index.redeemed_by_user(user['id'])
                          )
 
 @app.route('/profile/update', methods=['POST'])
 @login_required
+@users_store_transaction
 def update_profile():
     """Update user profile"""
     user = find_user_by_id(session['user_id'])
@@ -886,6 +1073,7 @@ def update_profile():
 
 @app.route('/profile/password', methods=['POST'])
 @login_required
+@users_store_transaction
 def update_password():
     """Update user password"""
     user = find_user_by_id(session['user_id'])
@@ -928,6 +1116,7 @@ def update_password():
 
 @app.route('/profile/regenerate-code', methods=['POST'])
 @login_required
+@users_store_transaction
 def regenerate_launcher_code():
     """Regenerate a user's launcher connection code"""
     user = find_user_by_id(session['user_id'])
@@ -972,328 +1161,299 @@ def redeem_promo_code():
         flash('Please enter a promo code', 'error')
         return redirect(url_for('profile'))
     
-    # Find promo code
-    promo = find_promo_code(code)
-    if not promo:
-        flash('Promo code not found or already used', 'error')
-        return redirect(url_for('profile'))
-    
-    # Check if code is expired
-    if promo.get('expires_at'):
+    success, message = redeem_promo(session['user_id'], code)
+    flash(message, 'success' if success else 'error')
+    return redirect(url_for('profile'))
+
+def apply_promo_benefits(user, promo, code, timestamp):
+    """Grant the premium time and slots of a promo code to a user record"""
+    # Initialize premium history if it doesn't exist
+    if 'premium_history' not in user:
+        user['premium_history'] = []
+        
+    # Apply premium status if code gives it
+    if promo.get('gives_premium', False):
+        user['status'] = 'Premium'
+        
+        # Set premium source information
+        user['premium_source'] = f"Promo Code: {code}"
+        
+        # Set premium expiration based on duration
+        premium_duration = promo.get('premium_duration', 7)  # Default to permanent
+        
+        # Убедимся, что premium_duration - это число
+        if isinstance(premium_duration, str):
+            premium_duration = int(premium_duration)
+        
+        # Calculate expiration date based on duration value
+        if premium_duration < 7:  # Only set expiration if not permanent
+            premium_expiry = None
+            
+            if premium_duration == 1:  # 1 day
+                premium_expiry = datetime.now() + timedelta(days=1)
+            elif premium_duration == 2:  # 7 days
+                premium_expiry = datetime.now() + timedelta(days=7)
+            elif premium_duration == 3:  # 1 month
+                premium_expiry = datetime.now() + timedelta(days=30)
+            elif premium_duration == 4:  # 3 months
+                premium_expiry = datetime.now() + timedelta(days=90)
+            elif premium_duration == 5:  # 6 months
+                premium_expiry = datetime.now() + timedelta(days=180)
+            elif premium_duration == 6:  # 1 year
+                premium_expiry = datetime.now() + timedelta(days=365)
+            
+            if premium_expiry:
+                user['premium_expires_at'] = premium_expiry.strftime('%Y-%m-%d %H:%M:%S')
+                
+                # Add premium activation to history
+                user['premium_history'].append({
+                    'date': timestamp,
+                    'action': 'Premium Activated',
+                    'details': f"Activated via promo code '{code}'. Expires on {premium_expiry.strftime('%Y-%m-%d %H:%M:%S')}"
+                })
+        else:
+            # Remove any existing expiration for permanent premium
+            if 'premium_expires_at' in user:
+                del user['premium_expires_at']
+            
+            # Add permanent premium activation to history
+            user['premium_history'].append({
+                'date': timestamp,
+                'action': 'Premium Activated',
+                'details': f"Activated via promo code '{code}'. Never expires."
+            })
+        
+    # Add slots with duration
+    if promo.get('slots', 0) > 0:
+        slots_count = promo.get('slots', 0)
+        slots_duration_str = promo.get('slots_duration', '3')  # Default to 1 month (3)
+        
         try:
-            expires_at = datetime.strptime(promo['expires_at'], '%Y-%m-%d')
-            if expires_at < datetime.now():
-                flash('Promo code has expired', 'error')
-                return redirect(url_for('profile'))
-        except:
-            pass  # Ignore parse errors
-    
-    # Check if code has reached its usage limit
-    if promo.get('uses_limit') > 0 and promo.get('uses_count', 0) >= promo['uses_limit']:
-        flash('Promo code has reached its usage limit', 'error')
-        return redirect(url_for('profile'))
-    
-    # Check if user already redeemed this code
-    user_id = session['user_id']
-    if user_id in promo.get('redeemed_by', []):
-        flash('You have already used this promo code', 'error')
-        return redirect(url_for('profile'))
-    
-    # Apply promo code benefits
-    users = get_users()
-    for user in users:
-        if user['id'] == user_id:
-            # Record redemption timestamp and details for history
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            redemption_details = {
-                'promo_code': code,
-                'timestamp': timestamp,
-                'gave_premium': promo.get('gives_premium', False),
-                'premium_duration': promo.get('premium_duration', 7),
-                'gave_slots': promo.get('slots', 0),
-                'slots_duration': promo.get('slots_duration', 3)
+            slots_duration = int(slots_duration_str)
+        except (ValueError, TypeError):
+            slots_duration = 3 # fallback to 1 month
+
+        # Calculate expiration date based on duration value
+        slots_expiry = None
+        if slots_duration == 1:  # 1 day
+            slots_expiry = datetime.now() + timedelta(days=1)
+        elif slots_duration == 2:  # 7 days
+            slots_expiry = datetime.now() + timedelta(days=7)
+        elif slots_duration == 3:  # 1 month
+            slots_expiry = datetime.now() + timedelta(days=30)
+        elif slots_duration == 4:  # 3 months
+            slots_expiry = datetime.now() + timedelta(days=90)
+        elif slots_duration == 5:  # 6 months
+            slots_expiry = datetime.now() + timedelta(days=180)
+        elif slots_duration == 6:  # 1 year
+            slots_expiry = datetime.now() + timedelta(days=365)
+        elif slots_duration == 7:  # permanent
+            slots_expiry = None
+        
+        # Initialize slots structure if it doesn't exist
+        if not user.get('slots_info'):
+            user['slots_info'] = []
+        
+        # Add the slots activation to history
+        if slots_expiry:
+            user['premium_history'].append({
+                'date': timestamp,
+                'action': f"{slots_count} Slots Added",
+                'details': f"Added via promo code '{code}'. Expires on {slots_expiry.strftime('%Y-%m-%d %H:%M:%S')}"
+            })
+        else:
+            user['premium_history'].append({
+                'date': timestamp,
+                'action': f"{slots_count} Slots Added",
+                'details': f"Added via promo code '{code}'. Never expires."
+            })
+        
+        # Add the new slots with expiration
+        for _ in range(slots_count):
+            slot_info = {
+                'id': str(uuid.uuid4()),
+                'source': f"Promo code: {code}",
+                'created_at': timestamp,
+                'users_history': [],
+                'assigned_to': None,
+                'last_update': timestamp
             }
             
-            # Initialize premium history if it doesn't exist
-            if 'premium_history' not in user:
-                user['premium_history'] = []
-                
-            # Apply premium status if code gives it
-            if promo.get('gives_premium', False):
-                user['status'] = 'Premium'
-                
-                # Set premium source information
-                user['premium_source'] = f"Promo Code: {code}"
-                
-                # Set premium expiration based on duration
-                premium_duration = promo.get('premium_duration', 7)  # Default to permanent
-                
-                # Убедимся, что premium_duration - это число
-                if isinstance(premium_duration, str):
-                    premium_duration = int(premium_duration)
-                
-                # Calculate expiration date based on duration value
-                if premium_duration < 7:  # Only set expiration if not permanent
-                    premium_expiry = None
-                    
-                    if premium_duration == 1:  # 1 day
-                        premium_expiry = datetime.now() + timedelta(days=1)
-                    elif premium_duration == 2:  # 7 days
-                        premium_expiry = datetime.now() + timedelta(days=7)
-                    elif premium_duration == 3:  # 1 month
-                        premium_expiry = datetime.now() + timedelta(days=30)
-                    elif premium_duration == 4:  # 3 months
-                        premium_expiry = datetime.now() + timedelta(days=90)
-                    elif premium_duration == 5:  # 6 months
-                        premium_expiry = datetime.now() + timedelta(days=180)
-                    elif premium_duration == 6:  # 1 year
-                        premium_expiry = datetime.now() + timedelta(days=365)
-                    
-                    if premium_expiry:
-                        user['premium_expires_at'] = premium_expiry.strftime('%Y-%m-%d %H:%M:%S')
-                        
-                        # Add premium activation to history
-                        user['premium_history'].append({
-                            'date': timestamp,
-                            'action': 'Premium Activated',
-                            'details': f"Activated via promo code '{code}'. Expires on {premium_expiry.strftime('%Y-%m-%d %H:%M:%S')}"
-                        })
-                else:
-                    # Remove any existing expiration for permanent premium
-                    if 'premium_expires_at' in user:
-                        del user['premium_expires_at']
-                    
-                    # Add permanent premium activation to history
-                    user['premium_history'].append({
-                        'date': timestamp,
-                        'action': 'Premium Activated',
-                        'details': f"Activated via promo code '{code}'. Never expires."
-                    })
-                
-            # Add slots with duration
-            if promo.get('slots', 0) > 0:
-                slots_count = promo.get('slots', 0)
-                slots_duration_str = promo.get('slots_duration', '3')  # Default to 1 month (3)
-                
+            if slots_expiry:
+                slot_info['expires_at'] = slots_expiry.strftime('%Y-%m-%d %H:%M:%S')
+            
+            user['slots_info'].append(slot_info)
+        
+        # Filter out expired slots and create valid_slots list
+        valid_slots = []
+        now = datetime.now()
+        for slot in user['slots_info']:
+            if slot.get('expires_at'):
                 try:
-                    slots_duration = int(slots_duration_str)
-                except (ValueError, TypeError):
-                    slots_duration = 3 # fallback to 1 month
-
-                # Calculate expiration date based on duration value
-                slots_expiry = None
-                if slots_duration == 1:  # 1 day
-                    slots_expiry = datetime.now() + timedelta(days=1)
-                elif slots_duration == 2:  # 7 days
-                    slots_expiry = datetime.now() + timedelta(days=7)
-                elif slots_duration == 3:  # 1 month
-                    slots_expiry = datetime.now() + timedelta(days=30)
-                elif slots_duration == 4:  # 3 months
-                    slots_expiry = datetime.now() + timedelta(days=90)
-                elif slots_duration == 5:  # 6 months
-                    slots_expiry = datetime.now() + timedelta(days=180)
-                elif slots_duration == 6:  # 1 year
-                    slots_expiry = datetime.now() + timedelta(days=365)
-                elif slots_duration == 7:  # permanent
-                    slots_expiry = None
-                
-                # Initialize slots structure if it doesn't exist
-                if not user.get('slots_info'):
-                    user['slots_info'] = []
-                
-                # Add the slots activation to history
-                if slots_expiry:
-                    user['premium_history'].append({
-                        'date': timestamp,
-                        'action': f"{slots_count} Slots Added",
-                        'details': f"Added via promo code '{code}'. Expires on {slots_expiry.strftime('%Y-%m-%d %H:%M:%S')}"
-                    })
-                else:
-                    user['premium_history'].append({
-                        'date': timestamp,
-                        'action': f"{slots_count} Slots Added",
-                        'details': f"Added via promo code '{code}'. Never expires."
-                    })
-                
-                # Add the new slots with expiration
-                for _ in range(slots_count):
-                    slot_info = {
-                        'id': str(uuid.uuid4()),
-                        'source': f"Promo code: {code}",
-                        'created_at': timestamp,
-                        'users_history': [],
-                        'assigned_to': None,
-                        'last_update': timestamp
-                    }
-                    
-                    if slots_expiry:
-                        slot_info['expires_at'] = slots_expiry.strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    user['slots_info'].append(slot_info)
-                
-                # Filter out expired slots and create valid_slots list
-                valid_slots = []
-                now = datetime.now()
-                for slot in user['slots_info']:
-                    if slot.get('expires_at'):
-                        try:
-                            expires_at = datetime.strptime(slot['expires_at'], '%Y-%m-%d %H:%M:%S')
-                            if now > expires_at:
-                                continue  # Skip expired slots
-                        except Exception as e:
-                            print(f"Error parsing slot expiration: {e}")
-                    valid_slots.append(slot)
-                
-                # Update slots_info
-                if len(valid_slots) != len(user['slots_info']):
-                    user['slots_info'] = valid_slots
-                    
-                # Update the slots count instead of removing it
-                user['slots'] = len(valid_slots)
+                    expires_at = datetime.strptime(slot['expires_at'], '%Y-%m-%d %H:%M:%S')
+                    if now > expires_at:
+                        continue  # Skip expired slots
+                except Exception as e:
+                    print(f"Error parsing slot expiration: {e}")
+            valid_slots.append(slot)
+        
+        # Update slots_info
+        if len(valid_slots) != len(user['slots_info']):
+            user['slots_info'] = valid_slots
             
-            break
-    
-    # Update promo code usage
-    promo_codes = get_promo_codes()
-    for p in promo_codes:
-        if p['id'] == promo['id']:
-            # Increment usage counter
-            p['uses_count'] = p.get('uses_count', 0) + 1
+        # Update the slots count instead of removing it
+        user['slots'] = len(valid_slots)
+    
+
+def redeem_promo(user_id, code):
+    """
+    Redeem a promo code for a user as one transaction
+    
+    Expiry, the usage limit and the (promo_id, user_id) redemption set are
+    checked, and the user's benefits and the promo's redeemed_by entry are
+    applied, all under promo_store_lock, which other worker processes
+    honour too; the users are loaded and saved under users_store_lock as
+    well, so no other users.json writer can overwrite the benefits. The
+    checks read the promo as it is on disk under the lock.
+    Both stores are written before the lock is released, the promo store
+    first; if the user write then fails, the redemption is taken back out
+    of the promo store, so a code is never used up without its benefits.
+    Returns (success, message).
+    """
+    with promo_store_lock:
+        promo_id = promo_index.find(code)
+        promo_codes = get_promo_codes()
+        promo = next((p for p in promo_codes if p.get('id') == promo_id), None) if promo_id else None
+        if promo is None:
+            return False, 'Promo code not found or already used'
+        redeemers = [user for user, _ in redemption_entries(promo)]
+        
+        expires_at = normalize_expiry(promo.get('expires_at'))
+        if expires_at and expires_at < datetime.now().strftime('%Y-%m-%d %H:%M:%S'):
+            return False, 'Promo code has expired'
+        
+        uses_limit = promo.get('uses_limit', 0) or 0
+        if uses_limit > 0 and len(promo.get('redeemed_by', [])) >= uses_limit:
+            return False, 'Promo code has reached its usage limit'
+        
+        if user_id in redeemers or promo_index.has_redeemed(promo['id'], user_id):
+            return False, 'You have already used this promo code'
+        
+        # Always taken after promo_store_lock, never before it
+        with users_store_lock:
+            users = get_users()
+            user = next((u for u in users if u['id'] == user_id), None)
+            if user is None:
+                return False, 'User not found'
             
-            # Add user to redeemed list
-            if 'redeemed_by' not in p:
-                p['redeemed_by'] = []
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            apply_promo_benefits(user, promo, promo['code'], timestamp)
             
-            # Get user details to store in promo code
-            current_user = find_user_by_id(user_id)
-            user_data = {
+            redemption = {
                 'id': user_id,
-                'username': current_user.get('username', ''),
+                'username': user.get('username', ''),
                 'redeemed_at': timestamp,
                 'premium_given': promo.get('gives_premium', False),
                 'slots_given': promo.get('slots', 0)
             }
+            promo.setdefault('redeemed_by', []).append(redemption)
+            promo['uses_count'] = len(promo['redeemed_by'])
             
-            p['redeemed_by'].append(user_data)
-            break
+            # Commit both stores
+            promo_index.update(promo)
+            try:
+                save_promo_codes(promo_codes, reindex=False)
+                try:
+                    save_users(users)
+                except Exception:
+                    # The user got nothing: give the code back
+                    promo['redeemed_by'].remove(redemption)
+                    promo['uses_count'] = len(promo['redeemed_by'])
+                    promo_index.update(promo)
+                    save_promo_codes(promo_codes, reindex=False)
+                    raise
+            except Exception:
+                # Put the index back in line with whatever reached the disk
+                promo_index.sync(get_promo_codes())
+                raise
+    
+    return True, 'Promo code activated successfully!'
+
+def load_stats():
+    """Fetch statistics from upstream (stats_cache loader, background use only)"""
+    responses = fetch_upstream_many(STATS_API.values())
+    stats = merge_stats_responses(responses[STATS_API["online"]], responses[STATS_API["users"]])
+    if stats is None:
+        raise RuntimeError('No statistics endpoint answered')
+    return stats
+
+def merge_stats_responses(online_response, users_response):
+    """Cached statistics updated from fetched upstream responses, or None if neither is usable"""
+    if not online_response.ok and not users_response.ok:
+        print(f"[{datetime.now()}] Error fetching stats: {online_response.error}; {users_response.error}")
+        return None
     
-    # Save changes
-    save_users(users)
-    save_promo_codes(promo_codes)
+    # Keep the previous value for whichever endpoint failed
+    previous, _ = stats_cache.peek('stats')
+    stats = dict(previous or DEFAULT_STATS)
+    try:
+        if online_response.ok:
+            stats['online_users'] = online_response.data.get('total_online', 0)
+        if users_response.ok:
+            stats['daily_users'] = users_response.data.get('daily', {}).get('unique_visits', 0)
+            stats['total_users'] = users_response.data.get('total', {}).get('unique_visits', 0)
+    except (AttributeError, TypeError) as e:
+        print(f"[{datetime.now()}] Unexpected stats payload: {e}")
+        return None
+    return stats
+
+def apply_stats_responses(online_response, users_response):
+    """Store fetched upstream statistics in the cache"""
+    stats = merge_stats_responses(online_response, users_response)
+    if stats is None:
+        return False
     
-    flash('Promo code activated successfully!', 'success')
-    return redirect(url_for('profile'))
+    stats_cache.set('stats', stats)
+    return online_response.ok and users_response.ok
 
 def get_stats(force_update=False):
-    try:
-        # Fetch online users
-        online_response = requests.get('http://api.swa-recloud.fun/api/v3/info/online')
-        online_data = online_response.json() if online_response.status_code == 200 else {'total_online': 0}
-        
-        # Fetch user statistics
-        users_response = requests.get('http://api.swa-recloud.fun/api/v3/info/users')
-        users_data = users_response.json() if users_response.status_code == 200 else {
-            'daily': {'unique_visits': 0},
-            'total': {'unique_visits': 0}
-        }
-        
-        return {
-            'daily_users': users_data.get('daily', {}).get('unique_visits', 0),
-            'total_users': users_data.get('total', {}).get('unique_visits', 0),
-            'online_users': online_data.get('total_online', 0)
-        }
-    except Exception as e:
-        print(f"Error fetching stats: {e}")
-        return {
-            'daily_users': 0,
-            'total_users': 0,
-            'online_users': 0
-        }
-
-def get_games_data(access="free", force_update=False):
-    """Fetch and cache game data from external API for both free and premium games"""
-    current_time = time.time()
+    """Get cached statistics without waiting on the network (stale-while-revalidate)"""
+    if force_update:
+        stats_cache.load_async('stats', load_stats)
     
-    # Check if cache needs to be updated
-    if (data_cache["games"][access] is None or 
-            current_time - data_cache["last_games_update"][access] > CACHE_LIFETIME["games"] or 
-            force_update):
-        try:
-            # Use a background thread for updating so we don't block the user
-            threading.Thread(target=update_games_data, args=(access,), daemon=True).start()
-            
-            # If first time loading and no cache, use synchronous request with short timeout
-            if data_cache["games"][access] is None:
-                try:
-                    response = requests.get(GAMES_API[access], timeout=3)
-                    if response.ok:
-                        data_cache["games"][access] = response.json()
-                        data_cache["last_games_update"][access] = current_time
-                        print(f"[{datetime.now()}] Initialized {access} games data")
-                    else:
-                        # If API fails, try to load from local backup file
-                        data_cache["games"][access] = load_games_from_backup(access)
-                except Exception:
-                    # If request fails, try to load from backup without waiting
-                    data_cache["games"][access] = load_games_from_backup(access)
-        except Exception as e:
-            print(f"[{datetime.now()}] Error fetching {access} games data: {e}")
-            # Try to load from backup file
-            data_cache["games"][access] = load_games_from_backup(access)
+    # Served up to STATS_MAX_STALE old; past that the cache drops it
+    stats, age = stats_cache.peek('stats')
     
-    # Return cached data or empty dict if cache is still empty
-    return data_cache["games"][access] or {}
-
-def update_games_data(access):
-    """Update games data in background thread"""
-    try:
-        current_time = time.time()
-        
-        # Skip external API calls entirely
-        print(f"[{datetime.now()}] Using local game data for {access} games")
-        
-        # Load from backup file
-        games_data = load_games_from_backup(access)
-        
-        # If no backup exists, create one with sample data
-        if not games_data:
-            if access == "free":
-                games_data = create_sample_free_games()
-            else:
-                games_data = create_sample_premium_games()
-            
-            # Save to backup file
-            save_games_to_backup(access, games_data)
-        
-        # Update cache
-        data_cache["games"][access] = games_data
-        data_cache["last_games_update"][access] = current_time
-        
-        print(f"[{datetime.now()}] Background update completed for {access} games data")
-    except Exception as e:
-        print(f"[{datetime.now()}] Error in background update for {access} games: {e}")
+    # Revalidate in the background once the cached value is stale (one load at a time)
+    if stats is None or age > CACHE_LIFETIME["stats"]:
+        stats_cache.load_async('stats', load_stats)
+    
+    if stats is None:
+        return dict(DEFAULT_STATS)
+    
+    return dict(stats)
 
-def save_games_to_backup(access, data):
-    """Save games data to a backup file"""
-    backup_file = f"games_{access}_backup.json"
-    try:
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f)
-    except Exception as e:
-        print(f"[{datetime.now()}] Error saving games backup: {e}")
+def load_game_day(date_str):
+    """Load a day of game data and its summary (daily_cache loader)"""
+    # Get data from the server or use demo data if in demo mode
+    daily_data = get_game_data(date_str)
+    # Bucket the day's events once here instead of on every request
+    if game_events.has_day(date_str):
+        summary = game_events.summary(date_str)
+    else:
+        summary = summarize_day(daily_data, date_str)
+    print(f"[{datetime.now()}] Data updated for date: {date_str}")
+    return daily_data, summary
 
-def load_games_from_backup(access):
-    """Load games data from backup file"""
-    backup_file = f"games_{access}_backup.json"
+def _game_day(date_str, force_update=False):
+    """(data, DaySummary) of a date from daily_cache, loading it once when missing or expired"""
     try:
-        if os.path.exists(backup_file):
-            with open(backup_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        return daily_cache.get_or_load(date_str, lambda: load_game_day(date_str), force=force_update)
     except Exception as e:
-        print(f"[{datetime.now()}] Error loading games backup: {e}")
-    
-    # If backup loading fails, return empty dict
-    return {}
+        print(f"[{datetime.now()}] Error getting data for date {date_str}: {e}")
+        # Serve the expired copy if there is one
+        cached, _ = daily_cache.peek(date_str)
+        return cached or ({}, summarize_day({}, date_str))
 
 def get_game_added_stats(date_str=None, force_update=False):
     """Get game added stats for a specific date"""
@@ -1301,51 +1461,59 @@ def get_game_added_stats(date_str=None, force_update=False):
     if not date_str:
         date_str = datetime.now().strftime('%Y-%m-%d')
     
-    # Check if the cache needs to be updated for this date
-    if (date_str not in data_cache["daily_data"] or 
-            date_str not in data_cache["last_daily_update"] or
-            time.time() - data_cache["last_daily_update"].get(date_str, 0) > CACHE_LIFETIME["daily"] or
-            force_update):
-        try:
-            # Get data from the server or use demo data if in demo mode
-            daily_data = get_game_data(date_str)
-            data_cache["daily_data"][date_str] = daily_data
-            data_cache["last_daily_update"][date_str] = time.time()
-            print(f"[{datetime.now()}] Data updated for date: {date_str}")
-        except Exception as e:
-            print(f"[{datetime.now()}] Error getting data for date {date_str}: {e}")
-            if date_str not in data_cache["daily_data"]:
-                data_cache["daily_data"][date_str] = {}
-    
-    # Return data from cache or default values
-    return data_cache["daily_data"].get(date_str, {})
+    return _game_day(date_str, force_update)[0]
+
+def get_day_summary(date_str=None, force_update=False):
+    """Precomputed hourly histogram and unique users for a date (see get_game_added_stats)"""
+    if not date_str:
+        date_str = datetime.now().strftime('%Y-%m-%d')
+    return _game_day(date_str, force_update)[1]
+
+def compute_period_stats(days, today_str, today_summary):
+    """Fold closed days and today's summary into period_aggregator and read one window (period_cache loader)"""
+    closed = period_aggregator.advance(today_str, get_day_summary)
+    if closed:
+        print(f"[{datetime.now()}] Closed {closed} day(s) into the period statistics")
+    period_aggregator.set_today(today_summary)
+    return period_aggregator.window(days)
 
 def get_game_added_stats_period(days=7, force_update=False):
-    """Get game added stats for a period of days"""
-    days_str = str(days)
+    """
+    Get game added stats for a period of days
+    
+    Served from period_cache, keyed by window and date. Each result records
+    when today's summary was loaded into the daily cache, and is recomputed
+    as soon as today's data is refreshed there. On a miss period_aggregator
+    folds in the days that closed since the last call and today's summary.
+    Returns days/labels/values (oldest first), total_games_added,
+    average_games_per_day, peak_hour(_raw), trend and trend_percent.
+    """
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    key = (days, today_str)
     
-    # Check if the cache needs to be updated for this period
-    if (data_cache["period_data"][days_str] is None or
-            time.time() - data_cache["last_period_update"][days_str] > CACHE_LIFETIME["period"] or
-            force_update):
-        
-        # Initialize result structure
-        result = {'days': []}
-        
-        # Load data for each day in the period
-        for i in range(days):
-            date = datetime.now() - timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-            day_stats = get_game_added_stats(date_str, force_update=(i == 0))  # Force update only today's data
-            result['days'].append(day_stats)
-    
-    # Return cached data or default values
-    return data_cache["period_data"][days_str] or {
+    try:
+        today_summary = get_day_summary(today_str, force_update=force_update)
+        today_version = daily_cache.updated_at(today_str)
+        load = lambda: (today_version, compute_period_stats(days, today_str, today_summary))
+        version, result = period_cache.get_or_load(key, load, force=force_update)
+        if version != today_version:
+            version, result = period_cache.get_or_load(key, load, force=True)
+        return result
+    except Exception as e:
+        print(f"[{datetime.now()}] Error updating {days}-day statistics: {e}")
+    
+    # Return the expired copy or default values
+    cached, _ = period_cache.peek(key)
+    return cached[1] if cached else {
+        "days": [],
+        "labels": [],
+        "values": [],
         "total_games_added": 0,
         "average_games_per_day": 0,
         "peak_hour": "N/A",
         "peak_hour_raw": None,
-        "trend": "N/A"
+        "trend": "N/A",
+        "trend_percent": None
     }
 
 def get_games_data_old():
@@ -1371,15 +1539,28 @@ def get_games_data_old():
             return {}
 
 def get_game_data(date=None):
-    """Fetch game data from API for specific date or use today's date (for game stats)"""
+    """
+    Fetch game data from API for specific date or use today's date (for game stats)
+    
+    Days before today no longer change, so once they were loaded after
+    they ended they are served from the game_events store. Today, and a
+    past day last loaded while it was still today, is reloaded and
+    re-ingested.
+    """
     try:
+        # Past days come from the columnar store instead of another JSON load
+        if date and date < datetime.now().strftime('%Y-%m-%d') and game_events.has_complete_day(date):
+            return game_events.payload(date)
+        
         # The current endpoint is returning HTML instead of JSON
         # Let's modify to use local data directly instead of trying external API
         
         print(f"Fetching data for date: {date or 'latest'}")
         
         # Skip API call entirely and use sample data
-        return load_sample_data(date)
+        data = load_sample_data(date)
+        game_events.ingest_day(date or datetime.now().strftime('%Y-%m-%d'), data)
+        return data
             
     except Exception as e:
         print(f"Error fetching game data: {e}")
@@ -1502,8 +1683,8 @@ def create_sample_game_data():
     with open('sample_game_data.json', 'w') as f:
         json.dump(sample_data, f, indent=2)
 
-def process_game_data(data):
-    """Process raw game data for display (for game stats)"""
+def process_game_data(data, summary=None):
+    """Process raw game data for display (for game stats); summary is the day's precomputed DaySummary"""
     # Sort games by timestamp in descending order (newest first)
     games = sorted(data.get('details', []), key=lambda x: x.get('timestamp', ''), reverse=True)
     
@@ -1516,17 +1697,15 @@ def process_game_data(data):
         formatted_date = "Today"
     
     # Get unique users count
-    unique_users = len(set(game.get('user_id', '') for game in games))
+    if summary is None:
+        summary = summarize_day(data, date_str)
+    unique_users = summary.unique_users
     
     # Process each game
     processed_games = []
     for game in games:
         # Format timestamp
-        try:
-            timestamp_obj = datetime.strptime(game.get('timestamp', ''), '%Y-%m-%d %H:%M:%S')
-            formatted_timestamp = timestamp_obj.strftime('%H:%M:%S')
-        except:
-            formatted_timestamp = "Unknown"
+        formatted_timestamp = time_of(game.get('timestamp', '')) or "Unknown"
         
         # Get shortened user ID (first 8 chars)
         short_user_id = game.get('user_id', 'Unknown')[:8]
@@ -1551,10 +1730,8 @@ def process_game_data(data):
         'date': date_str  # Add the raw date for the date picker
     }
 
-def analyze_hourly_data(game_data):
-    """Analyze game data to find hourly distribution and most active hour"""
-    hourly_counts = defaultdict(int)
-    
+def analyze_hourly_data(game_data, summary=None):
+    """Analyze game data to find hourly distribution and most active hour; summary is the day's precomputed DaySummary"""
     # Обработка случая, когда game_data равен None или details отсутствует
     if not game_data or 'details' not in game_data:
         return {
@@ -1563,48 +1740,22 @@ def analyze_hourly_data(game_data):
             "most_active_hour_raw": None
         }
     
-    for game in game_data.get('details', []):
-        try:
-            timestamp = datetime.strptime(game.get('timestamp', ''), '%Y-%m-%d %H:%M:%S')
-            hour = timestamp.hour
-            hourly_counts[hour] += 1
-        except:
-            continue
-    
-    # Find most active hour
-    most_active_hour = None
-    max_count = 0
+    if summary is None:
+        summary = summarize_day(game_data)
     
-    for hour, count in hourly_counts.items():
-        if count > max_count:
-            max_count = count
-            most_active_hour = hour
+    # Most active hour (the earliest one on ties)
+    most_active_hour = summary.peak_hour
     
     # Format for display
-    if most_active_hour is not None:
-        hour_start = most_active_hour
-        hour_end = (most_active_hour + 1) % 24
-        
-        # Convert to 12-hour format with AM/PM
-        hour_start_12 = hour_start if hour_start <= 12 else hour_start - 12
-        hour_start_12 = 12 if hour_start_12 == 0 else hour_start_12
-        
-        hour_end_12 = hour_end if hour_end <= 12 else hour_end - 12
-        hour_end_12 = 12 if hour_end_12 == 0 else hour_end_12
-        
-        am_pm_start = "AM" if hour_start < 12 else "PM"
-        am_pm_end = "AM" if hour_end < 12 else "PM"
-        
-        most_active_formatted = f"{hour_start_12} {am_pm_start}-{hour_end_12} {am_pm_end}"
-    else:
-        most_active_formatted = "N/A"
+    most_active_formatted = format_hour_range(most_active_hour)
     
     return {
-        "hourly_distribution": dict(hourly_counts),
+        "hourly_distribution": summary.hourly_distribution(),
         "most_active_hour": most_active_formatted,
         "most_active_hour_raw": most_active_hour
     }
 
+@users_store_transaction
 def check_expired_premium_and_slots():
     """Check and revoke expired premium status and slots"""
     try:
@@ -1642,8 +1793,10 @@ def update_cache_periodically():
     """Update cache at regular intervals"""
     last_stats_refresh = 0
     last_games_refresh = 0
-    stats_refresh_interval = 300  # 5 minutes
+    last_period_refresh = 0
+    stats_refresh_interval = CACHE_LIFETIME["stats"]  # 5 minutes
     games_refresh_interval = 3600  # 1 hour
+    period_refresh_interval = CACHE_LIFETIME["period"]  # 2 hours
     
     while True:
         try:
@@ -1653,68 +1806,80 @@ def update_cache_periodically():
             check_expired_premium_and_slots()
             print(f"[{datetime.now()}] Checked for expired premium subscriptions and slots")
             
-            # Update stats more frequently (every 5 minutes)
-            if current_time - last_stats_refresh >= stats_refresh_interval:
-                get_stats(force_update=True)
-                last_stats_refresh = current_time
-                print(f"[{datetime.now()}] Statistics refreshed from API")
-            
-            # Update games data every hour
-            if current_time - last_games_refresh >= games_refresh_interval:
-                fetch_and_process_games(force_update=True)
-                last_games_refresh = current_time
-                print(f"[{datetime.now()}] Games data refreshed from API")
-            
-            # Sleep for a shorter time for premium checks (every 5 minutes)
-            time.sleep(300)  # 5 minutes
+            # Stats every 5 minutes, games every hour - fetched together when both are due
+            stats_due = current_time - last_stats_refresh >= stats_refresh_interval
+            games_due = current_time - last_games_refresh >= games_refresh_interval
+            if stats_due or games_due:
+                results = refresh_upstream_caches(stats=stats_due, games=games_due)
+                if stats_due:
+                    last_stats_refresh = current_time
+                if games_due:
+                    last_games_refresh = current_time
+                print(f"[{datetime.now()}] Upstream data refreshed from API: {results}")
             
             # Update period stats
-            get_game_added_stats_period(7, force_update=True)
-            get_game_added_stats_period(30, force_update=True)
-            
-            print(f"[{datetime.now()}] All cache updated in background thread")
+            if current_time - last_period_refresh >= period_refresh_interval:
+                get_game_added_stats_period(7, force_update=True)
+                get_game_added_stats_period(30, force_update=True)
+                last_period_refresh = current_time
+                print(f"[{datetime.now()}] Period statistics refreshed")
         except Exception as e:
             print(f"[{datetime.now()}] Error in background cache update: {e}")
         
-        # Sleep for remaining time to complete the hour
-        time.sleep(2700)  # 45 minutes (total cycle: 50 minutes with earlier 5-minute sleep)
+        # Wake up at the stats cadence; slower caches are gated by their intervals above
+        time.sleep(stats_refresh_interval)
+
+def refresh_upstream_caches(stats=True, games=True):
+    """Fetch the due upstream endpoints concurrently and apply the results"""
+    urls = []
+    if stats:
+        urls.extend(STATS_API.values())
+    if games:
+        urls.append(GAMES_FETCH_API)
+    if not urls:
+        return {}
+    
+    responses = fetch_upstream_many(urls)
+    
+    results = {}
+    if stats:
+        results['stats'] = apply_stats_responses(responses[STATS_API["online"]], responses[STATS_API["users"]])
+    if games:
+        results['games'] = catalog.apply_response(responses[GAMES_FETCH_API])
+    return results
 
 # Инициализация кеша при запуске
 def init_cache():
     print(f"[{datetime.now()}] Инициализация кеша...")
+    started = time.perf_counter()
     try:
-        # Force update stats first to ensure we have the latest data
-        get_stats(force_update=True)
-        
-        # Initialize game data from external API
-        fetch_and_process_games(force_update=True)
-        
-        # Create a list of tasks for initialization and start them in separate threads
-        # for parallel initialization of different data types
-        tasks = [
+        # Local per-day data loads while the upstream calls are in flight
+        local_tasks = [
             # Load data for today
             lambda: get_game_added_stats(datetime.now().strftime('%Y-%m-%d'), force_update=True),
             
-            # Load weekly data (with lower priority)
+            # Load weekly data
             lambda: get_game_added_stats_period(7, force_update=True),
             
-            # Load monthly data (with lower priority)
+            # Load monthly data
             lambda: get_game_added_stats_period(30, force_update=True)
         ]
         
-        # Start all tasks in parallel
-        threads = []
-        for task in tasks:
-            thread = threading.Thread(target=task)
-            thread.daemon = True
-            thread.start()
-            threads.append(thread)
-        
-        # Don't wait for threads to complete - they will work in the background
+        with ThreadPoolExecutor(max_workers=len(local_tasks), thread_name_prefix='cache-init') as executor:
+            futures = [executor.submit(task) for task in local_tasks]
+            
+            # Stats and catalog are fetched concurrently
+            results = refresh_upstream_caches()
+            
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[{datetime.now()}] Ошибка загрузки локальных данных: {e}")
         
-        print(f"[{datetime.now()}] Инициализация кеша запущена в фоновом режиме")
+        print(f"[{datetime.now()}] Инициализация кеша завершена за {time.perf_counter() - started:.2f}s: {results}")
     except Exception as e:
-        print(f"[{datetime.now()}] Ошибка запуска инициализации кеша: {e}")
+        print(f"[{datetime.now()}] Ошибка инициализации кеша: {e}")
 
 @app.route('/')
 def index():
@@ -1731,16 +1896,10 @@ def index():
     month_data = get_game_added_stats_period(30)
     
     # Analyze hourly data
-    hourly_analysis = analyze_hourly_data(today_data)
+    hourly_analysis = analyze_hourly_data(today_data, get_day_summary(today_str))
     
-    # Calculate average games per day - Fixed to handle possible string or empty data
-    if week_data and isinstance(week_data, list) and len(week_data) > 0:
-        try:
-            avg_games = round(sum(day.get("games_added", 0) for day in week_data) / len(week_data))
-        except (TypeError, ZeroDivisionError):
-            avg_games = 0
-    else:
-        avg_games = 0
+    # Average games per day over the week
+    avg_games = round(week_data["average_games_per_day"])
     
     game_stats = {
         "today": today_data,
@@ -1775,27 +1934,15 @@ def game_stats_api():
         # Get hourly data for today or specified date
         data = get_game_added_stats(date)
         
-        # Process for chart display
-        hourly_data = defaultdict(int)
-        
-        # Ensure data.details exists
-        if data and 'details' in data:
-            for game in data.get('details', []):
-                try:
-                    # Extract hour from timestamp
-                    timestamp = datetime.strptime(game.get('timestamp', ''), '%Y-%m-%d %H:%M:%S')
-                    hour = timestamp.hour
-                    hourly_data[hour] += 1
-                except:
-                    continue
+        # Hourly histogram computed when the day was loaded
+        summary = get_day_summary(date)
         
         # Format for chart
-        hours = list(range(24))
-        labels = [f"{h}:00" for h in hours]
-        counts = [hourly_data.get(hour, 0) for hour in hours]
+        labels = [f"{h}:00" for h in range(24)]
+        counts = summary.hourly.tolist()
         
         # Find peak hour
-        peak_hour = max(hourly_data.items(), key=lambda x: x[1])[0] if hourly_data else 0
+        peak_hour = summary.peak_hour if summary.peak_hour is not None else 0
         
         return jsonify({
             'date': data.get('date', datetime.now().strftime('%Y-%m-%d')),
@@ -1809,23 +1956,14 @@ def game_stats_api():
         days = 7 if date_range == '7' else 30
         data = get_game_added_stats_period(days)
         
-        # Ensure data exists and is not empty
-        if not data:
-            data = [
-                {'date': (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d'), 'games_added': 0}
-                for i in range(days)
-            ]
-        
-        labels = [datetime.strptime(day.get('date', '2000-01-01'), '%Y-%m-%d').strftime('%b %d') for day in data]
-        counts = [day.get('games_added', 0) for day in data]
-        
-        # Calculate the sum of all games in the period
-        total_games = sum(day.get('games_added', 0) for day in data)
-        
         return jsonify({
-            'labels': labels,
-            'data': counts,
-            'total_games': total_games
+            'labels': data['labels'],
+            'data': data['values'],
+            'total_games': data['total_games_added'],
+            'average_per_day': data['average_games_per_day'],
+            'peak_hour': data['peak_hour_raw'],
+            'trend': data['trend'],
+            'trend_percent': data['trend_percent']
         })
 
 # API endpoint to get games data
@@ -1835,49 +1973,58 @@ def api_games(access):
     if access not in ["free", "premium"]:
         return jsonify({"error": "Invalid access type. Must be 'free' or 'premium'"}), 400
     
-    # Try to fetch and process games if needed
-    fetch_and_process_games()
+    # Serve the catalog, refreshing it in the background when stale
+    catalog.ensure_loaded()
     
     # Return cached data based on access type
+    if not catalog.loaded:
+        return jsonify({"error": "No games data available"}), 500
+    
     if access == "free":
         # For free access, return only free games
-        if games_api_cache["free_games"] is None:
-            return jsonify({"error": "No free games data available"}), 500
-        return jsonify(games_api_cache["free_games"])
+        return jsonify(catalog.get_tier("free"))
     else:
         # For premium access, return both free and premium games
-        if games_api_cache["free_games"] is None or games_api_cache["premium_games"] is None:
-            return jsonify({"error": "No games data available"}), 500
-        
-        # Combine free and premium games
-        combined_games = {}
-        
-        # Add free games
-        if games_api_cache["free_games"]:
-            combined_games.update(games_api_cache["free_games"])
-        
-        # Add premium games
-        if games_api_cache["premium_games"]:
-            combined_games.update(games_api_cache["premium_games"])
-        
+        combined_games = dict(catalog.get_tier("free"))
+        combined_games.update(catalog.get_tier("premium"))
         return jsonify(combined_games)
 
 @app.route('/api/games/refresh')
 @admin_required
 def refresh_games_cache():
     """Force refresh the games cache (admin only)"""
-    success = fetch_and_process_games(force_update=True)
+    success = catalog.refresh()
     
     if success:
+        counts = catalog.counts()
         return jsonify({
             "success": True, 
             "message": "Games cache refreshed successfully",
-            "free_games_count": len(games_api_cache["free_games"]) if games_api_cache["free_games"] else 0,
-            "premium_games_count": len(games_api_cache["premium_games"]) if games_api_cache["premium_games"] else 0
+            "version": catalog.version,
+            "free_games_count": counts["free"],
+            "premium_games_count": counts["premium"],
+            "filtered_count": catalog.filtered_count,
+            "filter_rejections": catalog.rejections
         })
     else:
         return jsonify({"success": False, "error": "Failed to refresh games cache"}), 500
 
+@app.route('/api/admin/upstream/stats')
+@admin_required
+def api_admin_upstream_stats():
+    """Get upstream latency/failure counters and stats cache freshness"""
+    last_update = stats_cache.updated_at('stats')
+    return jsonify({
+        'upstream': get_upstream_metrics(),
+        'caches': caches.metrics(),
+        'stats_cache': {
+            'last_update': last_update,
+            'age_seconds': round(time.time() - last_update, 1) if last_update else None,
+            'lifetime_seconds': CACHE_LIFETIME["stats"],
+            'max_stale_seconds': STATS_MAX_STALE
+        }
+    })
+
 # Add 404 error handler
 @app.errorhandler(404)
 def page_not_found(e):
@@ -1885,6 +2032,9 @@ def page_not_found(e):
 
 # Start initial cache initialization and periodic updates
 def start_background_tasks():
+    # Serve the last good catalog immediately, before any upstream call
+    catalog.load_snapshot()
+    
     # Starting cache initialization in a separate thread to avoid blocking server startup
     init_thread = threading.Thread(target=init_cache, daemon=True)
     init_thread.start()
@@ -1900,9 +2050,7 @@ def start_background_tasks():
 def admin_dashboard():
     """Admin dashboard page"""
     # Get basic statistics
-    users = get_users()
-    free_games = get_games_data("free")
-    premium_games = get_games_data("premium")
+    catalog.ensure_loaded()
     
     # Get recent activities (could be stored in a separate file in a real application)
     activities = [
@@ -1923,58 +2071,47 @@ def admin_dashboard():
         }
     ]
     
-    # Calculate online users
-    online_users = sum(1 for user in users if user.get("launcher_connected", False))
-    
-    # Calculate premium users
-    premium_users = sum(1 for user in users if user.get("status") == "Premium" or user.get("status") == "Premium (Aligned)")
-    
-    # Count game sessions
-    total_game_sessions = sum(len(user.get("game_sessions", [])) for user in users)
-    
-    # Count new users in the last 24 hours
-    now = datetime.now()
-    yesterday = now - timedelta(days=1)
-    new_users = sum(1 for user in users if datetime.strptime(user.get("join_date", "2000-01-01"), '%Y-%m-%d') >= yesterday)
-    
-    # Count daily active users (users with a game session in the last 24 hours)
-    daily_users = 0
-    for user in users:
-        has_recent_session = False
-        for session in user.get("game_sessions", []):
-            try:
-                session_time = datetime.strptime(session.get("timestamp", "2000-01-01 00:00:00"), '%Y-%m-%d %H:%M:%S')
-                if session_time >= yesterday:
-                    has_recent_session = True
-                    break
-            except:
-                continue
-        if has_recent_session:
-            daily_users += 1
-    
-    # Prepare stats for the dashboard
-    stats = {
-        "total_users": len(users),
-        "games_count": len(free_games) + len(premium_games),
-        "premium_users": premium_users,
-        "online_users": online_users,
-        "daily_users": daily_users,
-        "game_sessions": total_game_sessions,
-        "new_users": new_users,
+    # Prepare stats for the dashboard from the maintained counters
+    stats = user_index.dashboard_stats()
+    stats.update({
+        "games_count": catalog.counts()["total"],
         "last_update": datetime.now().strftime("%Y-%m-%d %H:%M")
-    }
+    })
     
     return render_template('admin/dashboard.html', stats=stats, activities=activities)
 
 @app.route('/admin/users')
 @admin_required
 def admin_users():
-    """Admin user management page"""
-    users = get_users()
-    return render_template('admin/users.html', users=users)
+    """Admin user management page; rows are loaded from /api/admin/users"""
+    return render_template('admin/users.html', total_users=user_index.dashboard_stats()['total_users'])
+
+@app.route('/admin/users/get/<user_id>')
+@admin_required
+def admin_get_user(user_id):
+    """User details for the admin edit dialog, including the promo codes they redeemed"""
+    user = find_user_by_id(user_id)
+    if not user:
+        return jsonify({'success': False, 'error': 'User not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'user': {
+            'id': user['id'],
+            'username': user.get('username', ''),
+            'email': user.get('email', ''),
+            'status': user.get('status', 'Standard'),
+            'is_admin': user.get('is_admin', False),
+            'launcher_code': user.get('launcher_code', ''),
+            'launcher_connected': user.get('launcher_connected', False),
+            'last_connection': user.get('last_connection'),
+            'redeemed_promo_codes': promo_index.redeemed_by_user(user['id'])
+        }
+    })
 
 @app.route('/admin/users/create', methods=['POST'])
 @admin_required
+@users_store_transaction
 def admin_create_user():
     """Create a new user (admin function)"""
     username = request.form.get('username')
@@ -2048,6 +2185,7 @@ def admin_create_user():
 
 @app.route('/admin/users/update', methods=['POST'])
 @admin_required
+@users_store_transaction
 def admin_update_user():
     """Update a user (admin function)"""
     user_id = request.form.get('user_id')
@@ -2119,6 +2257,7 @@ def admin_update_user():
 
 @app.route('/admin/users/delete', methods=['POST'])
 @admin_required
+@users_store_transaction
 def admin_delete_user():
     """Delete a user (admin function)"""
     user_id = request.form.get('user_id')
@@ -2150,28 +2289,18 @@ def admin_delete_user():
 @admin_required
 def admin_games():
     """Admin games management page"""
-    free_games = get_games_data("free")
-    premium_games = get_games_data("premium")
+    catalog.ensure_loaded()
     
     # Transform games data into a consistent format for the template
     games = []
     
-    for game_id, game_data in free_games.items():
+    for game_id, access, game_data in catalog.iter_games():
         games.append({
             'id': game_id,
             'name': game_data.get('name', 'Unknown'),
             'image': game_data.get('image', ''),
             'release_date': game_data.get('release_date', 'Unknown'),
-            'access': 'free'
-        })
-    
-    for game_id, game_data in premium_games.items():
-        games.append({
-            'id': game_id,
-            'name': game_data.get('name', 'Unknown'),
-            'image': game_data.get('image', ''),
-            'release_date': game_data.get('release_date', 'Unknown'),
-            'access': 'premium'
+            'access': access
         })
     
     # Sort games by name
@@ -2182,22 +2311,8 @@ def admin_games():
 @app.route('/admin/promo-codes')
 @admin_required
 def admin_promo_codes():
-    """Admin promo codes management page"""
-    promo_codes = get_promo_codes()
-    for p in promo_codes:
-        p['uses_count'] = len(p.get('redeemed_by', []))
-        if p.get('expires_at'):
-            try:
-                p['expires_at'] = datetime.strptime(p['expires_at'], '%Y-%m-%d %H:%M:%S')
-            except (ValueError, TypeError):
-                 try:
-                     p['expires_at'] = datetime.strptime(p['expires_at'], '%Y-%m-%d')
-                 except (ValueError, TypeError):
-                     p['expires_at'] = None
-
-    # Sort by group for Jinja's groupby filter
-    promo_codes.sort(key=lambda p: p.get('group', 'default') or 'default')
-    return render_template('admin/promo_codes.html', promo_codes=promo_codes)
+    """Admin promo codes management page; codes are loaded per group from /api/admin/promo-codes"""
+    return render_template('admin/promo_codes.html', promo_groups=promo_index.group_summaries())
 
 @app.route('/admin/promo-codes/group/delete', methods=['POST'])
 @admin_required
@@ -2210,35 +2325,25 @@ def admin_delete_promo_group():
         flash('Group name is required.', 'error')
         return redirect(url_for('admin_promo_codes'))
 
-    promo_codes = get_promo_codes()
-    
-    if delete_type == 'all':
-        # Старая логика - удаление всей группы
-        codes_to_keep = [p for p in promo_codes if p.get('group') != group_name]
-        deleted_count = len(promo_codes) - len(codes_to_keep)
+    # Used-up codes are counted from redeemed_by, not the stored uses_count
+    used_only = delete_type != 'all'
+    with promo_store_lock:
+        promo_ids = promo_index.group_code_ids(group_name, used_only=used_only)
+        if not promo_ids:
+            if used_only:
+                flash(f'No used promo codes found in group "{group_name}".', 'warning')
+            else:
+                flash(f'Group "{group_name}" not found.', 'warning')
+            return redirect(url_for('admin_promo_codes'))
         
-        if deleted_count == 0:
-            flash(f'Group "{group_name}" not found.', 'warning')
-        else:
-            save_promo_codes(codes_to_keep)
-            flash(f'Successfully deleted all {deleted_count} promo codes in group "{group_name}".', 'success')
+        promo_codes = [p for p in get_promo_codes() if p.get('id') not in promo_ids]
+        promo_index.remove(promo_ids)
+        save_promo_codes(promo_codes, reindex=False)
+    
+    if used_only:
+        flash(f'Successfully deleted {len(promo_ids)} used promo codes in group "{group_name}".', 'success')
     else:
-        # Новая логика - удаление только использованных промокодов
-        original_count = len(promo_codes)
-        codes_to_keep = []
-        
-        for promo in promo_codes:
-            # Если промокод не из этой группы или не использован полностью, сохраняем его
-            if promo.get('group') != group_name or not (promo.get('uses_limit', 0) > 0 and promo.get('uses_count', 0) >= promo.get('uses_limit', 0)):
-                codes_to_keep.append(promo)
-        
-        deleted_count = original_count - len(codes_to_keep)
-        
-        if deleted_count == 0:
-            flash(f'No used promo codes found in group "{group_name}".', 'warning')
-        else:
-            save_promo_codes(codes_to_keep)
-            flash(f'Successfully deleted {deleted_count} used promo codes in group "{group_name}".', 'success')
+        flash(f'Successfully deleted all {len(promo_ids)} promo codes in group "{group_name}".', 'success')
 
     return redirect(url_for('admin_promo_codes'))
 
@@ -2270,44 +2375,37 @@ def admin_create_promo_code():
         if group == 'custom':
             group = request.form.get('custom_group', 'default')
         
-        # Generate a unique promo code
-        all_promo_codes = get_promo_codes()
-        existing_codes = {p['code'] for p in all_promo_codes}
-        
-        # Try to generate a unique code, up to 10 attempts
-        for _ in range(10):
-            new_code = generate_promo_code()
-            if new_code not in existing_codes:
-                break
-        else:
-            # If we can't generate a unique code after 10 attempts, return an error
-            flash('Failed to generate a unique promo code', 'error')
-            return redirect(url_for('admin_promo_codes'))
-        
         # Get the creator username
         current_user = find_user_by_id(session.get('user_id', ''))
         creator_username = current_user['username'] if current_user else "System"
         
-        # Create the new promo code object
-        new_promo = {
-            'id': str(uuid.uuid4()),
-            'code': new_code,
-            'description': description,
-            'uses_limit': uses_limit,
-            'expires_at': expires_at,
-            'gives_premium': gives_premium,
-            'premium_duration': premium_duration,
-            'slots': slots,
-            'slots_duration': slots_duration,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'created_by': creator_username,
-            'redeemed_by': [],
-            'group': group  # Add the group field
-        }
-        
-        # Add the new promo code to the list and save
-        all_promo_codes.append(new_promo)
-        save_promo_codes(all_promo_codes)
+        with promo_store_lock:
+            # Generate a unique promo code, checked against the code index
+            all_promo_codes = get_promo_codes()
+            promo_index.ensure_current()
+            new_code = next(code_generator.generate(1, promo_index.has_code))
+            
+            # Create the new promo code object
+            new_promo = {
+                'id': str(uuid.uuid4()),
+                'code': new_code,
+                'description': description,
+                'uses_limit': uses_limit,
+                'expires_at': expires_at,
+                'gives_premium': gives_premium,
+                'premium_duration': premium_duration,
+                'slots': slots,
+                'slots_duration': slots_duration,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'created_by': creator_username,
+                'redeemed_by': [],
+                'group': group  # Add the group field
+            }
+            
+            # Add the new promo code to the list and save
+            all_promo_codes.append(new_promo)
+            promo_index.add(new_promo)
+            save_promo_codes(all_promo_codes, reindex=False)
         
         flash(f'Promo code {new_code} created successfully', 'success')
         return redirect(url_for('admin_promo_codes'))
@@ -2325,10 +2423,12 @@ def admin_delete_promo_code():
         flash('Promo code ID is required', 'error')
         return redirect(url_for('admin_promo_codes'))
     
-    # Delete promo code
-    promo_codes = get_promo_codes()
-    promo_codes = [promo for promo in promo_codes if promo.get('id') != promo_id]
-    save_promo_codes(promo_codes)
+    with promo_store_lock:
+        # Delete promo code
+        promo_codes = get_promo_codes()
+        promo_codes = [promo for promo in promo_codes if promo.get('id') != promo_id]
+        promo_index.remove([promo_id])
+        save_promo_codes(promo_codes, reindex=False)
     
     flash('Promo code deleted successfully', 'success')
     return redirect(url_for('admin_promo_codes'))
@@ -2367,44 +2467,66 @@ def admin_bulk_create_promo_code():
     except (ValueError, TypeError):
         return jsonify({'success': False, 'error': 'Invalid data types provided.'})
 
-    if not (1 <= count <= 100):
-        return jsonify({'success': False, 'error': 'Count must be between 1 and 100.'})
+    if not (1 <= count <= PROMO_BULK_MAX_COUNT):
+        return jsonify({'success': False, 'error': f'Count must be between 1 and {PROMO_BULK_MAX_COUNT}.'})
 
-    all_promo_codes = get_promo_codes()
-    existing_codes_set = {p['code'] for p in all_promo_codes}
-    
     current_user = find_user_by_id(session.get('user_id', ''))
     creator_username = current_user['username'] if current_user else "System"
     
-    newly_created_codes = []
-
-    for _ in range(count):
-        new_code_str = generate_promo_code()
-        while new_code_str in existing_codes_set:
-            new_code_str = generate_promo_code()
-        existing_codes_set.add(new_code_str)
-
-        new_promo = {
-            'id': str(uuid.uuid4()),
-            'code': new_code_str,
-            'description': description,
-            'uses_limit': uses_limit,
-            'expires_at': expires_at,
-            'gives_premium': gives_premium,
-            'premium_duration': premium_duration,
-            'slots': slots,
-            'slots_duration': slots_duration,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'created_by': creator_username,
-            'redeemed_by': [],
-            'group': group  # Add the group field
-        }
-        all_promo_codes.append(new_promo)
-        newly_created_codes.append(new_code_str)
+    batch_id = str(uuid.uuid4())
+    template = {
+        'description': description,
+        'uses_limit': uses_limit,
+        'expires_at': expires_at,
+        'gives_premium': gives_premium,
+        'premium_duration': premium_duration,
+        'slots': slots,
+        'slots_duration': slots_duration,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'created_by': creator_username,
+        'group': group,
+        'batch_id': batch_id
+    }
+
+    def new_promos():
+        # Codes are checked against the index, which registers each one as it is written
+        for code in code_generator.generate(count, promo_index.has_code):
+            yield dict(template, id=str(uuid.uuid4()), code=code, redeemed_by=[])
 
-    save_promo_codes(all_promo_codes)
+    # Stream the batch onto the end of the store instead of rewriting it
+    with promo_store_lock:
+        try:
+            created = append_to_json_array(PROMO_CODES_FILE, promo_index.extend(new_promos()))
+        except Exception:
+            # Drop indexed codes that never reached the store
+            promo_index.sync(get_promo_codes())
+            raise
+        promo_index.mark_current()
+        promo_index.persist_redemptions()
+    print(f"[{datetime.now()}] Created {created} promo codes in batch {batch_id} (group {group})")
+
+    result = {
+        'success': True,
+        'count': created,
+        'batch_id': batch_id,
+        'export_url': url_for('admin_export_promo_batch', batch_id=batch_id)
+    }
+    if created <= PROMO_BULK_INLINE_CODES:
+        result['codes'] = [row['code'] for row in promo_index.iter_batch(batch_id)]
+    return jsonify(result)
 
-    return jsonify({'success': True, 'codes': newly_created_codes})
+@app.route('/admin/promo-codes/batches/<batch_id>/export.csv')
+@admin_required
+def admin_export_promo_batch(batch_id):
+    """Download the codes of one bulk generation as CSV, streamed row by row"""
+    if not promo_index.has_batch(batch_id):
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+
+    return app.response_class(
+        iter_csv(promo_index.iter_batch(batch_id)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=promo-codes-{batch_id}.csv'}
+    )
 
 @app.route('/admin/stats')
 @admin_required
@@ -2683,6 +2805,7 @@ def inject_is_admin():
 
 # API endpoints for launcher integration
 @app.route('/api/launcher/connect', methods=['POST'])
+@users_store_transaction
 def launcher_connect():
     """Connect a launcher to a user account via connection code"""
     data = request.get_json()
@@ -2710,6 +2833,16 @@ def launcher_connect():
     device_name = data.get('device_name', 'Unknown Device')
     device_os = data.get('device_os', 'Unknown OS')
     
+    # Reject non-primary devices from the device registry, before touching the store
+    presence = launcher_presence.get_user(user['id'])
+    if presence and presence['primary_device_id'] and presence['primary_device_id'] != device_id:
+        return jsonify({
+            'success': False,
+            'error': 'This account can only be accessed from the primary device',
+            'should_disconnect': True,
+            'reason': 'not_primary_device'
+        })
+    
     # Check if this is the primary device or if no primary device is set yet
     users = get_users()
     for u in users:
@@ -2818,6 +2951,7 @@ def launcher_connect():
 
 @app.route('/api/slots/add', methods=['POST'])
 @login_required
+@users_store_transaction
 def api_slots_add():
     """Add a friend to a slot by username"""
     # Handle both JSON and form data
@@ -2962,6 +3096,35 @@ def api_slots_add():
     save_users(users)
     return jsonify({'success': True})
 
+@app.route('/api/launcher/sessions', methods=['POST'])
+def launcher_sessions():
+    """
+    Record a batch of game sessions from one launcher device
+    
+    Body: {"user_id", "device_id", "events": [{"event_id", "game_id", "playtime", "timestamp"}]}
+    playtime is in minutes; timestamp ('%Y-%m-%d %H:%M:%S') is optional.
+    All events are applied in one write; events with an already seen
+    event_id are reported as duplicates and not counted again.
+    """
+    data = request.get_json(silent=True)
+    
+    if not data or 'user_id' not in data or not isinstance(data.get('events'), list):
+        return jsonify({'success': False, 'error': 'Invalid request'})
+    
+    if len(data['events']) > LAUNCHER_SESSION_BATCH_MAX:
+        return jsonify({'success': False, 'error': f'At most {LAUNCHER_SESSION_BATCH_MAX} events per request'})
+    
+    result = ingest_session_events(data['user_id'], data.get('device_id'), data['events'])
+    if not result['found']:
+        return jsonify({'success': False, 'error': 'User not found'})
+    
+    return jsonify({
+        'success': not result['rejected'],
+        'applied': result['applied'],
+        'duplicates': result['duplicates'],
+        'rejected': result['rejected']
+    })
+
 @app.route('/api/launcher/update-session', methods=['POST'])
 def launcher_update_session():
     """Update user's game session data from launcher"""
@@ -2970,28 +3133,13 @@ def launcher_update_session():
     if not data or 'user_id' not in data or 'game_id' not in data or 'playtime' not in data:
         return jsonify({'success': False, 'error': 'Invalid request'})
     
-    user_id = data['user_id']
-    game_id = data['game_id']
-    playtime = int(data['playtime'])  # playtime in minutes
-    device_id = data.get('device_id', None)  # Optional device ID
-    
+    event = {key: data[key] for key in ('event_id', 'game_id', 'playtime', 'timestamp') if key in data}
+    result = ingest_session_events(data['user_id'], data.get('device_id'), [event])
     
-    if not find_user_by_id(user_id):
+    if not result['found']:
         return jsonify({'success': False, 'error': 'User not found'})
     
-    success = update_user_stats(user_id, game_id, playtime)
-    
-    # Update device's last connection time if device_id is provided
-    if device_id:
-        users = get_users()
-        for user in users:
-            if user['id'] == user_id and 'devices' in user:
-                for device in user['devices']:
-                    if device['device_id'] == device_id:
-                        device['last_connection'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        save_users(users)
-    
-    return jsonify({'success': success})
+    return jsonify({'success': result['applied'] > 0 or bool(result['duplicates'])})
 
 @app.route('/check-expired', methods=['GET'])
 def check_expired_endpoint():
@@ -3029,6 +3177,7 @@ def api_slots_align_user():
 
 @app.route('/api/slots/remove-user', methods=['POST'])
 @login_required
+@users_store_transaction
 def api_slots_remove_user():
     """Remove a user from a slot"""
     # Get username from JSON or form data
@@ -3144,6 +3293,7 @@ def api_slots_remove_user():
 
 @app.route('/api/slots/disalign-self', methods=['POST'])
 @login_required
+@users_store_transaction
 def api_slots_disalign_self():
     """Remove yourself from another user's slot alignment"""
     user = find_user_by_id(session['user_id'])
@@ -3249,30 +3399,38 @@ def api_slots_disalign_self():
 @login_required
 def api_devices_list():
     """Get list of connected devices for current user"""
-    user = find_user_by_id(session['user_id'])
+    user = launcher_presence.get_user(session['user_id'])
     if not user:
         return jsonify({'success': False, 'error': 'User not found'})
     
     # Check if user has premium status
-    if user.get('status') not in ['Premium', 'Admin', 'Premium (Aligned)']:
+    if user['status'] not in ['Premium', 'Admin', 'Premium (Aligned)']:
         return jsonify({'success': False, 'error': 'Premium subscription required'})
     
-    # Get devices from user data
-    devices = user.get('devices', [])
+    # Get devices from the device registry; heartbeats not yet flushed are included
+    devices = []
+    active_device_ids = set()
+    for device_id, entry in launcher_presence.list_devices(session['user_id']):
+        if entry['record'] is not None:
+            device = dict(entry['record'])
+            device['last_connection'] = max(device.get('last_connection', ''), entry['last_seen'])
+            devices.append(device)
+        
+        # Mark active devices
+        if entry['active'] and not entry['disconnected']:
+            active_device_ids.add(device_id)
     
     # Sort devices by last connection time (most recent first)
     devices.sort(key=lambda x: x.get('last_connection', ''), reverse=True)
     
     # Add 'is_primary' flag to devices
-    primary_device_id = None
-    if 'primary_device' in user:
-        primary_device_id = user['primary_device'].get('device_id')
-        
+    primary_device_id = user['primary_device_id']
+    if user['primary_device']:
         # Check if primary device is in the devices list, if not add it
         primary_device_exists = any(d['device_id'] == primary_device_id for d in devices)
         if not primary_device_exists:
             # Add primary device to the list if it's not there
-            primary_device = user['primary_device'].copy()
+            primary_device = dict(user['primary_device'])
             # If last_connection is not set, use registered_at
             if 'last_connection' not in primary_device and 'registered_at' in primary_device:
                 primary_device['last_connection'] = primary_device['registered_at']
@@ -3283,12 +3441,6 @@ def api_devices_list():
             # Re-sort the list
             devices.sort(key=lambda x: x.get('last_connection', ''), reverse=True)
     
-    # Mark active devices
-    active_device_ids = set()
-    for device in user.get('active_devices', []):
-        if not device.get('disconnected', False):
-            active_device_ids.add(device.get('device_id'))
-    
     # Add status flags
     for device in devices:
         device['is_primary'] = device.get('device_id') == primary_device_id
@@ -3301,8 +3453,27 @@ def api_devices_list():
         'primary_device_id': primary_device_id
     })
 
+@app.route('/api/admin/devices/<device_id>')
+@admin_required
+def api_admin_device_lookup(device_id):
+    """Look up which user owns a launcher device and its connection status"""
+    owner = launcher_presence.get_device_owner(device_id)
+    if not owner:
+        return jsonify({'success': False, 'error': 'Device not found'}), 404
+    
+    user = find_user_by_id(owner['user_id'])
+    return jsonify({
+        'success': True,
+        'device_id': device_id,
+        'user_id': owner['user_id'],
+        'username': user['username'] if user else None,
+        'status': owner['status'],
+        'last_seen': owner['last_seen']
+    })
+
 @app.route('/api/devices/disconnect', methods=['POST'])
 @login_required
+@users_store_transaction
 def api_devices_disconnect():
     """Disconnect a device from user account"""
     data = request.get_json()
@@ -3310,16 +3481,21 @@ def api_devices_disconnect():
         return jsonify({'success': False, 'error': 'Device ID required'})
     
     device_id = data['device_id']
-    user = find_user_by_id(session['user_id'])
+    user = launcher_presence.get_user(session['user_id'])
     if not user:
         return jsonify({'success': False, 'error': 'User not found'})
     
+    # Only devices in the user's active set can be disconnected; skip the store otherwise
+    device = launcher_presence.get_device(session['user_id'], device_id)
+    if not device or not device['active']:
+        return jsonify({'success': False, 'error': 'Device not found'})
+    
     # Update user's devices
     users = get_users()
     device_found = False
     
     for u in users:
-        if u['id'] == user['id']:
+        if u['id'] == session['user_id']:
             # Remove from devices list
             if 'devices' in u:
                 u['devices'] = [d for d in u['devices'] if d.get('device_id') != device_id]
@@ -3354,13 +3530,13 @@ def launcher_check_status():
         return jsonify({'success': False, 'error': 'Invalid request', 'should_disconnect': True})
     
     user_id = data['user_id']
-    user = find_user_by_id(user_id)
+    presence = launcher_presence.get_user(user_id)
     
-    if not user:
+    if not presence:
         return jsonify({'success': False, 'error': 'User not found', 'should_disconnect': True})
     
     # Check if user still has premium status
-    if user.get('status') not in ['Premium', 'Admin', 'Premium (Aligned)']:
+    if presence['status'] not in ['Premium', 'Admin', 'Premium (Aligned)']:
         return jsonify({
             'success': False, 
             'error': 'Premium subscription required',
@@ -3369,7 +3545,7 @@ def launcher_check_status():
         })
     
     # Check if user's launcher code is still valid
-    if not user.get('launcher_code'):
+    if not presence['has_launcher_code']:
         return jsonify({
             'success': False,
             'error': 'Invalid launcher code',
@@ -3377,16 +3553,11 @@ def launcher_check_status():
             'reason': 'invalid_code'
         })
     
-    # Determine the status_expires value
-    status_expires = "0"  # Default for unlimited premium
-    if user.get('premium_expires_at'):
-        status_expires = user['premium_expires_at']
-    
     return jsonify({
         'success': True,
         'should_disconnect': False,
-        'status': user.get('status'),
-        'status_expires': status_expires
+        'status': presence['status'],
+        'status_expires': presence['status_expires']
     })
 
 def force_disconnect_user_devices(user):
@@ -3411,6 +3582,7 @@ def force_disconnect_user_devices(user):
     user['devices'] = []
     user['active_devices'] = []
 
+@users_store_transaction
 def update_user_status_to_standard(user, reason=""):
     """Update user status to Standard and handle all related changes"""
     if not user:
@@ -3451,6 +3623,7 @@ def update_user_status_to_standard(user, reason=""):
 
 @app.route('/api/devices/reset-primary', methods=['POST'])
 @login_required
+@users_store_transaction
 def api_devices_reset_primary():
     """Reset the primary device binding for the user account"""
     user = find_user_by_id(session['user_id'])
@@ -3535,47 +3708,85 @@ def launcher_check_connection():
             'force_disconnect': False
         })
     
-    user_id = data['user_id']
-    device_id = data['device_id']
-    user = find_user_by_id(user_id)
+    return jsonify(get_launcher_connection_state(data['user_id'], data['device_id']))
+
+def get_launcher_connection_state(user_id, device_id):
+    """Connection state of a launcher device as reported by check-connection"""
+    presence = launcher_presence.get_user(user_id)
     
-    if not user:
-        return jsonify({
+    if not presence:
+        return {
             'connected': False, 
             'error': 'User not found',
             'force_disconnect': True
-        })
+        }
     
     # Check if user still has premium status
-    if user.get('status') not in ['Premium', 'Admin', 'Premium (Aligned)']:
-        return jsonify({
+    if presence['status'] not in ['Premium', 'Admin', 'Premium (Aligned)']:
+        return {
             'connected': False, 
             'error': 'Premium subscription required',
             'force_disconnect': True
-        })
+        }
     
     # Check if device is in active devices
     device_connected = False
     force_disconnect = False
     
-    if 'active_devices' in user:
-        for device in user['active_devices']:
-            if device.get('device_id') == device_id:
-                device_connected = not device.get('disconnected', False)
-                force_disconnect = device.get('force_disconnect', False)
-                break
-    
-    # Determine the status_expires value
-    status_expires = "0"  # Default for unlimited premium
-    if user.get('premium_expires_at'):
-        status_expires = user['premium_expires_at']
+    device = launcher_presence.get_device(user_id, device_id)
+    if device and device.get('active'):
+        device_connected = not device['disconnected']
+        force_disconnect = device['force_disconnect']
+        
+        # A live poll is a heartbeat
+        if device_connected:
+            launcher_presence.touch(user_id, device_id)
     
-    return jsonify({
+    return {
         'connected': device_connected,
         'force_disconnect': force_disconnect,
-        'status': user.get('status'),
-        'status_expires': status_expires
-    })
+        'status': presence['status'],
+        'status_expires': presence['status_expires']
+    }
+
+@app.route('/api/launcher/events', methods=['POST'])
+def launcher_events():
+    """
+    Long-poll for launcher status changes
+    
+    Body: {"user_id", "device_id", "cursor" (from the previous answer), "timeout"}
+    Answers as soon as the user's premium is revoked, the primary device is
+    reset or this device is disconnected, or after the timeout with no
+    events. Every answer carries the check-connection state and a cursor
+    for the next call.
+    """
+    data = request.get_json(silent=True)
+    
+    if not data or 'user_id' not in data or 'device_id' not in data:
+        return jsonify({
+            'connected': False, 
+            'error': 'Invalid request data',
+            'force_disconnect': False
+        })
+    
+    user_id = data['user_id']
+    device_id = data['device_id']
+    try:
+        timeout = min(float(data.get('timeout', LAUNCHER_EVENTS_TIMEOUT)), LAUNCHER_EVENTS_TIMEOUT)
+    except (TypeError, ValueError):
+        timeout = LAUNCHER_EVENTS_TIMEOUT
+    
+    # Nothing to wait for if the launcher should already stop
+    state = get_launcher_connection_state(user_id, device_id)
+    if not state['connected'] or state['force_disconnect']:
+        events, cursor = [], launcher_events_bus.cursor()
+    else:
+        events, cursor = launcher_events_bus.wait(user_id, device_id, data.get('cursor'), timeout)
+        state = get_launcher_connection_state(user_id, device_id)
+    
+    state['events'] = events
+    state['cursor'] = cursor
+    return jsonify(state)
 
 @app.route('/api/user/uniqueid/<path:path>')
 def api_user_uniqueid(path):
@@ -3610,40 +3821,66 @@ def api_user_uniqueid(path):
     })
 
 @app.route('/api/admin/users')
+@admin_required
 def api_admin_users():
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 5))
+    """
+    Page through users for the admin panel
+    
+    Filters: status, q (username/email substring). Pages with page/per_page,
+    or with cursor (the nextCursor of the previous answer) for stable paging.
+    """
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = min(max(int(request.args.get('per_page', 5)), 1), 1000)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid page parameters'}), 400
     status = request.args.get('status')
     q = request.args.get('q', '').lower()
+    cursor = request.args.get('cursor') or None
 
-    users = get_users()
-    # Фильтрация по статусу
-    if status and status != 'all':
-        users = [u for u in users if u.get('status', '').lower() == status.lower()]
-    # Фильтрация по поиску
-    if q:
-        users = [u for u in users if q in u.get('username', '').lower() or q in u.get('email', '').lower()]
-
-    total = len(users)
-    users_page = users[(page-1)*per_page:page*per_page]
-    # Формируем ответ
-    result = []
-    for u in users_page:
-        result.append({
-            'id': u['id'],
-            'username': u['username'],
-            'email': u['email'],
-            'status': u['status'],
-            'joined': u.get('join_date', '')
-        })
+    try:
+        result = user_index.query_users(status=status, q=q, page=page, per_page=per_page, cursor=cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'users': result['users'],
+        'page': page,
+        'perPage': per_page,
+        'total': result['total'],
+        'nextCursor': result['next_cursor']
+    })
+
+@app.route('/api/admin/promo-codes')
+@admin_required
+def api_admin_promo_codes():
+    """Page through the codes of one promo group for the admin panel"""
+    group = request.args.get('group', 'default')
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = min(max(int(request.args.get('per_page', 50)), 1), 500)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid page parameters'}), 400
+
+    result = promo_index.query_group(group, page=page, per_page=per_page)
     return jsonify({
-        'users': result,
+        'success': True,
+        'group': group,
+        'codes': result['codes'],
         'page': page,
         'perPage': per_page,
-        'total': total
+        'total': result['total'],
+        'hasMore': page * per_page < result['total']
     })
 
+@app.route('/api/admin/promo-codes/groups')
+@admin_required
+def api_admin_promo_groups():
+    """Code counts per promo group: total, used up, expired and remaining"""
+    return jsonify({'success': True, 'groups': promo_index.group_summaries()})
+
 @app.route('/api/admin/promo-codes/<promo_id>')
+@admin_required
 def api_admin_promo_code_details(promo_id):
     promo_codes = get_promo_codes()
     promo = next((p for p in promo_codes if p.get('id') == promo_id), None)
@@ -3662,13 +3899,15 @@ def api_admin_delete_promo_code():
     promo_id = data.get('promo_id')
     if not promo_id:
         return jsonify({'success': False, 'error': 'No promo_id provided'}), 400
-    promo_codes = get_promo_codes()
-    promo = next((p for p in promo_codes if str(p.get('id')) == str(promo_id)), None)
-    if not promo:
-        return jsonify({'success': False, 'error': 'Promo code not found'}), 404
-    # Удаляем промокод
-    promo_codes = [p for p in promo_codes if str(p.get('id')) != str(promo_id)]
-    save_promo_codes(promo_codes)
+    with promo_store_lock:
+        promo_codes = get_promo_codes()
+        promo = next((p for p in promo_codes if str(p.get('id')) == str(promo_id)), None)
+        if not promo:
+            return jsonify({'success': False, 'error': 'Promo code not found'}), 404
+        # Удаляем промокод
+        promo_codes = [p for p in promo_codes if str(p.get('id')) != str(promo_id)]
+        promo_index.remove([promo['id']])
+        save_promo_codes(promo_codes, reindex=False)
     return jsonify({'success': True})
 
 @app.route('/api/admin/traffic/stats')
@@ -3727,92 +3966,18 @@ def api_admin_traffic_demo():
         logger.error(f"Error initializing demo data: {e}")
         return jsonify({'error': 'Failed to initialize demo data'}), 500
 
-def fetch_and_process_games(force_update=False):
-    """Fetch games from external API and process them"""
-    current_time = time.time()
-    
-    # Check if cache needs to be updated
-    if (games_api_cache["data"] is None or 
-            current_time - games_api_cache["last_updated"] > GAMES_CACHE_LIFETIME or
-            force_update):
-        try:
-            print(f"[{datetime.now()}] Fetching games data from external API")
-            response = requests.get('http://api.swa-recloud.fun/api/v3/fetch/', timeout=10)
-            
-            if response.status_code != 200:
-                print(f"[{datetime.now()}] External API error: {response.status_code}")
-                return False
-            
-            # Parse the JSON response
-            data = response.json()
-            
-            # Process and categorize games
-            free_games = {}
-            premium_games = {}
-            filtered_count = 0
-            
-            # Pattern to match placeholder game names
-            placeholder_patterns = [
-                re.compile(r'^GAME\s+\d+$'),                # "GAME XX"
-                re.compile(r'^PLACEHOLDER\s*\d*$', re.I),   # "PLACEHOLDER" or "PLACEHOLDER XX"
-                re.compile(r'^TEST\s*\d*$', re.I),          # "TEST" or "TEST XX"
-                re.compile(r'^UNTITLED\s*\d*$', re.I),      # "UNTITLED" or "UNTITLED XX"
-                re.compile(r'^UNKNOWN\s*\d*$', re.I),       # "UNKNOWN" or "UNKNOWN XX"
-                re.compile(r'^UNNAMED\s*\d*$', re.I),       # "UNNAMED" or "UNNAMED XX"
-                re.compile(r'^TEMP\s*\d*$', re.I)           # "TEMP" or "TEMP XX"
-            ]
-            
-            for game_id, game_data in data.items():
-                # Skip games with no name or placeholder names
-                game_name = game_data.get('name', '').strip()
-                
-                if not game_name:
-                    filtered_count += 1
-                    continue
-                
-                # Check against all placeholder patterns
-                is_placeholder = False
-                for pattern in placeholder_patterns:
-                    if pattern.match(game_name):
-                        is_placeholder = True
-                        filtered_count += 1
-                        break
-                
-                if is_placeholder:
-                    continue
-                
-                # Categorize by access type
-                if game_data.get('access') == "1":
-                    free_games[game_id] = game_data
-                elif game_data.get('access') == "2":
-                    premium_games[game_id] = game_data
-            
-            # Update cache
-            games_api_cache["data"] = data  # Keep the original data for reference
-            games_api_cache["free_games"] = free_games
-            games_api_cache["premium_games"] = premium_games
-            games_api_cache["last_updated"] = current_time
-            
-            print(f"[{datetime.now()}] Games data cached: {len(free_games)} free games, {len(premium_games)} premium games")
-            print(f"[{datetime.now()}] Filtered out {filtered_count} games with placeholder names")
-            return True
-        except Exception as e:
-            print(f"[{datetime.now()}] Error fetching game data: {e}")
-            return False
-    
-    return True
-
 @app.route('/api/games/stats')
 def api_games_stats():
     """API endpoint to get game statistics"""
-    # Try to fetch and process games if needed
-    fetch_and_process_games()
+    # Serve the catalog, refreshing it in the background when stale
+    catalog.ensure_loaded()
+    counts = catalog.counts()
     
     # Calculate statistics
     stats = {
-        "total_games": 0,
-        "free_games": 0,
-        "premium_games": 0,
+        "total_games": counts["total"],
+        "free_games": counts["free"],
+        "premium_games": counts["premium"],
         "genres": {},
         "platforms": {
             "windows": 0,
@@ -3820,83 +3985,40 @@ def api_games_stats():
             "linux": 0
         },
         "recently_added": [],
-        "last_updated": games_api_cache["last_updated"]
+        "last_updated": catalog.last_updated,
+        "version": catalog.version
     }
     
-    # Process free games
-    if games_api_cache["free_games"]:
-        stats["free_games"] = len(games_api_cache["free_games"])
-        stats["total_games"] += stats["free_games"]
-        
-        # Process genre and platform stats
-        for game_id, game_data in games_api_cache["free_games"].items():
-            # Process genres
-            if game_data.get("genres"):
-                for genre in game_data["genres"]:
-                    genre_name = genre.get("description")
-                    if genre_name:
-                        if genre_name not in stats["genres"]:
-                            stats["genres"][genre_name] = 0
-                        stats["genres"][genre_name] += 1
-            
-            # Process platforms
-            if game_data.get("platforms"):
-                platforms = game_data["platforms"]
-                if platforms.get("windows"):
-                    stats["platforms"]["windows"] += 1
-                if platforms.get("mac"):
-                    stats["platforms"]["mac"] += 1
-                if platforms.get("linux"):
-                    stats["platforms"]["linux"] += 1
-    
-    # Process premium games
-    if games_api_cache["premium_games"]:
-        stats["premium_games"] = len(games_api_cache["premium_games"])
-        stats["total_games"] += stats["premium_games"]
-        
-        # Process genre and platform stats
-        for game_id, game_data in games_api_cache["premium_games"].items():
-            # Process genres
-            if game_data.get("genres"):
-                for genre in game_data["genres"]:
-                    genre_name = genre.get("description")
-                    if genre_name:
-                        if genre_name not in stats["genres"]:
-                            stats["genres"][genre_name] = 0
-                        stats["genres"][genre_name] += 1
-            
-            # Process platforms
-            if game_data.get("platforms"):
-                platforms = game_data["platforms"]
-                if platforms.get("windows"):
-                    stats["platforms"]["windows"] += 1
-                if platforms.get("mac"):
-                    stats["platforms"]["mac"] += 1
-                if platforms.get("linux"):
-                    stats["platforms"]["linux"] += 1
-    
     # Get recently added games (last 10 from both free and premium)
     all_games = []
     
-    if games_api_cache["free_games"]:
-        for game_id, game_data in games_api_cache["free_games"].items():
-            if game_data.get("added_at"):
-                all_games.append({
-                    "id": game_id,
-                    "name": game_data.get("name", "Unknown"),
-                    "added_at": game_data.get("added_at"),
-                    "access": "free"
-                })
-    
-    if games_api_cache["premium_games"]:
-        for game_id, game_data in games_api_cache["premium_games"].items():
-            if game_data.get("added_at"):
-                all_games.append({
-                    "id": game_id,
-                    "name": game_data.get("name", "Unknown"),
-                    "added_at": game_data.get("added_at"),
-                    "access": "premium"
-                })
+    for game_id, access, game_data in catalog.iter_games():
+        # Process genres
+        if game_data.get("genres"):
+            for genre in game_data["genres"]:
+                genre_name = genre.get("description")
+                if genre_name:
+                    if genre_name not in stats["genres"]:
+                        stats["genres"][genre_name] = 0
+                    stats["genres"][genre_name] += 1
+        
+        # Process platforms
+        if game_data.get("platforms"):
+            platforms = game_data["platforms"]
+            if platforms.get("windows"):
+                stats["platforms"]["windows"] += 1
+            if platforms.get("mac"):
+                stats["platforms"]["mac"] += 1
+            if platforms.get("linux"):
+                stats["platforms"]["linux"] += 1
+        
+        if game_data.get("added_at"):
+            all_games.append({
+                "id": game_id,
+                "name": game_data.get("name", "Unknown"),
+                "added_at": game_data.get("added_at"),
+                "access": access
+            })
     
     # Sort by added_at (most recent first) and take top 10
     all_games.sort(key=lambda x: x.get("added_at", ""), reverse=True)
@@ -3919,53 +4041,33 @@ def api_games_search():
     if not query and not genre:
         return jsonify({"error": "Search query or genre filter required"}), 400
     
-    # Try to fetch and process games if needed
-    fetch_and_process_games()
+    # Serve the catalog, refreshing it in the background when stale
+    catalog.ensure_loaded()
     
     # Prepare results
     results = []
     
-    # Search in free games
-    if access in ['all', 'free'] and games_api_cache["free_games"]:
-        for game_id, game_data in games_api_cache["free_games"].items():
-            # Check if game matches search criteria
-            if query and query not in game_data.get("name", "").lower():
-                continue
-                
-            # Check genre filter if provided
-            if genre and not any(g.get("description") == genre for g in game_data.get("genres", [])):
-                continue
-                
-            # Add to results
-            results.append({
-                "id": game_id,
-                "name": game_data.get("name", "Unknown"),
-                "image": game_data.get("image", ""),
-                "release_date": game_data.get("release_date", ""),
-                "genres": [g.get("description") for g in game_data.get("genres", [])],
-                "access": "free"
-            })
-    
-    # Search in premium games
-    if access in ['all', 'premium'] and games_api_cache["premium_games"]:
-        for game_id, game_data in games_api_cache["premium_games"].items():
-            # Check if game matches search criteria
-            if query and query not in game_data.get("name", "").lower():
-                continue
-                
-            # Check genre filter if provided
-            if genre and not any(g.get("description") == genre for g in game_data.get("genres", [])):
-                continue
-                
-            # Add to results
-            results.append({
-                "id": game_id,
-                "name": game_data.get("name", "Unknown"),
-                "image": game_data.get("image", ""),
-                "release_date": game_data.get("release_date", ""),
-                "genres": [g.get("description") for g in game_data.get("genres", [])],
-                "access": "premium"
-            })
+    for game_id, game_access, game_data in catalog.iter_games():
+        if access not in ['all', game_access]:
+            continue
+        
+        # Check if game matches search criteria
+        if query and query not in game_data.get("name", "").lower():
+            continue
+            
+        # Check genre filter if provided
+        if genre and not any(g.get("description") == genre for g in game_data.get("genres", [])):
+            continue
+            
+        # Add to results
+        results.append({
+            "id": game_id,
+            "name": game_data.get("name", "Unknown"),
+            "image": game_data.get("image", ""),
+            "release_date": game_data.get("release_date", ""),
+            "genres": [g.get("description") for g in game_data.get("genres", [])],
+            "access": game_access
+        })
     
     # Sort results by name
     results.sort(key=lambda x: x.get("name", ""))
@@ -3984,19 +4086,11 @@ def api_games_search():
 @app.route('/api/games/detail/<game_id>')
 def api_game_detail(game_id):
     """API endpoint to get detailed information about a specific game"""
-    # Try to fetch and process games if needed
-    fetch_and_process_games()
+    # Serve the catalog, refreshing it in the background when stale
+    catalog.ensure_loaded()
     
     # Look for the game in both free and premium collections
-    game_data = None
-    access_type = None
-    
-    if games_api_cache["free_games"] and game_id in games_api_cache["free_games"]:
-        game_data = games_api_cache["free_games"][game_id]
-        access_type = "free"
-    elif games_api_cache["premium_games"] and game_id in games_api_cache["premium_games"]:
-        game_data = games_api_cache["premium_games"][game_id]
-        access_type = "premium"
+    game_data, access_type = catalog.get_game(game_id)
     
     if not game_data:
         return jsonify({"error": f"Game with ID {game_id} not found"}), 404
@@ -4009,14 +4103,7 @@ def api_game_detail(game_id):
 
 def get_promo_code_groups():
     """Get list of all promo code groups"""
-    promo_codes = get_promo_codes()
-    groups = set()
-    
-    for promo in promo_codes:
-        group = promo.get('group', 'default')
-        groups.add(group)
-    
-    return sorted(list(groups))
+    return promo_index.group_names()
 
 @app.template_filter('get_group_color')
 def get_group_color(group_name):
@@ -4048,40 +4135,22 @@ def get_group_display_name(group_name):
 
 @app.route('/api/games/purchase/<game_id>', methods=['POST'])
 @require_permission('game::purchase', lambda game_id: f'game::{game_id}')
+@users_store_transaction
 def purchase_game(game_id):
     """Purchase a game with PermGuard authorization"""
     logger.info(f"Purchase attempt: user={session.get('username')}, game={game_id}")
 
-    # Load current games data
-    games_free = load_json_file('games_free_backup.json', [])
-    games_premium = load_json_file('games_premium_backup.json', [])
-
     # Find the game
-    game = None
-    is_free = False
-
-    # Check free games first
-    for i, g in enumerate(games_free):
-        if f'free-{i+1:03d}' == game_id:
-            game = g
-            is_free = True
-            break
-
-    # Check premium games if not found
-    if not game:
-        for i, g in enumerate(games_premium):
-            if f'premium-{i+1:03d}' == game_id:
-                game = g
-                is_free = False
-                break
-
+    game = store_catalog.get(game_id)
     if not game:
         return jsonify({'error': 'Game not found'}), 404
+    is_free = game['isFree']
 
     # Get user data
-    users = load_json_file('users.json', {})
     username = session.get('username')
-    user_data = users.get(username, {})
+    user_data = find_user_by_username(username)
+    if not user_data:
+        return jsonify({'error': 'User not found'}), 404
 
     game_price = 0 if is_free else float(game.get('price', 19.99))
     user_balance = float(user_data.get('balance', 0))
@@ -4146,16 +4215,15 @@ def purchase_game(game_id):
             user_data['wishlist'] = wishlist
 
         # Save updated user data
-        users[username] = user_data
-        save_json_file('users.json', users)
+        save_store_user(user_data)
 
         logger.info(f"Purchase successful: {game.get('name', 'Unknown')} by {username}")
 
         return jsonify({
             'message': f'Successfully purchased {game.get("name", "game")}',
             'transactionId': str(uuid.uuid4()),
-            'newBalance': user_data['balance'],
-            'game': game
+            'newBalance': user_data.get('balance', user_balance),
+            'game': dict(game)
         })
 
     except Exception as e:
@@ -4166,44 +4234,10 @@ def purchase_game(game_id):
 @login_required
 def get_user_library():
     """Get user's game library"""
-    username = session.get('username')
-    users = load_json_file('users.json', {})
-    user_data = users.get(username, {})
+    user_data = find_user_by_username(session.get('username')) or {}
     owned_games = user_data.get('owned_games', [])
 
-    # Load games data
-    games_free = load_json_file('games_free_backup.json', [])
-    games_premium = load_json_file('games_premium_backup.json', [])
-
-    library = []
-
-    for game_id in owned_games:
-        game_data = None
-
-        # Check free games
-        if game_id.startswith('free-'):
-            try:
-                index = int(game_id.split('-')[1]) - 1
-                if 0 <= index < len(games_free):
-                    game_data = games_free[index]
-                    game_data['id'] = game_id
-                    game_data['isFree'] = True
-            except:
-                pass
-
-        # Check premium games
-        elif game_id.startswith('premium-'):
-            try:
-                index = int(game_id.split('-')[1]) - 1
-                if 0 <= index < len(games_premium):
-                    game_data = games_premium[index]
-                    game_data['id'] = game_id
-                    game_data['isFree'] = False
-            except:
-                pass
-
-        if game_data:
-            library.append(game_data)
+    library = [dict(game) for game in store_catalog.get_many(owned_games)]
 
     return jsonify(library)
 
@@ -4211,51 +4245,86 @@ def get_user_library():
 @login_required
 def get_user_wishlist():
     """Get user's wishlist"""
-    username = session.get('username')
-    users = load_json_file('users.json', {})
-    user_data = users.get(username, {})
+    user_data = find_user_by_username(session.get('username')) or {}
     wishlist = user_data.get('wishlist', [])
 
-    # Convert wishlist IDs to game data (similar to library)
-    games_free = load_json_file('games_free_backup.json', [])
-    games_premium = load_json_file('games_premium_backup.json', [])
-
-    wishlist_games = []
+    wishlist_games = [dict(game) for game in store_catalog.get_many(wishlist)]
 
-    for game_id in wishlist:
-        game_data = None
+    return jsonify(wishlist_games)
 
-        if game_id.startswith('free-'):
-            try:
-                index = int(game_id.split('-')[1]) - 1
-                if 0 <= index < len(games_free):
-                    game_data = games_free[index]
-                    game_data['id'] = game_id
-                    game_data['isFree'] = True
-            except:
-                pass
-        elif game_id.startswith('premium-'):
-            try:
-                index = int(game_id.split('-')[1]) - 1
-                if 0 <= index < len(games_premium):
-                    game_data = games_premium[index]
-                    game_data['id'] = game_id
-                    game_data['isFree'] = False
-            except:
-                pass
+# Upper bound on ids per batch request
+GAMES_BATCH_MAX_IDS = 500
 
-        if game_data:
-            wishlist_games.append(game_data)
+# Per-user fields computed from the user's library rather than the catalog
+GAMES_BATCH_USER_FIELDS = ('owned', 'wishlisted')
 
-    return jsonify(wishlist_games)
+@app.route('/api/games/batch', methods=['POST'])
+@login_required
+def get_games_batch():
+    """
+    Hydrate several store games in one round trip
+
+    Body: {"ids": ["free-001", ...], "fields": ["name", "price", "owned"]}
+    'fields' is optional; 'owned' and 'wishlisted' are per-user flags.
+    The ETag covers the user's library version, the catalog files and the
+    request itself, so an unchanged library answers 304 Not Modified.
+    """
+    data = request.get_json(silent=True) or {}
+    game_ids = data.get('ids')
+    fields = data.get('fields')
+
+    if not isinstance(game_ids, list) or not all(isinstance(game_id, str) for game_id in game_ids):
+        return jsonify({'error': 'ids must be a list of strings'}), 400
+    if len(game_ids) > GAMES_BATCH_MAX_IDS:
+        return jsonify({'error': f'At most {GAMES_BATCH_MAX_IDS} ids per request'}), 400
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(field, str) for field in fields)):
+        return jsonify({'error': 'fields must be a list of strings'}), 400
+
+    user_data = find_user_by_username(session.get('username')) or {}
+
+    request_key = json.dumps([game_ids, fields], separators=(',', ':'))
+    etag = hashlib.sha1(
+        f"{user_data.get('id')}:{user_data.get('library_version', 0)}:{store_catalog.fingerprint}:{request_key}".encode()
+    ).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    user_fields = []
+    catalog_fields = fields
+    if fields is not None:
+        user_fields = [field for field in fields if field in GAMES_BATCH_USER_FIELDS]
+        catalog_fields = [field for field in fields if field not in GAMES_BATCH_USER_FIELDS]
+
+    games = store_catalog.project(game_ids, catalog_fields)
+
+    if user_fields:
+        owned_games = set(user_data.get('owned_games', []))
+        wishlist = set(user_data.get('wishlist', []))
+        for game in games:
+            if 'owned' in user_fields:
+                game['owned'] = game['id'] in owned_games
+            if 'wishlisted' in user_fields:
+                game['wishlisted'] = game['id'] in wishlist
+
+    response = jsonify({
+        'games': games,
+        'missing': [game_id for game_id in game_ids if game_id not in store_catalog.records]
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/api/games/wishlist/<game_id>', methods=['POST'])
 @login_required
+@users_store_transaction
 def add_to_wishlist(game_id):
     """Add game to wishlist"""
-    username = session.get('username')
-    users = load_json_file('users.json', {})
-    user_data = users.get(username, {})
+    user_data = find_user_by_username(session.get('username'))
+    if not user_data:
+        return jsonify({'error': 'User not found'}), 404
 
     # Check if already owned
     if game_id in user_data.get('owned_games', []):
@@ -4266,28 +4335,43 @@ def add_to_wishlist(game_id):
     if game_id not in wishlist:
         wishlist.append(game_id)
         user_data['wishlist'] = wishlist
-        users[username] = user_data
-        save_json_file('users.json', users)
+        save_store_user(user_data)
 
     return jsonify({'message': 'Added to wishlist'})
 
 @app.route('/api/games/wishlist/<game_id>', methods=['DELETE'])
 @login_required
+@users_store_transaction
 def remove_from_wishlist(game_id):
     """Remove game from wishlist"""
-    username = session.get('username')
-    users = load_json_file('users.json', {})
-    user_data = users.get(username, {})
+    user_data = find_user_by_username(session.get('username'))
+    if not user_data:
+        return jsonify({'error': 'User not found'}), 404
 
     wishlist = user_data.get('wishlist', [])
     if game_id in wishlist:
         wishlist.remove(game_id)
         user_data['wishlist'] = wishlist
-        users[username] = user_data
-        save_json_file('users.json', users)
+        save_store_user(user_data)
 
     return jsonify({'message': 'Removed from wishlist'})
 
+@users_store_transaction
+def save_store_user(user_data):
+    """Write a user's store fields (balance, owned games, wishlist) back to the user store"""
+    users = get_users()
+    for u in users:
+        if u['id'] == user_data['id']:
+            for field in ('balance', 'owned_games', 'wishlist'):
+                if field in user_data:
+                    u[field] = user_data[field]
+            # Invalidates cached /api/games/batch responses for this user
+            u['library_version'] = u.get('library_version', 0) + 1
+            user_data['library_version'] = u['library_version']
+            save_users(users)
+            return True
+    return False
+
 def save_json_file(filename, data):
     """Save data to JSON file"""
     try:
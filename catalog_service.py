@@ -0,0 +1,490 @@
+"""
+Catalog Service Module
+Single owner of the game catalog: fetching, filtering, indexing and
+persistent, versioned snapshots
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Any, Optional, Tuple, Callable, Iterator, List, Mapping
+
+from upstream_client import fetch_upstream_json
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+class CatalogSnapshotStore:
+    """
+    On-disk catalog snapshot written atomically after each refresh
+
+    The file holds two JSON lines: a small header (version, timestamps,
+    counts) and the catalog body. The header can be read without parsing
+    the body; CatalogService parses the body on first use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._header: Optional[Dict[str, Any]] = None
+        self._body: Optional[Dict[str, Any]] = None
+        self._loaded_mtime: Optional[float] = None
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def peek(self) -> Optional[Dict[str, Any]]:
+        """Read only the snapshot header"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                logger.warning(f"Unreadable catalog snapshot header in {self.path}: {e}")
+            return None
+
+        if header.get('format') != SNAPSHOT_FORMAT:
+            logger.warning(f"Ignoring catalog snapshot with unknown format {header.get('format')}")
+            return None
+        return header
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Load the snapshot (header merged with body), parsing the file only when it changed"""
+        with self._lock:
+            mtime = self._mtime()
+            if mtime is None:
+                return None
+            if self._body is not None and mtime == self._loaded_mtime:
+                return dict(self._header, **self._body)
+
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    header = json.loads(f.readline())
+                    body = json.loads(f.readline())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to load catalog snapshot {self.path}: {e}")
+                return None
+
+            if header.get('format') != SNAPSHOT_FORMAT:
+                logger.warning(f"Ignoring catalog snapshot with unknown format {header.get('format')}")
+                return None
+
+            self._header, self._body, self._loaded_mtime = header, body, mtime
+            return dict(header, **body)
+
+    def save(self, free_games: Dict[str, Any], premium_games: Dict[str, Any], source: str = '') -> int:
+        """Atomically write a new snapshot version and return its version number"""
+        with self._lock:
+            previous = self.peek()
+            version = (previous or {}).get('version', 0) + 1
+
+            header = {
+                'format': SNAPSHOT_FORMAT,
+                'version': version,
+                'created_at': time.time(),
+                'source': source,
+                'free_count': len(free_games),
+                'premium_count': len(premium_games),
+            }
+            body = {
+                'free_games': free_games,
+                'premium_games': premium_games,
+            }
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(prefix='.catalog-', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(header))
+                    f.write('\n')
+                    f.write(json.dumps(body, ensure_ascii=False))
+                    f.write('\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except Exception:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+
+            self._header, self._body, self._loaded_mtime = header, body, self._mtime()
+            return version
+
+
+# Upstream access codes for each catalog tier
+ACCESS_TIERS = {
+    "1": "free",
+    "2": "premium"
+}
+
+# Placeholder game name rules, matched against the whole stripped name
+DEFAULT_PLACEHOLDER_RULES = [
+    {'name': 'game_number', 'pattern': r'GAME\s+\d+', 'ignore_case': False},  # "GAME XX"
+    {'name': 'placeholder', 'pattern': r'PLACEHOLDER\s*\d*'},                 # "PLACEHOLDER" or "PLACEHOLDER XX"
+    {'name': 'test', 'pattern': r'TEST\s*\d*'},                               # "TEST" or "TEST XX"
+    {'name': 'untitled', 'pattern': r'UNTITLED\s*\d*'},                       # "UNTITLED" or "UNTITLED XX"
+    {'name': 'unknown', 'pattern': r'UNKNOWN\s*\d*'},                         # "UNKNOWN" or "UNKNOWN XX"
+    {'name': 'unnamed', 'pattern': r'UNNAMED\s*\d*'},                         # "UNNAMED" or "UNNAMED XX"
+    {'name': 'temp', 'pattern': r'TEMP\s*\d*'}                                # "TEMP" or "TEMP XX"
+]
+
+# Rejection reason for games without a name
+EMPTY_NAME_RULE = 'empty_name'
+
+
+class PlaceholderFilter:
+    """
+    Placeholder name filter compiled once into a single alternation
+
+    Each rule becomes a named group, so one fullmatch both decides and
+    reports which rule rejected the name.
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = list(rules if rules is not None else DEFAULT_PLACEHOLDER_RULES)
+
+        alternatives = []
+        self.rule_names = []
+        for i, rule in enumerate(self.rules):
+            # Named groups must be identifiers; keep the configured name for reporting
+            group = f"r{i}"
+            body = rule['pattern']
+            if rule.get('ignore_case', True):
+                body = f"(?i:{body})"
+            alternatives.append(f"(?P<{group}>{body})")
+            self.rule_names.append(rule.get('name', group))
+
+        self._groups = {f"r{i}": name for i, name in enumerate(self.rule_names)}
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def match(self, name: str) -> Optional[str]:
+        """Return the name of the rule rejecting this game name, or None"""
+        if not name:
+            return EMPTY_NAME_RULE
+        if self.pattern is None:
+            return None
+        m = self.pattern.fullmatch(name)
+        return self._groups[m.lastgroup] if m else None
+
+
+class CatalogService:
+    """
+    Unified game catalog
+
+    Holds one copy of the filtered catalog split into free and premium
+    tiers plus an id index over both. Refreshes go through the upstream
+    client and every successful refresh is persisted as a new snapshot
+    version.
+
+    At startup load_snapshot() reads only the snapshot header; the body is
+    parsed when a handler first reads games, so booting does not wait for
+    a full parse of a large catalog.
+    """
+
+    def __init__(self, fetch_url: str, snapshot_path: str, lifetime: int = 3600,
+                 fetcher: Callable = fetch_upstream_json, placeholder_rules: Optional[List[Dict[str, Any]]] = None):
+        self.fetch_url = fetch_url
+        self.lifetime = lifetime
+        self.snapshot = CatalogSnapshotStore(snapshot_path)
+        self._fetch = fetcher
+        self.placeholder_filter = PlaceholderFilter(placeholder_rules)
+
+        self.free_games: Optional[Dict[str, Any]] = None
+        self.premium_games: Optional[Dict[str, Any]] = None
+        self.index: Dict[str, Tuple[str, Dict[str, Any]]] = {}  # game_id -> (access, game)
+        self.version = 0
+        self.last_updated = 0.0
+        self.filtered_count = 0
+        self.rejections: Dict[str, int] = {}  # rule name -> games rejected in the last refresh
+        self._pending_snapshot: Optional[Dict[str, Any]] = None  # header of a snapshot not parsed yet
+        self._unreadable_snapshot = None  # (version, created_at) of a snapshot whose body failed to parse
+
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.free_games is not None or self._pending_snapshot is not None
+
+    def _install(self, free_games: Dict[str, Any], premium_games: Dict[str, Any], version: int, updated_at: float,
+                 replaces_pending: bool = False) -> bool:
+        """Swap in a new catalog generation; with replaces_pending, only if no refresh got there first"""
+        # Free entries win when an id appears in both tiers
+        index = {}
+        for game_id, game in premium_games.items():
+            index[game_id] = ("premium", game)
+        for game_id, game in free_games.items():
+            index[game_id] = ("free", game)
+
+        with self._lock:
+            if replaces_pending and self._pending_snapshot is None:
+                return False
+            self.free_games = free_games
+            self.premium_games = premium_games
+            self.index = index
+            self.version = version
+            self.last_updated = updated_at
+            self._pending_snapshot = None
+        return True
+
+    def set_placeholder_rules(self, rules: Optional[List[Dict[str, Any]]]):
+        """Replace the placeholder rules used by the next refresh"""
+        self.placeholder_filter = PlaceholderFilter(rules)
+
+    def filter_games(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]:
+        """Drop unnamed and placeholder games and split the rest by access tier"""
+        tiers = {"free": {}, "premium": {}}
+        rejections = dict.fromkeys(self.placeholder_filter.rule_names, 0)
+        rejections[EMPTY_NAME_RULE] = 0
+        match = self.placeholder_filter.match
+        access_tiers = ACCESS_TIERS
+
+        for game_id, game_data in data.items():
+            rule = match(game_data.get('name', '').strip())
+            if rule is not None:
+                rejections[rule] += 1
+                continue
+
+            # Categorize by access type
+            tier = tiers.get(access_tiers.get(game_data.get('access')))
+            if tier is not None:
+                tier[game_id] = game_data
+
+        return tiers["free"], tiers["premium"], rejections
+
+    def load_snapshot(self) -> bool:
+        """Adopt the on-disk snapshot if the catalog is still empty, reading only its header"""
+        if self.loaded:
+            return True
+
+        header = self.snapshot.peek()
+        if not header or (header["version"], header["created_at"]) == self._unreadable_snapshot:
+            return False
+
+        with self._lock:
+            if self.free_games is None:
+                self._pending_snapshot = header
+                self.version = header["version"]
+                self.last_updated = header["created_at"]
+        logger.info(f"Using catalog snapshot v{header['version']}: "
+                    f"{header['free_count']} free games, {header['premium_count']} premium games")
+        return True
+
+    def _materialize(self):
+        """Parse the body of a snapshot adopted by load_snapshot, once, on first access to the games"""
+        if self._pending_snapshot is None:
+            return
+
+        with self._snapshot_lock:
+            if self._pending_snapshot is None:
+                return
+            snapshot = self.snapshot.load()
+            if not snapshot:
+                # Skip this snapshot from now on; ensure_loaded falls back to a refresh
+                with self._lock:
+                    pending, self._pending_snapshot = self._pending_snapshot, None
+                if pending is not None:
+                    self._unreadable_snapshot = (pending["version"], pending["created_at"])
+                return
+            self._install(snapshot["free_games"], snapshot["premium_games"], snapshot["version"],
+                          snapshot["created_at"], replaces_pending=True)
+
+    def apply_response(self, response) -> bool:
+        """Filter, index and persist a fetched upstream catalog"""
+        try:
+            if not response.ok:
+                logger.warning(f"Catalog upstream error: {response.error}")
+                return False
+
+            # Catalog unchanged upstream - keep the current generation
+            if response.not_modified and self.loaded:
+                self.last_updated = time.time()
+                logger.info("Catalog not modified upstream, cache kept")
+                return True
+
+            free_games, premium_games, rejections = self.filter_games(response.data)
+            filtered_count = sum(rejections.values())
+            self.filtered_count = filtered_count
+            self.rejections = rejections
+
+            # Persist the processed catalog as the new last good snapshot
+            version = self.version + 1
+            try:
+                version = self.snapshot.save(free_games, premium_games, source=response.url)
+            except Exception as e:
+                logger.error(f"Error saving catalog snapshot: {e}")
+
+            self._install(free_games, premium_games, version, time.time())
+
+            logger.info(f"Catalog v{version} cached: {len(free_games)} free games, {len(premium_games)} premium games, "
+                        f"{filtered_count} placeholder games filtered out")
+            return True
+        except Exception as e:
+            logger.error(f"Error processing catalog: {e}")
+            return False
+
+    def refresh(self) -> bool:
+        """Fetch and apply the upstream catalog (blocking)"""
+        return self.apply_response(self._fetch(self.fetch_url))
+
+    def refresh_in_background(self):
+        """Refresh in a daemon thread unless a refresh is already running"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        def worker():
+            try:
+                self.refresh()
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def ensure_loaded(self) -> bool:
+        """
+        Make sure request handlers have a catalog to read
+
+        Only blocks on the network when neither memory nor disk has a
+        catalog; a stale catalog is served while it refreshes in the
+        background.
+        """
+        if not self.loaded and not self.load_snapshot():
+            return self.refresh()
+
+        if time.time() - self.last_updated > self.lifetime:
+            self.refresh_in_background()
+        return True
+
+    def get_tier(self, access: str) -> Dict[str, Any]:
+        """Get the games of one tier ('free' or 'premium')"""
+        self._materialize()
+        games = self.free_games if access == "free" else self.premium_games
+        return games or {}
+
+    def get_game(self, game_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Look up a game by id, returning (game, access)"""
+        self._materialize()
+        entry = self.index.get(str(game_id))
+        if entry is None:
+            return None, None
+        access, game = entry
+        return game, access
+
+    def iter_games(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Iterate (game_id, access, game) over both tiers"""
+        for game_id, game in self.get_tier("free").items():
+            yield game_id, "free", game
+        for game_id, game in self.get_tier("premium").items():
+            yield game_id, "premium", game
+
+    def counts(self) -> Dict[str, int]:
+        free_count = len(self.get_tier("free"))
+        premium_count = len(self.get_tier("premium"))
+        return {"free": free_count, "premium": premium_count, "total": free_count + premium_count}
+
+
+class StoreCatalog:
+    """
+    Store game records keyed by 'free-NNN' / 'premium-NNN'
+
+    Built from the store backup lists and rebuilt only when one of the
+    files changes on disk. Records are read-only mappings shared between
+    requests; callers copy them to build responses.
+    """
+
+    def __init__(self, sources: Dict[str, str]):
+        self.sources = sources  # access -> path of a JSON list of games
+        self.records: Dict[str, Mapping[str, Any]] = {}
+        self.version = 0
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        signature = []
+        for access, path in sorted(self.sources.items()):
+            try:
+                stat = os.stat(path)
+                signature.append((access, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((access, None, None))
+        return tuple(signature)
+
+    def _load_games(self, path: str) -> List[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                games = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load store games from {path}: {e}")
+            return []
+        return games if isinstance(games, list) else []
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild the id map if a source file changed; returns True when rebuilt"""
+        signature = self._current_signature()
+        if not force and signature == self._signature:
+            return False
+
+        with self._lock:
+            if not force and signature == self._signature:
+                return False
+
+            records = {}
+            for access, path in self.sources.items():
+                for i, game in enumerate(self._load_games(path)):
+                    if not isinstance(game, dict):
+                        continue
+                    game_id = f"{access}-{i + 1:03d}"
+                    records[game_id] = MappingProxyType(dict(game, id=game_id, isFree=access == 'free'))
+
+            self.records = records
+            self._signature = signature
+            self.version += 1
+            logger.info(f"Store catalog v{self.version} loaded: {len(records)} games")
+            return True
+
+    def get(self, game_id: str) -> Optional[Mapping[str, Any]]:
+        """Look up one store game record"""
+        self.refresh()
+        return self.records.get(game_id)
+
+    def get_many(self, game_ids: List[str]) -> List[Mapping[str, Any]]:
+        """Look up several records, skipping unknown ids, in the given order"""
+        self.refresh()
+        records = self.records
+        return [records[game_id] for game_id in game_ids if game_id in records]
+
+    def project(self, game_ids: List[str], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Compact copies of several records holding only the requested fields
+
+        'id' is always included; fields a record does not have are omitted.
+        With fields=None the full records are copied.
+        """
+        records = self.get_many(game_ids)
+        if fields is None:
+            return [dict(record) for record in records]
+
+        wanted = ['id'] + [field for field in dict.fromkeys(fields) if field != 'id']
+        return [{field: record[field] for field in wanted if field in record} for record in records]
+
+    @property
+    def fingerprint(self) -> str:
+        """Short hash of the source files' state, identical across worker processes"""
+        self.refresh()
+        return hashlib.sha1(repr(self._signature).encode()).hexdigest()[:12]
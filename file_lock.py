@@ -0,0 +1,92 @@
+"""
+File Lock Module
+Lock on a lock file, shared by the threads and processes (gunicorn workers)
+that read-modify-write one of the JSON stores
+"""
+
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+def _lock(f):
+    """Block until this process holds the lock file exclusively"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK gives up after about 10 seconds; keep waiting like flock
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            logger.warning(f"Still waiting for {f.name}")
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    Reentrant lock that also excludes other processes
+
+    Threads of one process queue on an RLock; the outermost holder then
+    takes an exclusive lock on path (flock, or msvcrt.locking on Windows),
+    which holders in other processes wait for. Nested acquires by the
+    holding thread only count, like the RLock this replaces. The lock file
+    itself stays empty and is never removed, so every process locks the
+    same inode.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0  # only changed by the thread holding _lock
+        self._file = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                f = open(self.path, 'a+b')
+                try:
+                    _lock(f)
+                except BaseException:
+                    f.close()
+                    raise
+            except BaseException:
+                self._lock.release()
+                raise
+            self._file = f
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            f, self._file = self._file, None
+            try:
+                _unlock(f)
+            finally:
+                f.close()
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
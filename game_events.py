@@ -0,0 +1,247 @@
+"""
+Game Events Module
+Columnar in-memory store of the games-added feed, one set of arrays per day,
+so day summaries and payloads come from arrays instead of reloading JSON
+"""
+
+import calendar
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Any, Optional, Iterable, List
+
+from game_stats import DaySummary, HOURS, TIMESTAMP_FORMAT, TIMESTAMP_RE
+
+logger = logging.getLogger(__name__)
+
+# Days kept in memory before the least recently used one is dropped
+DEFAULT_MAX_DAYS = 64
+
+# Timestamp column value of events whose timestamp does not parse
+MISSING_TIMESTAMP = -(2 ** 63)
+
+# Interned strings kept before dropped days trigger a compaction of the interners
+MIN_COMPACT_SIZE = 4096
+
+
+@lru_cache(maxsize=1024)
+def _midnight_epoch(date_str: str) -> int:
+    return calendar.timegm(datetime.strptime(date_str, '%Y-%m-%d').timetuple())
+
+
+def to_epoch(timestamp) -> int:
+    """
+    Seconds since the epoch of a feed timestamp, or MISSING_TIMESTAMP
+
+    Feed timestamps carry no timezone; they are read as UTC so that
+    (epoch // 3600) % 24 is the hour written in the feed, DST or not.
+    """
+    if not isinstance(timestamp, str):
+        return MISSING_TIMESTAMP
+    if TIMESTAMP_RE.fullmatch(timestamp):
+        try:
+            midnight = _midnight_epoch(timestamp[:10])
+        except ValueError:
+            return MISSING_TIMESTAMP
+        return midnight + int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+    try:
+        return calendar.timegm(datetime.strptime(timestamp, TIMESTAMP_FORMAT).timetuple())
+    except ValueError:
+        return MISSING_TIMESTAMP
+
+
+def from_epoch(epoch: int) -> str:
+    """Feed timestamp of an epoch value ('' for MISSING_TIMESTAMP)"""
+    if epoch == MISSING_TIMESTAMP:
+        return ''
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(epoch))
+
+
+class Interner:
+    """Strings mapped to dense integer ids, shared by every day in the store"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def intern(self, value: str) -> int:
+        index = self.ids.setdefault(value, len(self.values))
+        if index == len(self.values):
+            self.values.append(value)
+        return index
+
+    def __len__(self):
+        return len(self.values)
+
+
+class DayColumns:
+    """
+    One day of events as parallel arrays, ordered by timestamp
+
+    timestamps: array('q') of epoch seconds (MISSING_TIMESTAMP first)
+    games, users: array('I') of ids in the store's interners
+    ingested_at: local time the day was last ingested from a full feed
+    payload (None for days only grown by append)
+    """
+
+    __slots__ = ('date', 'games_added', 'timestamps', 'games', 'users', 'ingested_at')
+
+    def __init__(self, date: str, games_added: int = 0, ingested_at: Optional[datetime] = None):
+        self.date = date
+        self.games_added = games_added
+        self.ingested_at = ingested_at
+        self.timestamps = array('q')
+        self.games = array('I')
+        self.users = array('I')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def is_complete(self) -> bool:
+        """Whether the day was ingested after it ended, so no later events can be missing"""
+        if self.ingested_at is None:
+            return False
+        return self.ingested_at >= datetime.strptime(self.date, '%Y-%m-%d') + timedelta(days=1)
+
+
+class GameEventStore:
+    """
+    Games-added events by day in columnar arrays
+
+    A day is ingested once from a feed payload (ingest_day) or grown
+    event by event (append); after that its summary (hourly histogram,
+    distinct users) and feed payload come from its arrays. game_id
+    and user_id strings are interned once for the whole store, so a day
+    costs 16 bytes per event. At most max_days days are kept; the least
+    recently used one is dropped first. Once the interners hold twice as
+    many strings as after their last compaction, dropping a day rebuilds
+    them from the days still kept, so ids of dropped days do not pile up.
+    """
+
+    def __init__(self, max_days: int = DEFAULT_MAX_DAYS):
+        self.max_days = max_days
+        self.games = Interner()
+        self.users = Interner()
+        self.days: OrderedDict = OrderedDict()
+        self._compacted_size = 0  # len(games) + len(users) after the last compaction
+        self._lock = threading.RLock()
+
+    def ingest_day(self, date_str: str, data: Optional[Dict[str, Any]],
+                   ingested_at: Optional[datetime] = None) -> DayColumns:
+        """
+        Replace a day with the events of a feed payload ({'games_added', 'details'})
+
+        ingested_at (default now) tells whether the payload can still miss
+        events: see has_complete_day.
+        """
+        data = data or {}
+        details = data.get('details') or []
+        epochs = [to_epoch(game.get('timestamp', '')) for game in details]
+        order = sorted(range(len(details)), key=epochs.__getitem__)
+
+        columns = DayColumns(date_str, data.get('games_added', 0) or 0, ingested_at or datetime.now())
+        columns.timestamps = array('q', [epochs[i] for i in order])
+        # Interned and stored under one lock, so a compaction cannot renumber the ids in between
+        with self._lock:
+            games = [self.games.intern(str(game.get('game_id', ''))) for game in details]
+            users = [self.users.intern(str(game.get('user_id', ''))) for game in details]
+            columns.games = array('I', [games[i] for i in order])
+            columns.users = array('I', [users[i] for i in order])
+            self.days[date_str] = columns
+            self.days.move_to_end(date_str)
+            self._evict()
+        return columns
+
+    def append(self, date_str: str, events: Iterable[Dict[str, Any]]) -> int:
+        """Add events ({'game_id', 'user_id', 'timestamp'}) to a day, creating it if needed; returns the count"""
+        added = 0
+        with self._lock:
+            columns = self.days.get(date_str)
+            if columns is None:
+                columns = self.days[date_str] = DayColumns(date_str)
+            self.days.move_to_end(date_str)
+            for event in events:
+                epoch = to_epoch(event.get('timestamp', ''))
+                position = bisect_left(columns.timestamps, epoch + 1) if epoch != MISSING_TIMESTAMP else 0
+                columns.timestamps.insert(position, epoch)
+                columns.games.insert(position, self.games.intern(str(event.get('game_id', ''))))
+                columns.users.insert(position, self.users.intern(str(event.get('user_id', ''))))
+                added += 1
+            columns.games_added += added
+            self._evict()
+        return added
+
+    def _evict(self):
+        dropped = False
+        while len(self.days) > self.max_days:
+            date_str, _ = self.days.popitem(last=False)
+            logger.debug(f"Dropped game events of {date_str}")
+            dropped = True
+        if dropped and len(self.games) + len(self.users) > max(MIN_COMPACT_SIZE, 2 * self._compacted_size):
+            self._compact()
+
+    def _compact(self):
+        """Re-intern the strings of the days still kept; call with the lock held"""
+        games, users = Interner(), Interner()
+        old_games, old_users = self.games.values, self.users.values
+        for columns in self.days.values():
+            columns.games = array('I', [games.intern(old_games[game]) for game in columns.games])
+            columns.users = array('I', [users.intern(old_users[user]) for user in columns.users])
+        logger.debug(f"Compacted game event interners from {len(self.games) + len(self.users)} "
+                     f"to {len(games) + len(users)} strings")
+        self.games, self.users = games, users
+        self._compacted_size = len(games) + len(users)
+
+    def has_day(self, date_str: str) -> bool:
+        return date_str in self.days
+
+    def has_complete_day(self, date_str: str) -> bool:
+        """Whether a day is kept and was ingested after it ended (see DayColumns.is_complete)"""
+        columns = self.days.get(date_str)
+        return columns is not None and columns.is_complete()
+
+    def day(self, date_str: str) -> Optional[DayColumns]:
+        with self._lock:
+            columns = self.days.get(date_str)
+            if columns is not None:
+                self.days.move_to_end(date_str)
+            return columns
+
+    def summary(self, date_str: str) -> DaySummary:
+        """Hourly histogram and distinct users of a day (an empty summary for unknown days)"""
+        columns = self.day(date_str)
+        if columns is None:
+            return DaySummary(date_str)
+        hourly = array('I', [0]) * HOURS
+        for epoch in columns.timestamps:
+            if epoch != MISSING_TIMESTAMP:
+                hourly[epoch // 3600 % 24] += 1
+        return DaySummary(date_str, columns.games_added, len(columns), hourly, len(set(columns.users)))
+
+    def payload(self, date_str: str) -> Optional[Dict[str, Any]]:
+        """A day in the feed's shape ({'date', 'games_added', 'details'}), oldest event first"""
+        with self._lock:
+            columns = self.day(date_str)
+            if columns is None:
+                return None
+            games, users = self.games.values, self.users.values
+            return {
+                'date': date_str,
+                'games_added': columns.games_added,
+                'details': [{'game_id': games[game], 'user_id': users[user], 'timestamp': from_epoch(epoch)}
+                            for epoch, game, user in zip(columns.timestamps, columns.games, columns.users)]
+            }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'days': len(self.days),
+                'events': sum(len(columns) for columns in self.days.values()),
+                'games': len(self.games),
+                'users': len(self.users)
+            }
@@ -0,0 +1,281 @@
+"""
+Game Stats Module
+Per-day summaries of the games-added feed, computed once when a day's data
+is loaded so the stats pages and /api/game_stats read precomputed arrays,
+and rolling weekly/monthly windows over those summaries
+"""
+
+import logging
+import re
+import threading
+from array import array
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Format of details[].timestamp in the games-added feed
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Slots of the hourly histograms
+HOURS = 24
+
+# Format of the feed's dates
+DATE_FORMAT = '%Y-%m-%d'
+
+# Window lengths (days) kept by the period aggregator
+DEFAULT_WINDOWS = (7, 30)
+
+# Change (percent) between the halves of a window reported as a trend
+TREND_THRESHOLD_PERCENT = 5.0
+
+# Timestamps already in TIMESTAMP_FORMAT are sliced instead of parsed
+TIMESTAMP_RE = re.compile(r'\d{4}-\d{2}-\d{2} ([01]\d|2[0-3]):[0-5]\d:[0-5]\d')
+
+
+def hour_of(timestamp) -> Optional[int]:
+    """Hour of a feed timestamp, or None if it does not parse"""
+    if not isinstance(timestamp, str):
+        return None
+    if TIMESTAMP_RE.fullmatch(timestamp):
+        return int(timestamp[11:13])
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT).hour
+    except ValueError:
+        return None
+
+
+def time_of(timestamp) -> Optional[str]:
+    """'HH:MM:SS' of a feed timestamp, or None if it does not parse"""
+    if not isinstance(timestamp, str):
+        return None
+    if TIMESTAMP_RE.fullmatch(timestamp):
+        return timestamp[11:]
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT).strftime('%H:%M:%S')
+    except ValueError:
+        return None
+
+
+def format_hour_range(hour: Optional[int]) -> str:
+    """'8 AM-9 AM' style label of an hour, or 'N/A'"""
+    if hour is None:
+        return "N/A"
+    hour_end = (hour + 1) % 24
+
+    # Convert to 12-hour format with AM/PM
+    hour_start_12 = hour if hour <= 12 else hour - 12
+    hour_start_12 = 12 if hour_start_12 == 0 else hour_start_12
+
+    hour_end_12 = hour_end if hour_end <= 12 else hour_end - 12
+    hour_end_12 = 12 if hour_end_12 == 0 else hour_end_12
+
+    am_pm_start = "AM" if hour < 12 else "PM"
+    am_pm_end = "AM" if hour_end < 12 else "PM"
+
+    return f"{hour_start_12} {am_pm_start}-{hour_end_12} {am_pm_end}"
+
+
+def peak_of(hourly) -> Optional[int]:
+    """Earliest hour with the most events, or None if there are none"""
+    peak = max(hourly)
+    return hourly.index(peak) if peak else None
+
+
+class DaySummary:
+    """
+    Aggregates of one day of the games-added feed
+
+    hourly is a 24-slot array('I') of events per hour; events whose
+    timestamp does not parse are left out of it, as the per-request
+    parsing used to do. peak_hour is the earliest hour with the most
+    events, or None for a day without parseable events.
+    """
+
+    __slots__ = ('date', 'games_added', 'events', 'hourly', 'unique_users', 'peak_hour')
+
+    def __init__(self, date, games_added=0, events=0, hourly=None, unique_users=0):
+        self.date = date
+        self.games_added = games_added
+        self.events = events
+        self.hourly = hourly if hourly is not None else array('I', [0]) * HOURS
+        self.unique_users = unique_users
+        self.peak_hour = peak_of(self.hourly)
+
+    def hourly_distribution(self) -> Dict[int, int]:
+        """{hour: events} for the hours that had any"""
+        return {hour: count for hour, count in enumerate(self.hourly) if count}
+
+    def __repr__(self):
+        return (f"DaySummary(date={self.date!r}, games_added={self.games_added}, "
+                f"events={self.events}, unique_users={self.unique_users}, peak_hour={self.peak_hour})")
+
+
+def summarize_day(data: Optional[Dict[str, Any]], date_str: Optional[str] = None) -> DaySummary:
+    """Bucket a day's details by hour and count its distinct users in one pass"""
+    data = data or {}
+    details = data.get('details') or []
+    hourly = array('I', [0]) * HOURS
+    users = set()
+    for game in details:
+        users.add(game.get('user_id', ''))
+        hour = hour_of(game.get('timestamp', ''))
+        if hour is not None:
+            hourly[hour] += 1
+    return DaySummary(data.get('date', date_str), data.get('games_added', 0) or 0,
+                      len(details), hourly, len(users))
+
+
+class RollingRange:
+    """Sums over the closed days between lo and hi days ago (inclusive)"""
+
+    __slots__ = ('lo', 'hi', 'games_added', 'hourly')
+
+    def __init__(self, lo: int, hi: int):
+        self.lo = lo
+        self.hi = hi
+        self.games_added = 0
+        self.hourly = array('I', [0]) * HOURS
+
+    def shift(self, history: deque):
+        """Move the range one day back after a day was appended to history"""
+        if self.lo > self.hi:
+            return
+        if len(history) >= self.lo:
+            self._apply(history[-self.lo], 1)
+        if len(history) > self.hi:
+            self._apply(history[-(self.hi + 1)], -1)
+
+    def _apply(self, summary: DaySummary, sign: int):
+        self.games_added += sign * summary.games_added
+        hourly = self.hourly
+        for hour, count in enumerate(summary.hourly):
+            if count:
+                hourly[hour] += sign * count
+
+
+class PeriodAggregator:
+    """
+    Rolling windows over per-day summaries for the weekly/monthly stats
+
+    A window of n days is today (still open; its summary is replaced
+    whenever the day's data is refreshed) plus the n-1 closed days before
+    it. For every window the sums over its closed days, and over the
+    older and newer halves of them for the trend, are moved along by one
+    day as each day closes: the day entering a range is added and the one
+    leaving it is subtracted, so closing a day does not depend on the
+    window length. Results are cached per window until today's summary
+    changes or another day closes.
+
+    The trend compares the newer half of the closed days with the older
+    half (the middle day of an odd count is left out); today is not part
+    of it because it is incomplete.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        self.windows = tuple(sorted(set(windows)))
+        if not self.windows or self.windows[0] < 1:
+            raise ValueError('Windows must be at least one day long')
+        self.history: deque = deque(maxlen=self.windows[-1])
+        self.last_closed = None
+        self.today: Optional[DaySummary] = None
+        self._ranges: Dict[int, Dict[str, RollingRange]] = {}
+        for days in self.windows:
+            half = (days - 1) // 2
+            self._ranges[days] = {
+                'closed': RollingRange(1, days - 1),
+                'newer': RollingRange(1, half),
+                'older': RollingRange(days - half, days - 1)
+            }
+        self._results: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def advance(self, today_str: str, load_summary: Callable[[str], DaySummary]) -> int:
+        """
+        Close every day before today_str that is not closed yet
+
+        Only days that can still be part of a window are loaded, so the
+        first call (or one after a long gap) loads the longest window.
+        Returns the number of days closed.
+        """
+        today = datetime.strptime(today_str, DATE_FORMAT).date()
+        with self._lock:
+            earliest = today - timedelta(days=self.history.maxlen)
+            day = earliest if self.last_closed is None else max(self.last_closed + timedelta(days=1), earliest)
+            closed = 0
+            while day < today:
+                self._close(load_summary(day.strftime(DATE_FORMAT)))
+                self.last_closed = day
+                day += timedelta(days=1)
+                closed += 1
+            return closed
+
+    def _close(self, summary: DaySummary):
+        self.history.append(summary)
+        for ranges in self._ranges.values():
+            for rolling in ranges.values():
+                rolling.shift(self.history)
+        self._results.clear()
+
+    def set_today(self, summary: DaySummary):
+        """Replace the open day's summary"""
+        with self._lock:
+            if summary is not self.today:
+                self.today = summary
+                self._results.clear()
+
+    def window(self, days: int) -> Dict[str, Any]:
+        """Totals, average, peak hour, trend and per-day values of a window, oldest day first"""
+        if days not in self._ranges:
+            raise ValueError(f'No {days}-day window is kept')
+        with self._lock:
+            result = self._results.get(days)
+            if result is None:
+                result = self._results[days] = self._compute(days)
+            return result
+
+    def _compute(self, days: int) -> Dict[str, Any]:
+        ranges = self._ranges[days]
+        summaries: List[DaySummary] = list(self.history)[-(days - 1):] if days > 1 else []
+        hourly = array('I', ranges['closed'].hourly)
+        total = ranges['closed'].games_added
+        if self.today is not None:
+            summaries.append(self.today)
+            total += self.today.games_added
+            for hour, count in enumerate(self.today.hourly):
+                hourly[hour] += count
+
+        peak_hour = peak_of(hourly)
+        trend, trend_percent = self._trend(ranges['newer'].games_added, ranges['older'].games_added)
+        labels = []
+        for summary in summaries:
+            try:
+                labels.append(datetime.strptime(summary.date, DATE_FORMAT).strftime('%b %d'))
+            except (TypeError, ValueError):
+                labels.append(str(summary.date))
+
+        return {
+            'days': [{'date': summary.date, 'games_added': summary.games_added, 'unique_users': summary.unique_users}
+                     for summary in summaries],
+            'labels': labels,
+            'values': [summary.games_added for summary in summaries],
+            'total_games_added': total,
+            'average_games_per_day': round(total / len(summaries), 1) if summaries else 0,
+            'peak_hour': format_hour_range(peak_hour),
+            'peak_hour_raw': peak_hour,
+            'trend': trend,
+            'trend_percent': trend_percent
+        }
+
+    @staticmethod
+    def _trend(newer: int, older: int):
+        """('up' | 'down' | 'stable' | 'N/A', percent change or None)"""
+        if not older:
+            return ('up', None) if newer else ('N/A', None)
+        percent = round((newer - older) * 100.0 / older, 1)
+        if percent >= TREND_THRESHOLD_PERCENT:
+            return 'up', percent
+        if percent <= -TREND_THRESHOLD_PERCENT:
+            return 'down', percent
+        return 'stable', percent
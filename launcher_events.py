@@ -0,0 +1,121 @@
+"""
+Launcher Events Module
+Local publish/subscribe of launcher status changes for long-poll delivery
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Events kept for subscribers that reconnect with an older cursor
+DEFAULT_BUFFER_SIZE = 1000
+
+# Longest time (seconds) a subscriber is held before an empty answer. Each
+# waiting subscriber occupies a request worker, so keep this short under
+# gunicorn's sync workers; longer holds need the gthread or gevent worker class
+DEFAULT_WAIT_TIMEOUT = 5
+
+# How often (seconds) a waiting subscriber checks for changes made by other processes
+DEFAULT_CHECK_INTERVAL = 1.0
+
+
+class LauncherEventBus:
+    """
+    In-process event buffer with blocking reads
+
+    Every process keeps its own bus. Events are produced from launcher
+    presence rebuilds, so a change saved by any worker reaches subscribers
+    in every worker once their process notices the file change; waiting
+    subscribers trigger that check every check_interval seconds.
+
+    Cursors are '<bus id>:<sequence>'. A cursor from another process (or a
+    restarted one) cannot be mapped to this buffer and starts from now;
+    callers return the current state alongside events so nothing is lost.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 check_for_changes: Optional[Callable[[], None]] = None):
+        self.bus_id = uuid.uuid4().hex[:8]
+        self.check_interval = check_interval
+        self.check_for_changes = check_for_changes
+        self.events: deque = deque(maxlen=buffer_size)
+        self.sequence = 0
+        self._condition = threading.Condition()
+        self.stats = {'published': 0, 'waits': 0, 'delivered': 0, 'timeouts': 0}
+
+    def publish(self, changes: List[Dict[str, Any]]):
+        """Append changes to the buffer and wake every waiting subscriber"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._condition:
+            for change in changes:
+                self.sequence += 1
+                self.events.append(dict(change, id=self.sequence, timestamp=timestamp))
+            self.stats['published'] += len(changes)
+            self._condition.notify_all()
+
+    def cursor(self, sequence: Optional[int] = None) -> str:
+        """Cursor pointing after the given (default: latest) event"""
+        return f"{self.bus_id}:{self.sequence if sequence is None else sequence}"
+
+    def _parse_cursor(self, cursor: Optional[str]) -> int:
+        """Sequence to read after; foreign or missing cursors start from now"""
+        if cursor:
+            bus_id, _, sequence = str(cursor).partition(':')
+            if bus_id == self.bus_id and sequence.isdigit():
+                return min(int(sequence), self.sequence)
+        return self.sequence
+
+    def _collect(self, after: int, user_id: str, device_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Events after a sequence number addressed to a user, or to one of their devices"""
+        if after >= self.sequence:
+            return []
+        return [
+            event for event in self.events
+            if event['id'] > after and event['user_id'] == user_id
+            and (event['type'] != 'device_disconnected' or device_id is None or event['device_id'] == device_id)
+        ]
+
+    def wait(self, user_id: str, device_id: Optional[str] = None, cursor: Optional[str] = None,
+             timeout: float = DEFAULT_WAIT_TIMEOUT) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Block until events for a subscriber arrive or the timeout passes
+
+        Returns (events, next_cursor).
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+
+        with self._condition:
+            after = self._parse_cursor(cursor)
+            self.stats['waits'] += 1
+
+        while True:
+            with self._condition:
+                events = self._collect(after, user_id, device_id)
+                if events:
+                    self.stats['delivered'] += len(events)
+                    return events, self.cursor(events[-1]['id'])
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    return [], self.cursor(max(after, self.sequence))
+
+                self._condition.wait(min(self.check_interval, remaining))
+
+            # Changes written by other processes only show up when someone looks
+            if self.check_for_changes:
+                try:
+                    self.check_for_changes()
+                except Exception as e:
+                    logger.error(f"Launcher event change check failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer size and delivery counters"""
+        with self._condition:
+            return dict(self.stats, buffered=len(self.events), sequence=self.sequence)
@@ -0,0 +1,312 @@
+"""
+Launcher Presence Module
+In-memory view of launcher users and devices that answers the launcher
+polling endpoints without reading the user store on every request
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Statuses that keep launcher access
+LAUNCHER_STATUSES = ('Premium', 'Admin', 'Premium (Aligned)')
+
+# Format of last_connection timestamps in the user store; compares lexicographically
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Default interval (seconds) between writes of pending heartbeats to the user store
+DEFAULT_FLUSH_INTERVAL = 60
+
+
+class LauncherPresence:
+    """
+    Presence table built from the user store
+
+    users:    user_id -> {'status', 'status_expires', 'has_launcher_code', 'primary_device_id', 'primary_device'}
+    devices:  (user_id, device_id) -> {'last_seen', 'disconnected', 'force_disconnect', 'active', 'record'}
+    registry: device_id -> {'user_id', 'status', 'last_seen'}
+    user_devices: user_id -> [device_id, ...] in user store order
+
+    The user store stays the source of truth. The table is rebuilt whenever
+    this process saves users (sync) and whenever the file changes on disk,
+    which keeps several worker processes consistent at the cost of one
+    stat() per poll. Heartbeats only update last_seen in memory; they are
+    written back in one save by flush(). With a flush_interval, the first
+    heartbeat in a process starts a daemon thread that flushes at that
+    interval, and pending heartbeats are flushed at exit; this works the
+    same under the dev server and in every gunicorn worker. flush() does
+    its read-modify-write of the store under lock, which must be the lock
+    every other writer of the store takes.
+
+    Each rebuild is compared with the previous table and the resulting
+    status changes are passed to the registered listeners. Because every
+    process rebuilds from the shared file, listeners in all workers see
+    changes made by any of them.
+    """
+
+    def __init__(self, path: str, load_users: Callable[[], List[Dict[str, Any]]],
+                 save_users: Callable[[List[Dict[str, Any]]], None], lock=None,
+                 flush_interval: Optional[float] = None):
+        self.path = path
+        self.load_users = load_users
+        self.save_users = save_users
+        self.lock = lock or threading.RLock()
+        self.flush_interval = flush_interval
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_lock = threading.Lock()
+        self._flush_at_exit = False
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.devices: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.registry: Dict[str, Dict[str, Any]] = {}
+        self.user_devices: Dict[str, List[str]] = {}
+        self._pending: Dict[Tuple[str, str], str] = {}  # heartbeats not yet written
+        self._signature = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self.stats = {'rebuilds': 0, 'flushes': 0, 'heartbeats': 0}
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        """Call listener(changes) after every rebuild that changed a launcher-visible state"""
+        self._listeners.append(listener)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def sync(self, users: List[Dict[str, Any]]):
+        """Rebuild the table from a user list that was just written to the store"""
+        signature = self._file_signature()
+        users_table = {}
+        devices_table = {}
+        user_devices = {}
+
+        for user in users:
+            user_id = user.get('id')
+            if user_id is None:
+                continue
+
+            users_table[user_id] = {
+                'status': user.get('status'),
+                'status_expires': user.get('premium_expires_at') or "0",
+                'has_launcher_code': bool(user.get('launcher_code')),
+                'primary_device_id': (user.get('primary_device') or {}).get('device_id'),
+                'primary_device': dict(user['primary_device']) if user.get('primary_device') else None,
+            }
+            device_ids = user_devices[user_id] = []
+
+            for device in user.get('devices', []):
+                device_id = device.get('device_id')
+                if device_id is not None:
+                    device_ids.append(device_id)
+                    devices_table[(user_id, device_id)] = {
+                        'last_seen': device.get('last_connection', ''),
+                        'disconnected': False,
+                        'force_disconnect': False,
+                        'active': False,
+                        'record': dict(device),
+                    }
+
+            for device in user.get('active_devices', []):
+                device_id = device.get('device_id')
+                if device_id is None:
+                    continue
+                if (user_id, device_id) not in devices_table:
+                    device_ids.append(device_id)
+                entry = devices_table.setdefault((user_id, device_id), {
+                    'last_seen': '',
+                    'disconnected': False,
+                    'force_disconnect': False,
+                    'record': None,
+                })
+                entry['active'] = True
+                entry['disconnected'] = device.get('disconnected', False)
+                entry['force_disconnect'] = device.get('force_disconnect', False)
+                entry['last_seen'] = max(entry['last_seen'], device.get('last_connection', ''))
+                if entry['disconnected']:
+                    entry['disconnect_reason'] = device.get('disconnect_reason')
+
+        with self._lock:
+            # Heartbeats not yet flushed are newer than what the store holds
+            for key, last_seen in self._pending.items():
+                entry = devices_table.get(key)
+                if entry is not None and last_seen > entry['last_seen']:
+                    entry['last_seen'] = last_seen
+
+            changes = self._diff(users_table, devices_table) if self.stats['rebuilds'] else []
+            self.users = users_table
+            self.devices = devices_table
+            self.user_devices = user_devices
+            self.registry = self._build_registry(devices_table)
+            self._signature = signature
+            self.stats['rebuilds'] += 1
+
+        if changes:
+            for listener in self._listeners:
+                try:
+                    listener(changes)
+                except Exception as e:
+                    logger.error(f"Launcher presence listener failed: {e}")
+
+    @staticmethod
+    def device_status(entry: Dict[str, Any]) -> str:
+        """Registry status of a device entry"""
+        if entry['force_disconnect']:
+            return 'force_disconnected'
+        if entry['disconnected']:
+            return 'disconnected'
+        return 'active' if entry.get('active') else 'inactive'
+
+    def _build_registry(self, devices_table) -> Dict[str, Dict[str, Any]]:
+        """Index devices by id; a device shared by several accounts maps to the one seen last"""
+        registry = {}
+        for (user_id, device_id), entry in devices_table.items():
+            current = registry.get(device_id)
+            if current is None or entry['last_seen'] > current['last_seen']:
+                registry[device_id] = {'user_id': user_id, 'status': self.device_status(entry),
+                                       'last_seen': entry['last_seen']}
+        return registry
+
+    def _diff(self, users_table, devices_table) -> List[Dict[str, Any]]:
+        """Changes from the current table to a rebuilt one that a connected launcher must react to"""
+        changes = []
+
+        for user_id, old in self.users.items():
+            new = users_table.get(user_id)
+            if old['status'] in LAUNCHER_STATUSES and (new is None or new['status'] not in LAUNCHER_STATUSES):
+                changes.append({'type': 'premium_revoked', 'user_id': user_id,
+                                'status': new['status'] if new else None})
+            if old['primary_device_id'] and (new is None or new['primary_device_id'] != old['primary_device_id']):
+                changes.append({'type': 'primary_reset', 'user_id': user_id,
+                                'device_id': old['primary_device_id']})
+
+        for key, old in self.devices.items():
+            if not old.get('active') or old['disconnected']:
+                continue
+            new = devices_table.get(key)
+            if new is None or not new.get('active'):
+                reason = 'removed'
+            elif new['disconnected']:
+                reason = new.get('disconnect_reason') or 'disconnected'
+            else:
+                continue
+            changes.append({'type': 'device_disconnected', 'user_id': key[0], 'device_id': key[1],
+                            'reason': reason, 'force_disconnect': new is None or bool(new['force_disconnect'])})
+
+        return changes
+
+    def ensure_current(self):
+        """Reload from the store if another process changed it since the last sync"""
+        signature = self._file_signature()
+        if signature is not None and signature == self._signature:
+            return
+        self.sync(self.load_users())
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Launcher-relevant fields of a user, or None if the user does not exist"""
+        self.ensure_current()
+        return self.users.get(user_id)
+
+    def get_device(self, user_id: str, device_id: str) -> Optional[Dict[str, Any]]:
+        """Presence of one device of a user, or None if the device is unknown"""
+        self.ensure_current()
+        return self.devices.get((user_id, device_id))
+
+    def get_device_owner(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Registry entry of a device (owner, status, last_seen), or None if no user has it"""
+        self.ensure_current()
+        return self.registry.get(device_id)
+
+    def list_devices(self, user_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """(device_id, entry) pairs of one user in user store order"""
+        self.ensure_current()
+        devices = self.devices
+        return [(device_id, devices[(user_id, device_id)]) for device_id in self.user_devices.get(user_id, [])]
+
+    def touch(self, user_id: str, device_id: str, when: Optional[datetime] = None) -> bool:
+        """Record a heartbeat for a known device; returns False for unknown devices"""
+        self.ensure_current()
+        last_seen = (when or datetime.now()).strftime(TIMESTAMP_FORMAT)
+        key = (user_id, device_id)
+
+        with self._lock:
+            entry = self.devices.get(key)
+            if entry is None:
+                return False
+            entry['last_seen'] = last_seen
+            registered = self.registry.get(device_id)
+            if registered is not None and registered['user_id'] == user_id:
+                registered['last_seen'] = last_seen
+            self._pending[key] = last_seen
+            self.stats['heartbeats'] += 1
+        self._start_flusher()
+        return True
+
+    def _start_flusher(self):
+        """Start the periodic flush thread of this process unless it is running"""
+        if self.flush_interval is None:
+            return
+        # A thread inherited through fork is not alive in the child, which starts its own
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._flusher_lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_periodically, name='launcher-presence-flush',
+                                             daemon=True)
+            self._flusher.start()
+            if not self._flush_at_exit:
+                atexit.register(self.flush)
+                self._flush_at_exit = True
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            written = self.flush()
+            if written:
+                logger.info(f"Flushed {written} launcher heartbeats")
+
+    def flush(self) -> int:
+        """Write pending heartbeats to the user store in one save; returns the number written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            with self.lock:
+                users = self.load_users()
+                written = 0
+                for user in users:
+                    for device in user.get('devices', []):
+                        last_seen = pending.get((user.get('id'), device.get('device_id')))
+                        if last_seen and last_seen > device.get('last_connection', ''):
+                            device['last_connection'] = last_seen
+                            written += 1
+                self.save_users(users)
+        except Exception as e:
+            # Keep the heartbeats for the next attempt unless newer ones arrived
+            with self._lock:
+                for key, last_seen in pending.items():
+                    if last_seen > self._pending.get(key, ''):
+                        self._pending[key] = last_seen
+            logger.error(f"Failed to flush launcher presence: {e}")
+            return 0
+
+        with self._lock:
+            self.stats['flushes'] += 1
+        return written
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Table size and activity counters"""
+        with self._lock:
+            return dict(self.stats, users=len(self.users), devices=len(self.devices),
+                        registered_devices=len(self.registry), pending=len(self._pending))
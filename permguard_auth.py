@@ -6,13 +6,17 @@ Handles all authorization logic and policy management for SwaWeb application
 import json
 import logging
 import os
+from collections import deque
 from datetime import datetime, timedelta
 from functools import wraps
+from itertools import count
 from typing import Dict, Any, Optional, List
 import traceback
 
 from flask import request, jsonify, session, g
 
+from traffic_stats import TrafficLog
+
 # Configure detailed logging for PermGuard
 def setup_permguard_logging():
     """Setup detailed logging for PermGuard operations"""
@@ -47,6 +51,9 @@ def setup_permguard_logging():
 
     return permguard_logger
 
+# Entries kept in the traffic and authorization logs; the oldest are dropped first
+DEFAULT_LOG_CAPACITY = 1000
+
 # Setup loggers
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
 logger = logging.getLogger(__name__)
@@ -68,13 +75,16 @@ except ImportError as e:
 class PermGuardAuth:
     """Unified PermGuard Authorization System"""
 
-    def __init__(self, app=None):
+    def __init__(self, app=None, log_capacity: int = DEFAULT_LOG_CAPACITY):
         self.app = app
         self.client = None
         self.connected = False
         self.config = {}
-        self.authorization_log = []  # In-memory log for demo purposes
-        self.traffic_log = []  # Web traffic log
+        # Ring buffers: appending to a full log drops its oldest entry in O(1)
+        self.authorization_log = deque(maxlen=log_capacity)  # In-memory log for demo purposes
+        self.traffic_log = TrafficLog(log_capacity)  # Web traffic log with running stats
+        self._traffic_ids = count()
+        self._authorization_ids = count()
 
         if app is not None:
             self.init_app(app)
@@ -89,8 +99,11 @@ class PermGuardAuth:
             'port': int(os.getenv('PERMGUARD_PORT', '9094')),
             'workspace_id': os.getenv('WORKSPACE_ID', '875986860059'),
             'policy_store_id': os.getenv('POLICY_STORE_ID', '4b16807f1d724a118ac52c295f9794dd'),
-            'fallback_allowed': app.config.get('PERMGUARD_FALLBACK_ALLOWED', True)
+            'fallback_allowed': app.config.get('PERMGUARD_FALLBACK_ALLOWED', True),
+            'log_capacity': int(os.getenv('PERMGUARD_LOG_CAPACITY', str(self.traffic_log.maxlen))),
+            'log_traffic': app.config.get('PERMGUARD_LOG_TRAFFIC', True)
         }
+        self.set_log_capacity(self.config['log_capacity'])
 
         # Initialize PermGuard client
         self._init_client()
@@ -157,6 +170,15 @@ class PermGuardAuth:
             else:
                 raise
 
+    def set_log_capacity(self, capacity: int):
+        """Resize the traffic and authorization logs, keeping their newest entries"""
+        if capacity < 1:
+            raise ValueError('Log capacity must be at least 1')
+        if capacity != self.traffic_log.maxlen:
+            self.traffic_log = TrafficLog(capacity, self.traffic_log)
+        if capacity != self.authorization_log.maxlen:
+            self.authorization_log = deque(self.authorization_log, maxlen=capacity)
+
     def _teardown(self, exception):
         """Cleanup resources"""
         pass
@@ -179,43 +201,46 @@ class PermGuardAuth:
             return response
 
         current_user = self._get_current_user()
+        duration_ms = round(duration * 1000, 2)
+        timestamp = end_time.isoformat()
+        args = request.args
 
         traffic_entry = {
-            'id': f"traffic_{len(self.traffic_log)}_{end_time.strftime('%Y%m%d_%H%M%S')}",
-            'timestamp': end_time.isoformat(),
+            # isoformat() starts 'YYYY-MM-DDTHH:MM:SS', the id needs 'YYYYMMDD_HHMMSS'
+            'id': f"traffic_{next(self._traffic_ids)}_{timestamp[0:4]}{timestamp[5:7]}{timestamp[8:10]}_"
+                  f"{timestamp[11:13]}{timestamp[14:16]}{timestamp[17:19]}",
+            'timestamp': timestamp,
             'method': request.method,
             'path': request.path,
             'endpoint': request.endpoint,
             'status_code': response.status_code,
-            'duration_ms': round(duration * 1000, 2),
+            'duration_ms': duration_ms,
             'ip_address': request.remote_addr,
             'user_agent': request.headers.get('User-Agent', 'unknown'),
             'user': current_user,
             'content_length': response.content_length or 0,
             'referrer': request.referrer,
-            'args': dict(request.args) if request.args else {},
+            'args': args.to_dict() if args else {},
         }
 
-        self.traffic_log.append(traffic_entry)
+        removed_entry = self.traffic_log.append(traffic_entry)
 
-        # Log traffic details
-        permguard_logger.debug(
-            f"🌐 TRAFFIC: {request.method} {request.path} -> {response.status_code} "
-            f"({round(duration * 1000, 2)}ms) user: {current_user} IP: {request.remote_addr}"
-        )
+        # Log traffic details (permguard_monitor.py follows these lines)
+        if self.config.get('log_traffic', True) and permguard_logger.isEnabledFor(logging.DEBUG):
+            permguard_logger.debug(
+                f"🌐 TRAFFIC: {request.method} {request.path} -> {response.status_code} "
+                f"({duration_ms}ms) user: {current_user} IP: {request.remote_addr}"
+            )
+            if removed_entry is not None:
+                permguard_logger.debug(f"🗑️ CLEANED: Removed old traffic entry {removed_entry['id']}")
 
         # Detailed logging for admin endpoints
         if request.path.startswith('/admin') or request.path.startswith('/api/admin'):
             permguard_logger.info(
                 f"🔐 ADMIN ACCESS: {current_user} -> {request.method} {request.path} "
-                f"[{response.status_code}] ({round(duration * 1000, 2)}ms)"
+                f"[{response.status_code}] ({duration_ms}ms)"
             )
 
-        # Keep only last 1000 entries
-        if len(self.traffic_log) > 1000:
-            removed_entry = self.traffic_log.pop(0)
-            permguard_logger.debug(f"🗑️ CLEANED: Removed old traffic entry {removed_entry['id']}")
-
         return response
 
     def _get_current_user(self):
@@ -461,7 +486,7 @@ class PermGuardAuth:
     def _log_authorization(self, user: str, action: str, resource: str, context: Dict[str, Any], result: Dict[str, Any], duration: float):
         """Log authorization attempt"""
         log_entry = {
-            'id': f"auth_{len(self.authorization_log)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            'id': f"auth_{next(self._authorization_ids)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
             'timestamp': datetime.now().isoformat(),
             'user': user,
             'action': action,
@@ -474,16 +499,14 @@ class PermGuardAuth:
             'policies': result.get('policies', [])
         }
 
-        # Keep only last 1000 entries
+        # The ring buffer drops the oldest entry once full
         self.authorization_log.append(log_entry)
-        if len(self.authorization_log) > 1000:
-            self.authorization_log.pop(0)
 
         logger.info(f"Authorization: {user} {action} {resource} -> {result['allowed']}")
 
     def get_authorization_logs(self, limit: int = 100, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Get authorization logs with optional filtering"""
-        logs = self.authorization_log.copy()
+        logs = list(self.authorization_log)
         filters = filters or {}
 
         # Apply filters
@@ -553,7 +576,7 @@ class PermGuardAuth:
 
     def get_traffic_logs(self, limit: int = 100, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Get traffic logs with optional filtering"""
-        logs = self.traffic_log.copy()
+        logs = list(self.traffic_log)
 
         if filters:
             if filters.get('user'):
@@ -569,77 +592,8 @@ class PermGuardAuth:
         return logs[:limit]
 
     def get_traffic_stats(self) -> Dict[str, Any]:
-        """Get comprehensive traffic statistics"""
-        if not self.traffic_log:
-            return {'error': 'No traffic data available'}
-
-        logs = self.traffic_log
-        total_requests = len(logs)
-
-        # Status code analysis
-        status_counts = {}
-        for log in logs:
-            status = log['status_code']
-            status_counts[status] = status_counts.get(status, 0) + 1
-
-        # Method analysis
-        method_counts = {}
-        for log in logs:
-            method = log['method']
-            method_counts[method] = method_counts.get(method, 0) + 1
-
-        # Performance analysis
-        durations = [log['duration_ms'] for log in logs]
-        avg_duration = sum(durations) / len(durations) if durations else 0
-        max_duration = max(durations) if durations else 0
-        min_duration = min(durations) if durations else 0
-
-        # Top endpoints
-        endpoint_counts = {}
-        endpoint_durations = {}
-        for log in logs:
-            endpoint = log['endpoint'] or 'unknown'
-            endpoint_counts[endpoint] = endpoint_counts.get(endpoint, 0) + 1
-            if endpoint not in endpoint_durations:
-                endpoint_durations[endpoint] = []
-            endpoint_durations[endpoint].append(log['duration_ms'])
-
-        top_endpoints = []
-        for endpoint, count in sorted(endpoint_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
-            avg_duration = sum(endpoint_durations[endpoint]) / len(endpoint_durations[endpoint])
-            top_endpoints.append({
-                'endpoint': endpoint,
-                'count': count,
-                'avg_duration': round(avg_duration, 2)
-            })
-
-        # User analysis
-        user_counts = {}
-        for log in logs:
-            user = log['user']
-            user_counts[user] = user_counts.get(user, 0) + 1
-
-        top_users = [
-            {'user': user, 'requests': count}
-            for user, count in sorted(user_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-        ]
-
-        # Error analysis
-        error_requests = len([log for log in logs if log['status_code'] >= 400])
-        error_rate = (error_requests / total_requests * 100) if total_requests > 0 else 0
-
-        return {
-            'total_requests': total_requests,
-            'error_requests': error_requests,
-            'error_rate': round(error_rate, 2),
-            'avg_duration_ms': round(avg_duration, 2),
-            'max_duration_ms': max_duration,
-            'min_duration_ms': min_duration,
-            'status_codes': status_counts,
-            'methods': method_counts,
-            'top_endpoints': top_endpoints,
-            'top_users': top_users
-        }
+        """Get comprehensive traffic statistics (kept up to date by the traffic log)"""
+        return self.traffic_log.stats()
 
     def get_status(self) -> Dict[str, Any]:
         """Get PermGuard connection status"""
@@ -0,0 +1,197 @@
+"""
+Promo Generator Module
+Bulk promo code generation from the secrets CSPRNG, append-only persistence
+to the promo store and streaming CSV export
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import secrets
+import shutil
+import string
+import tempfile
+from typing import Dict, Any, Callable, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Characters promo codes are made of
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+
+# Length of generated promo codes
+DEFAULT_CODE_LENGTH = 14
+
+# Codes drawn per call to secrets.token_bytes
+DEFAULT_CHUNK_SIZE = 4096
+
+# Columns of the CSV export
+CSV_FIELDS = ('code', 'group', 'description', 'uses_limit', 'expires_at', 'gives_premium',
+              'premium_duration', 'slots', 'slots_duration', 'created_at', 'batch_id')
+
+
+class PromoCodeGenerator:
+    """
+    Random codes over an alphabet, drawn in bulk
+
+    Random bytes are mapped to characters with one bytes.translate call
+    per chunk. Bytes at or above the largest multiple of the alphabet size
+    are deleted in the same call, so every character is equally likely
+    (no modulo bias) and no per-character Python loop runs.
+    """
+
+    def __init__(self, alphabet: str = CODE_ALPHABET, length: int = DEFAULT_CODE_LENGTH):
+        if not 1 < len(alphabet) <= 256:
+            raise ValueError('Alphabet must have between 2 and 256 characters')
+        self.alphabet = alphabet
+        self.length = length
+        usable = 256 - 256 % len(alphabet)
+        self._table = bytes(ord(alphabet[byte % len(alphabet)]) for byte in range(256))
+        self._rejected = bytes(range(usable, 256))
+        # Share of random bytes that survive rejection
+        self._yield_ratio = usable / 256
+
+    def _characters(self, count: int) -> str:
+        """count uniformly distributed alphabet characters"""
+        collected = []
+        missing = count
+        while missing > 0:
+            raw = secrets.token_bytes(int(missing / self._yield_ratio) + 16)
+            chunk = raw.translate(self._table, self._rejected)[:missing]
+            collected.append(chunk)
+            missing -= len(chunk)
+        return b''.join(collected).decode('ascii')
+
+    def token(self, length: int = None) -> str:
+        """One random string of the given length (the code length by default)"""
+        return self._characters(length or self.length)
+
+    def generate(self, count: int, is_taken: Callable[[str], bool],
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+        """
+        Yield count distinct codes for which is_taken returns False
+
+        is_taken is checked right before each code is yielded, so a caller
+        that registers every yielded code (e.g. in the promo index) also
+        gets codes that are distinct within the batch.
+        """
+        produced = 0
+        length = self.length
+        while produced < count:
+            wanted = min(chunk_size, count - produced)
+            characters = self._characters(wanted * length)
+            for start in range(0, len(characters), length):
+                code = characters[start:start + length]
+                if is_taken(code):
+                    continue
+                produced += 1
+                yield code
+
+
+def append_to_json_array(path: str, items: Iterable[Dict[str, Any]], indent: int = 4) -> int:
+    """
+    Append items to the JSON array stored in path without re-encoding it
+
+    The file is copied byte for byte next to itself, the items are appended
+    to the copy and the copy replaces path atomically, so a crash or a full
+    disk leaves the old file in place rather than a truncated array.
+    Everything after the last item is overwritten and the items are written
+    one per line at the array's indentation. Each line comes from the C
+    JSON encoder; the indented layout needs the pure-Python encoder, which
+    is about ten times slower. The next full save_promo_codes restores the
+    indented layout. A missing or empty file becomes a new array. If
+    producing an item fails, the items written before it are kept and the
+    error is raised after the replace.
+    Returns the number of items written.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.promo-', suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            shutil.copyfile(path, temp_path)
+            shutil.copymode(path, temp_path)
+        else:
+            with open(temp_path, 'w') as f:
+                f.write('[]')
+
+        with open(temp_path, 'r+b') as f:
+            written, error = _append_lines(f, path, items, indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if error is not None:
+        raise error
+    return written
+
+
+def _append_lines(f, path: str, items: Iterable[Dict[str, Any]], indent: int):
+    """Append items to the array in the open file f; returns (written, error raised by items or None)"""
+    # Find the closing bracket and whether the array already has items
+    position = f.seek(0, os.SEEK_END)
+    tail = b''
+    while position > 0 and not tail.strip():
+        step = min(position, 64)
+        position -= step
+        f.seek(position)
+        tail = f.read(step) + tail
+    stripped = tail.rstrip()
+    if not stripped.endswith(b']'):
+        raise ValueError(f'{path} does not contain a JSON array')
+
+    # Cut after the last item (or the opening bracket of an empty array)
+    before = stripped[:-1].rstrip()
+    cut = position + len(before)
+    scan_end = position
+    while not before and scan_end > 0:
+        step = min(scan_end, 64)
+        scan_end -= step
+        f.seek(scan_end)
+        before = f.read(step).rstrip()
+        cut = scan_end + len(before)
+    empty = before.endswith(b'[')
+
+    f.seek(cut)
+    f.truncate()
+
+    pad = ' ' * indent
+    written = 0
+    error = None
+    items = iter(items)
+    while True:
+        try:
+            item = next(items)
+        except StopIteration:
+            break
+        except Exception as e:
+            # Close the array after what was written and let the caller raise
+            error = e
+            break
+        separator = '\n' if empty and written == 0 else ',\n'
+        f.write((separator + pad + json.dumps(item)).encode('utf-8'))
+        written += 1
+    f.write(b'\n]' if written or not empty else b']')
+    return written, error
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], fields=CSV_FIELDS) -> Iterator[str]:
+    """CSV text for rows, one line at a time, starting with the header"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(fields), extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        yield line
+    if buffer.getvalue():
+        yield buffer.getvalue()
@@ -0,0 +1,403 @@
+"""
+Promo Index Module
+Per-group view of the promo code store for the admin pages: compact rows,
+group membership and live used/expired/remaining counts
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Format of expires_at in the promo store; compares lexicographically
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Group of codes created without one
+DEFAULT_GROUP = 'default'
+
+# expires_at values already in TIMESTAMP_FORMAT skip strptime
+_TIMESTAMP_RE = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+
+
+def normalize_expiry(value) -> Optional[str]:
+    """expires_at as 'YYYY-mm-dd HH:MM:SS' (date-only values at midnight), or None"""
+    if not value or not isinstance(value, str):
+        return None
+    if _TIMESTAMP_RE.fullmatch(value):
+        return value
+    for fmt in (TIMESTAMP_FORMAT, '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).strftime(TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+    return None
+
+
+def promo_row(promo: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact admin-list record of a promo code"""
+    return {
+        'id': promo.get('id'),
+        'code': promo.get('code', ''),
+        'description': promo.get('description', ''),
+        'group': promo.get('group') or DEFAULT_GROUP,
+        'uses_count': len(promo.get('redeemed_by', [])),
+        'uses_limit': promo.get('uses_limit', 0) or 0,
+        'expires_at': normalize_expiry(promo.get('expires_at')),
+        'gives_premium': promo.get('gives_premium'),
+        'premium_duration': promo.get('premium_duration'),
+        'slots': promo.get('slots', 0),
+        'slots_duration': promo.get('slots_duration'),
+        'created_at': promo.get('created_at'),
+        'batch_id': promo.get('batch_id'),
+    }
+
+
+def redemption_entries(promo: Dict[str, Any]) -> tuple:
+    """(user_id, redeemed_at) for each of a promo's redeemed_by entries"""
+    return tuple((entry.get('id'), entry.get('redeemed_at')) if isinstance(entry, dict) else (entry, None)
+                 for entry in promo.get('redeemed_by', []))
+
+
+def is_used_up(row: Dict[str, Any]) -> bool:
+    return row['uses_limit'] > 0 and row['uses_count'] >= row['uses_limit']
+
+
+class PromoIndex:
+    """
+    Promo codes grouped for the admin pages
+
+    rows:   promo_id -> compact row (see promo_row)
+    groups: group -> {promo_id: None} in store order
+    order:  group -> list of the same ids, so a page is a slice; new codes
+            are appended, and a removal marks the group's list for a
+            rebuild on its next page query
+    used:   group -> ids of its used-up codes
+    codes:  uppercased code -> promo_id, for collision checks and lookups
+    batches: batch_id -> {promo_id: None} for codes made by one bulk generation
+    user_redemptions: user_id -> {promo_id: redeemed_at}, the codes each
+             user redeemed and the source of the duplicate-redemption check
+    Each group also keeps the sorted expiry times of its codes that are
+    not used up, so the expired count for any moment is one bisect.
+
+    Rebuilt when promo_codes.json changes on disk. Create, redeem and
+    delete update it in place (add/update/remove) and then persist the
+    store with save_promo_codes(..., reindex=False), so a change costs
+    O(log n) here instead of a rebuild. expires_at strings are parsed once
+    per code instead of on every page load.
+
+    With a redemptions_path, user_redemptions is written there after every
+    save of the store (persist_redemptions), tagged with the store's file
+    signature. A rebuild reads it from there while the signature still
+    matches instead of walking every redeemed_by list.
+    """
+
+    def __init__(self, path: str, load_codes: Callable[[], List[Dict[str, Any]]],
+                 redemptions_path: Optional[str] = None):
+        self.path = path
+        self.load_codes = load_codes
+        self.redemptions_path = redemptions_path
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.groups: Dict[str, Dict[str, None]] = {}
+        self.order: Dict[str, List[str]] = {}
+        self._stale_order: set = set()  # groups whose order list missed a removal
+        self.used: Dict[str, set] = {}
+        self.expiries: Dict[str, List[str]] = {}
+        self.codes: Dict[str, str] = {}
+        self.batches: Dict[str, Dict[str, None]] = {}
+        self.user_redemptions: Dict[str, Dict[str, Optional[str]]] = {}
+        self._redeemers: Dict[str, tuple] = {}  # promo_id -> its (user_id, redeemed_at) entries
+        self._signature = None
+        self._lock = threading.RLock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def ensure_current(self):
+        """Reload from the store if another process changed it since the last sync"""
+        signature = self._file_signature()
+        if signature is not None and signature == self._signature:
+            return
+        self.sync(self.load_codes())
+
+    def sync(self, promo_codes: List[Dict[str, Any]]):
+        """Rebuild the index from a code list that was just written to the store"""
+        signature = self._file_signature()
+        persisted = self._load_redemptions(signature)
+        with self._lock:
+            self.rows, self.groups, self.used, self.expiries = {}, {}, {}, {}
+            self.order, self._stale_order = {}, set()
+            self.codes, self.batches = {}, {}
+            self.user_redemptions, self._redeemers = {}, {}
+            for promo in promo_codes:
+                if promo.get('id') is not None:
+                    if persisted is None:
+                        entries = redemption_entries(promo)
+                    else:
+                        entries = persisted.get(promo['id'], ())
+                    self._add(promo_row(promo), entries, keep_sorted=False)
+            for expiries in self.expiries.values():
+                expiries.sort()
+            self._signature = signature
+
+    def _load_redemptions(self, signature) -> Optional[Dict[str, tuple]]:
+        """Persisted redemptions as promo_id -> entries, if they were written for this version of the store"""
+        if not self.redemptions_path or signature is None:
+            return None
+        try:
+            with open(self.redemptions_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tuple(data.get('store_signature') or ()) != signature:
+            return None
+
+        by_promo: Dict[str, list] = {}
+        for user_id, promos in data.get('users', {}).items():
+            for promo_id, redeemed_at in promos.items():
+                by_promo.setdefault(promo_id, []).append((user_id, redeemed_at))
+        return {promo_id: tuple(entries) for promo_id, entries in by_promo.items()}
+
+    def persist_redemptions(self):
+        """Write user_redemptions next to the store; call right after the store is saved"""
+        if not self.redemptions_path:
+            return
+        with self._lock:
+            data = {'store_signature': self._signature, 'users': self.user_redemptions}
+            temp_file = self.redemptions_path + '.tmp'
+            try:
+                with open(temp_file, 'w') as f:
+                    json.dump(data, f)
+                os.replace(temp_file, self.redemptions_path)
+            except OSError as e:
+                logger.warning(f"Could not persist promo redemptions: {e}")
+
+    def mark_current(self):
+        """Record that the store on disk matches the index after an in-place update"""
+        self._signature = self._file_signature()
+
+    def add(self, promo: Dict[str, Any]):
+        """Index a newly created code"""
+        self.ensure_current()
+        with self._lock:
+            self._add(promo_row(promo), redemption_entries(promo))
+
+    def extend(self, promos: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Index new codes as they are produced, yielding each one back
+
+        Meant to sit between a generator and a streaming writer; the store is
+        checked for outside changes once, before the first code. Codes are
+        indexed before the writer stores them, so a caller whose write fails
+        must sync() the index from the store again.
+        """
+        self.ensure_current()
+        for promo in promos:
+            with self._lock:
+                self._add(promo_row(promo), redemption_entries(promo))
+            yield promo
+
+    def update(self, promo: Dict[str, Any]):
+        """Re-index a changed code (e.g. a new redemption), keeping its place in the group"""
+        row = promo_row(promo)
+        redeemers = redemption_entries(promo)
+        self.ensure_current()
+        with self._lock:
+            old = self.rows.get(row['id'])
+            if old is None or old['group'] != row['group']:
+                self._remove(row['id'])
+                self._add(row, redeemers)
+                return
+            self._uncount(old)
+            self.rows[row['id']] = row
+            self._count(row, keep_sorted=True)
+            self._set_redeemers(row['id'], redeemers)
+
+    def remove(self, promo_ids) -> int:
+        """Drop codes from the index; returns how many were indexed"""
+        self.ensure_current()
+        with self._lock:
+            return sum(1 for promo_id in promo_ids if self._remove(promo_id))
+
+    def group_code_ids(self, group: str, used_only: bool = False) -> set:
+        """Ids of a group's codes, or of its used-up codes only"""
+        self.ensure_current()
+        with self._lock:
+            if used_only:
+                return set(self.used.get(group, ()))
+            return set(self.groups.get(group, ()))
+
+    def has_code(self, code: str) -> bool:
+        return code.upper() in self.codes
+
+    def find(self, code: str) -> Optional[str]:
+        """Id of the promo with this code (case-insensitive), or None"""
+        self.ensure_current()
+        return self.codes.get(code.upper())
+
+    def has_redeemed(self, promo_id: str, user_id: str) -> bool:
+        return promo_id in self.user_redemptions.get(user_id, ())
+
+    def redeemed_by_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """The codes a user redeemed, most recent first"""
+        self.ensure_current()
+        with self._lock:
+            redeemed = []
+            for promo_id, redeemed_at in self.user_redemptions.get(user_id, {}).items():
+                row = self.rows.get(promo_id)
+                if row is not None:
+                    redeemed.append({
+                        'promo_id': promo_id,
+                        'code': row['code'],
+                        'group': row['group'],
+                        'description': row['description'],
+                        'gives_premium': row['gives_premium'],
+                        'slots': row['slots'],
+                        'redeemed_at': redeemed_at
+                    })
+        redeemed.sort(key=lambda entry: entry['redeemed_at'] or '', reverse=True)
+        return redeemed
+
+    def has_batch(self, batch_id: str) -> bool:
+        """Whether a bulk generation with this id has codes in the store"""
+        self.ensure_current()
+        return batch_id in self.batches
+
+    def iter_batch(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        """Rows of the codes created by one bulk generation, in creation order"""
+        self.ensure_current()
+        with self._lock:
+            promo_ids = tuple(self.batches.get(batch_id, ()))
+        for promo_id in promo_ids:
+            row = self.rows.get(promo_id)
+            if row is not None:
+                yield row
+
+    def group_names(self) -> List[str]:
+        self.ensure_current()
+        with self._lock:
+            return sorted(self.groups)
+
+    def _add(self, row: Dict[str, Any], redeemers: tuple = (), keep_sorted: bool = True):
+        self.rows[row['id']] = row
+        self._set_redeemers(row['id'], redeemers)
+        members = self.groups.setdefault(row['group'], {})
+        if row['id'] not in members:
+            members[row['id']] = None
+            self.order.setdefault(row['group'], []).append(row['id'])
+        self.codes[row['code'].upper()] = row['id']
+        if row['batch_id']:
+            self.batches.setdefault(row['batch_id'], {})[row['id']] = None
+        self._count(row, keep_sorted)
+
+    def _remove(self, promo_id: str) -> bool:
+        row = self.rows.pop(promo_id, None)
+        if row is None:
+            return False
+        group = row['group']
+        self._uncount(row)
+        self._set_redeemers(promo_id, ())
+        if self.codes.get(row['code'].upper()) == promo_id:
+            del self.codes[row['code'].upper()]
+        batch = self.batches.get(row['batch_id'])
+        if batch is not None:
+            batch.pop(promo_id, None)
+            if not batch:
+                del self.batches[row['batch_id']]
+        members = self.groups[group]
+        del members[promo_id]
+        self._stale_order.add(group)
+        if not members:
+            del self.groups[group]
+            self.order.pop(group, None)
+            self._stale_order.discard(group)
+            self.used.pop(group, None)
+            self.expiries.pop(group, None)
+        return True
+
+    def _set_redeemers(self, promo_id: str, redeemers: tuple):
+        for user_id, _ in self._redeemers.pop(promo_id, ()):
+            promos = self.user_redemptions.get(user_id)
+            if promos is not None:
+                promos.pop(promo_id, None)
+                if not promos:
+                    del self.user_redemptions[user_id]
+        if redeemers:
+            self._redeemers[promo_id] = redeemers
+            for user_id, redeemed_at in redeemers:
+                self.user_redemptions.setdefault(user_id, {})[promo_id] = redeemed_at
+
+    def _count(self, row: Dict[str, Any], keep_sorted: bool):
+        group = row['group']
+        if is_used_up(row):
+            self.used.setdefault(group, set()).add(row['id'])
+        elif row['expires_at']:
+            expiries = self.expiries.setdefault(group, [])
+            if keep_sorted:
+                insort(expiries, row['expires_at'])
+            else:
+                expiries.append(row['expires_at'])
+
+    def _uncount(self, row: Dict[str, Any]):
+        group = row['group']
+        if is_used_up(row):
+            self.used[group].discard(row['id'])
+        elif row['expires_at']:
+            expiries = self.expiries[group]
+            del expiries[bisect_left(expiries, row['expires_at'])]
+
+    def row_status(self, row: Dict[str, Any], now: Optional[str] = None) -> str:
+        """'used', 'expired' or 'active', in the precedence the admin page shows them"""
+        if is_used_up(row):
+            return 'used'
+        now = now or datetime.now().strftime(TIMESTAMP_FORMAT)
+        if row['expires_at'] and row['expires_at'] < now:
+            return 'expired'
+        return 'active'
+
+    def group_summaries(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Counts per group, ordered by group name"""
+        self.ensure_current()
+        now_str = (now or datetime.now()).strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            summaries = []
+            for group in sorted(self.groups):
+                total = len(self.groups[group])
+                used = len(self.used.get(group, ()))
+                expired = bisect_left(self.expiries.get(group, []), now_str)
+                summaries.append({
+                    'group': group,
+                    'total': total,
+                    'used': used,
+                    'expired': expired,
+                    'remaining': total - used - expired
+                })
+            return summaries
+
+    def query_group(self, group: str, page: int = 1, per_page: int = 50) -> Dict[str, Any]:
+        """One page of a group's codes with their status; {'codes', 'total'}"""
+        self.ensure_current()
+        now_str = datetime.now().strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            if group not in self.groups:
+                return {'codes': [], 'total': 0}
+            if group in self._stale_order:
+                self.order[group] = list(self.groups[group])
+                self._stale_order.discard(group)
+            ids = self.order[group]
+            start = (max(page, 1) - 1) * per_page
+            codes = []
+            for promo_id in ids[start:start + per_page]:
+                row = dict(self.rows[promo_id])
+                row['status'] = self.row_status(row, now_str)
+                codes.append(row)
+            return {'codes': codes, 'total': len(ids)}
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Test the catalog service and its snapshot persistence
+"""
+
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+from catalog_service import CatalogSnapshotStore, CatalogService, PlaceholderFilter, StoreCatalog
+from upstream_client import UpstreamResponse
+
+UPSTREAM_CATALOG = {
+    "10": {"name": "Counter-Strike", "access": "1"},
+    "70": {"name": "Half-Life", "access": "2"},
+    "99": {"name": "GAME 99", "access": "1"},
+    "100": {"name": "  ", "access": "2"},
+}
+
+
+def test_snapshot_versions_and_reload():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'catalog_snapshot.json')
+        store = CatalogSnapshotStore(path)
+        assert store.load() is None
+
+        free_games = {"10": {"name": "Counter-Strike", "access": "1"}}
+        premium_games = {"70": {"name": "Half-Life", "access": "2"}}
+
+        assert store.save(free_games, premium_games) == 1
+        assert store.save(free_games, premium_games) == 2
+
+        # A fresh store (new process) sees the last version from disk
+        reloaded = CatalogSnapshotStore(path)
+        header = reloaded.peek()
+        assert header['version'] == 2
+        assert header['free_count'] == 1
+
+        snapshot = reloaded.load()
+        assert snapshot['free_games'] == free_games
+        assert snapshot['premium_games'] == premium_games
+
+        # No temporary files are left behind
+        assert os.listdir(tmp) == ['catalog_snapshot.json']
+
+
+def test_corrupt_snapshot_is_ignored():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'catalog_snapshot.json')
+        with open(path, 'w') as f:
+            f.write('{not json')
+
+        store = CatalogSnapshotStore(path)
+        assert store.load() is None
+        assert store.save({}, {}) == 1
+
+
+def test_catalog_service_refresh_index_and_reload():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'catalog_snapshot.json')
+        calls = []
+
+        def fetcher(url):
+            calls.append(url)
+            return UpstreamResponse(url, 200, UPSTREAM_CATALOG, ok=True)
+
+        service = CatalogService('http://upstream/fetch', path, fetcher=fetcher)
+        assert service.ensure_loaded()
+        assert calls == ['http://upstream/fetch']
+        assert service.counts() == {"free": 1, "premium": 1, "total": 2}
+        assert service.filtered_count == 2
+        assert service.get_game("70") == (UPSTREAM_CATALOG["70"], "premium")
+        assert service.get_game("99") == (None, None)
+        assert service.version == 1
+
+        # A 304 keeps the current generation
+        assert service.apply_response(UpstreamResponse('http://upstream/fetch', 304, UPSTREAM_CATALOG, not_modified=True, ok=True))
+        assert service.version == 1
+
+        # A new process serves the snapshot without calling upstream
+        restarted = CatalogService('http://upstream/fetch', path, fetcher=fetcher)
+        assert restarted.ensure_loaded()
+        assert calls == ['http://upstream/fetch']
+        # Only the header was read; the body is parsed by the first read of games
+        assert restarted.version == 1 and restarted.free_games is None
+        assert restarted.get_tier("free") == {"10": UPSTREAM_CATALOG["10"]}
+        assert restarted.get_game("70") == (UPSTREAM_CATALOG["70"], "premium")
+
+
+def test_unreadable_snapshot_body_falls_back_to_a_refresh():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'catalog_snapshot.json')
+        CatalogSnapshotStore(path).save({"10": UPSTREAM_CATALOG["10"]}, {})
+        with open(path) as f:
+            header = f.readline()
+        with open(path, 'w') as f:
+            f.write(header + '{truncated')
+
+        calls = []
+
+        def fetcher(url):
+            calls.append(url)
+            return UpstreamResponse(url, 200, UPSTREAM_CATALOG, ok=True)
+
+        service = CatalogService('http://upstream/fetch', path, fetcher=fetcher)
+        assert service.ensure_loaded() and not calls
+        assert service.get_tier("free") == {} and not service.loaded
+        assert service.ensure_loaded() and calls == ['http://upstream/fetch']
+        assert service.counts()["total"] == 2
+
+
+def test_store_catalog_reloads_on_change_and_is_read_only():
+    with tempfile.TemporaryDirectory() as tmp:
+        free_path = os.path.join(tmp, 'games_free_backup.json')
+        premium_path = os.path.join(tmp, 'games_premium_backup.json')
+        with open(free_path, 'w') as f:
+            json.dump([{'name': 'Free One'}, {'name': 'Free Two'}], f)
+
+        store = StoreCatalog({'free': free_path, 'premium': premium_path})
+        record = store.get('free-002')
+        assert dict(record) == {'name': 'Free Two', 'id': 'free-002', 'isFree': True}
+        assert store.get('premium-001') is None
+        assert store.version == 1
+
+        try:
+            record['name'] = 'changed'
+            assert False, "store records must be read-only"
+        except TypeError:
+            pass
+
+        # Unchanged files are not reloaded
+        store.get('free-001')
+        assert store.version == 1
+
+        with open(premium_path, 'w') as f:
+            json.dump([{'name': 'Premium One', 'price': 9.99}], f)
+        assert store.get('premium-001')['price'] == 9.99
+        assert store.version == 2
+        assert [r['id'] for r in store.get_many(['premium-001', 'missing', 'free-001'])] == ['premium-001', 'free-001']
+
+
+def test_store_catalog_projection_and_fingerprint():
+    with tempfile.TemporaryDirectory() as tmp:
+        free_path = os.path.join(tmp, 'games_free_backup.json')
+        with open(free_path, 'w') as f:
+            json.dump([{'name': 'Free One', 'image': 'a.png', 'description': 'long text'}], f)
+
+        store = StoreCatalog({'free': free_path})
+        fingerprint = store.fingerprint
+        assert store.project(['free-001', 'free-404'], ['name', 'id', 'rating']) == [{'id': 'free-001', 'name': 'Free One'}]
+        assert store.project(['free-001'])[0]['description'] == 'long text'
+
+        # Projections are copies, not views of the shared records
+        store.project(['free-001'], ['name'])[0]['name'] = 'changed'
+        assert store.get('free-001')['name'] == 'Free One'
+        assert store.fingerprint == fingerprint
+
+        with open(free_path, 'w') as f:
+            json.dump([{'name': 'Free One, patched'}], f)
+        assert store.fingerprint != fingerprint
+
+
+def make_synthetic_feed(size, seed=42):
+    """Build an upstream-shaped catalog with ~10% placeholder names"""
+    rng = random.Random(seed)
+    placeholders = ['GAME {n}', 'game {n}', 'Placeholder', 'PLACEHOLDER {n}', 'test{n}', 'Untitled {n}',
+                    'UNKNOWN', 'unnamed {n}', 'Temp {n}', '', '   ']
+    feed = {}
+    for i in range(size):
+        if rng.random() < 0.1:
+            name = rng.choice(placeholders).format(n=i)
+        else:
+            name = f"Real Game {i} {rng.choice(['Deluxe', 'Remastered', 'Online', 'Test Drive'])}"
+        feed[str(i)] = {'name': name, 'access': rng.choice(['1', '2'])}
+    return feed
+
+
+def legacy_filter(data):
+    """Reference implementation: seven regexes compiled per refresh, checked in a loop"""
+    placeholder_patterns = [
+        re.compile(r'^GAME\s+\d+$'),
+        re.compile(r'^PLACEHOLDER\s*\d*$', re.I),
+        re.compile(r'^TEST\s*\d*$', re.I),
+        re.compile(r'^UNTITLED\s*\d*$', re.I),
+        re.compile(r'^UNKNOWN\s*\d*$', re.I),
+        re.compile(r'^UNNAMED\s*\d*$', re.I),
+        re.compile(r'^TEMP\s*\d*$', re.I)
+    ]
+    free_games, premium_games, filtered_count = {}, {}, 0
+    for game_id, game_data in data.items():
+        game_name = game_data.get('name', '').strip()
+        if not game_name or any(pattern.match(game_name) for pattern in placeholder_patterns):
+            filtered_count += 1
+            continue
+        if game_data.get('access') == "1":
+            free_games[game_id] = game_data
+        elif game_data.get('access') == "2":
+            premium_games[game_id] = game_data
+    return free_games, premium_games, filtered_count
+
+
+def test_combined_filter_matches_legacy_rules():
+    feed = make_synthetic_feed(5000)
+    service = CatalogService('http://upstream/fetch', os.devnull)
+
+    free_games, premium_games, rejections = service.filter_games(feed)
+    legacy_free, legacy_premium, legacy_filtered = legacy_filter(feed)
+
+    assert free_games == legacy_free
+    assert premium_games == legacy_premium
+    assert sum(rejections.values()) == legacy_filtered
+    assert rejections['empty_name'] > 0
+    assert rejections['game_number'] > 0
+
+
+def test_placeholder_rules_are_configurable():
+    rules = [{'name': 'demo', 'pattern': r'DEMO\s*\d*'}, {'name': 'exact', 'pattern': 'GAME', 'ignore_case': False}]
+    placeholder_filter = PlaceholderFilter(rules)
+    assert placeholder_filter.match('demo 3') == 'demo'
+    assert placeholder_filter.match('GAME') == 'exact'
+    assert placeholder_filter.match('game') is None
+    assert placeholder_filter.match('TEST') is None
+    assert placeholder_filter.match('') == 'empty_name'
+
+
+def benchmark_placeholder_filter(size=100_000, rounds=5):
+    """Compare the legacy loop with the combined alternation on a synthetic feed"""
+    feed = make_synthetic_feed(size)
+    service = CatalogService('http://upstream/fetch', os.devnull)
+
+    def best_of(func):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            func(feed)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    legacy = best_of(legacy_filter)
+    combined = best_of(service.filter_games)
+    _, _, rejections = service.filter_games(feed)
+
+    print(f"Placeholder filter over {size} games (best of {rounds}):")
+    print(f"  legacy loop:          {legacy * 1000:8.1f} ms")
+    print(f"  combined alternation: {combined * 1000:8.1f} ms ({legacy / combined:.1f}x)")
+    print(f"  rejections: {rejections}")
+
+
+if __name__ == "__main__":
+    test_snapshot_versions_and_reload()
+    test_corrupt_snapshot_is_ignored()
+    test_catalog_service_refresh_index_and_reload()
+    test_unreadable_snapshot_body_falls_back_to_a_refresh()
+    test_combined_filter_matches_legacy_rules()
+    test_placeholder_rules_are_configurable()
+    test_store_catalog_reloads_on_change_and_is_read_only()
+    test_store_catalog_projection_and_fingerprint()
+    print("Catalog service tests passed")
+    benchmark_placeholder_filter()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test the columnar games-added event store
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from game_events import GameEventStore, MISSING_TIMESTAMP, MIN_COMPACT_SIZE, to_epoch, from_epoch
+from game_stats import summarize_day
+from test_game_stats import make_day
+
+
+def test_summaries_match_the_payload_summary():
+    store = GameEventStore()
+    data = make_day(2000)
+    store.ingest_day('2024-06-02', data)
+
+    expected = summarize_day(data, '2024-06-02')
+    summary = store.summary('2024-06-02')
+    assert summary.hourly == expected.hourly
+    assert (summary.unique_users, summary.events, summary.games_added, summary.peak_hour) == \
+        (expected.unique_users, expected.events, expected.games_added, expected.peak_hour)
+
+    # Unknown days are empty rather than an error
+    assert store.summary('2024-06-03').events == 0
+
+
+def test_payload_round_trip_keeps_events_in_time_order():
+    store = GameEventStore()
+    data = make_day(300)
+    store.ingest_day('2024-06-02', data)
+    payload = store.payload('2024-06-02')
+
+    assert payload['games_added'] == data['games_added'] and len(payload['details']) == len(data['details'])
+    # Timestamps come back normalized ('7:5:9' as '07:05:09'); unparseable ones as ''
+    valid = sorted((from_epoch(to_epoch(game['timestamp'])), game['game_id'], game['user_id']) for game in data['details']
+                   if to_epoch(game['timestamp']) != MISSING_TIMESTAMP)
+    stored = [(game['timestamp'], game['game_id'], game['user_id']) for game in payload['details'] if game['timestamp']]
+    assert [row[0] for row in stored] == [row[0] for row in valid]
+    assert sorted(stored) == valid
+    assert store.payload('2024-06-03') is None
+
+
+def test_appended_events_stay_in_time_order():
+    store = GameEventStore()
+    store.ingest_day('2024-06-02', {'games_added': 1, 'details': [
+        {'game_id': '730', 'user_id': 'a', 'timestamp': '2024-06-02 10:00:00'}]})
+    added = store.append('2024-06-02', [
+        {'game_id': '570', 'user_id': 'b', 'timestamp': '2024-06-02 09:30:00'},
+        {'game_id': '730', 'user_id': 'a', 'timestamp': '2024-06-02 11:15:00'},
+        {'game_id': '10', 'user_id': 'c', 'timestamp': 'not a time'},
+    ])
+    assert added == 3
+
+    columns = store.day('2024-06-02')
+    assert list(columns.timestamps) == sorted(columns.timestamps)
+    assert store.summary('2024-06-02').hourly_distribution() == {9: 1, 10: 1, 11: 1}
+    assert store.summary('2024-06-02').games_added == 4
+    assert store.summary('2024-06-02').unique_users == 3
+
+
+def test_least_recently_used_days_are_dropped():
+    store = GameEventStore(max_days=3)
+    for day in range(1, 4):
+        store.ingest_day(f"2024-06-0{day}", make_day(10, f"2024-06-0{day}"))
+    store.day('2024-06-01')
+    store.ingest_day('2024-06-04', make_day(10, '2024-06-04'))
+
+    assert sorted(store.days) == ['2024-06-01', '2024-06-03', '2024-06-04']
+    assert store.stats()['days'] == 3
+
+
+def test_only_days_ingested_after_they_ended_are_complete():
+    store = GameEventStore()
+    data = make_day(50)
+    store.ingest_day('2024-06-02', data, ingested_at=datetime(2024, 6, 2, 18, 0))
+    assert store.has_day('2024-06-02') and not store.has_complete_day('2024-06-02')
+
+    store.ingest_day('2024-06-02', data, ingested_at=datetime(2024, 6, 3, 0, 5))
+    assert store.has_complete_day('2024-06-02')
+
+    # Days only grown event by event never count as a full snapshot
+    store.append('2024-06-01', [{'game_id': '730', 'user_id': 'a', 'timestamp': '2024-06-01 10:00:00'}])
+    assert not store.has_complete_day('2024-06-01') and not store.has_complete_day('2024-06-05')
+
+
+def test_interners_only_keep_strings_of_kept_days():
+    store = GameEventStore(max_days=2)
+    days = {}
+    for day in range(1, 21):
+        date_str = f"2024-06-{day:02d}"
+        days[date_str] = {'games_added': 1500, 'details': [
+            {'game_id': f"{day}-{i}", 'user_id': f"{date_str}-user-{i}", 'timestamp': f"{date_str} 10:00:00"}
+            for i in range(1500)]}
+        store.ingest_day(date_str, days[date_str])
+
+    # Bounded by twice the strings of the kept days (or the compaction threshold)
+    assert len(store.users) <= max(MIN_COMPACT_SIZE, 2 * 2 * 1500) + 1500
+    assert len(store.users) < 20 * 1500
+    for date_str in list(store.days):
+        payload = store.payload(date_str)
+        assert sorted(game['user_id'] for game in payload['details']) == \
+            sorted(game['user_id'] for game in days[date_str]['details'])
+        assert store.summary(date_str).unique_users == 1500
+
+
+def benchmark_monthly_view(events_per_day=2000, days=30):
+    """Compare loading a JSON file per day with aggregating the stored columns"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sample_data.json')
+        with open(path, 'w') as f:
+            json.dump(make_day(events_per_day), f)
+        dates = [(datetime(2024, 6, 30) - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+        started = time.perf_counter()
+        for date_str in dates:
+            with open(path) as f:
+                summarize_day(json.load(f), date_str)
+        legacy = time.perf_counter() - started
+
+        store = GameEventStore()
+        with open(path) as f:
+            data = json.load(f)
+        started = time.perf_counter()
+        for date_str in dates:
+            store.ingest_day(date_str, data)
+        ingest = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for date_str in dates:
+            store.summary(date_str)
+        queried = time.perf_counter() - started
+
+        print(f"Monthly view over {days} days of {events_per_day} events:")
+        print(f"  JSON load per day, per view:  {legacy * 1000:8.1f} ms")
+        print(f"  ingest (once per day):        {ingest * 1000:8.1f} ms")
+        print(f"  column aggregates per view:   {queried * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    test_summaries_match_the_payload_summary()
+    test_payload_round_trip_keeps_events_in_time_order()
+    test_appended_events_stay_in_time_order()
+    test_least_recently_used_days_are_dropped()
+    test_only_days_ingested_after_they_ended_are_complete()
+    test_interners_only_keep_strings_of_kept_days()
+    print("Game events tests passed")
+    benchmark_monthly_view()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test the per-day game stats summaries against per-request parsing
+"""
+
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from game_stats import PeriodAggregator, summarize_day, hour_of, time_of, peak_of
+
+
+def make_day(events, date_str='2024-06-02', seed=5):
+    """A day of the games-added feed with a few malformed timestamps"""
+    rng = random.Random(seed)
+    details = []
+    for i in range(events):
+        timestamp = f"{date_str} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        if i % 97 == 0:
+            timestamp = rng.choice(['', 'yesterday', f"{date_str} 7:5:9", f"{date_str} 24:00:00", None])
+        details.append({'game_id': str(rng.randint(1, 3000)), 'user_id': f"7656119{rng.randint(0, events // 3):010d}",
+                        'timestamp': timestamp})
+    return {'date': date_str, 'games_added': events, 'details': details}
+
+
+def legacy_hourly(data):
+    """Reference: the strptime loop analyze_hourly_data and /api/game_stats ran per request"""
+    hourly_counts = defaultdict(int)
+    for game in data.get('details', []):
+        try:
+            hourly_counts[datetime.strptime(game.get('timestamp', ''), '%Y-%m-%d %H:%M:%S').hour] += 1
+        except:
+            continue
+    return hourly_counts
+
+
+def test_histogram_matches_strptime_bucketing():
+    data = make_day(3000)
+    summary = summarize_day(data)
+    legacy = legacy_hourly(data)
+
+    assert summary.hourly.typecode == 'I' and len(summary.hourly) == 24
+    assert summary.hourly_distribution() == dict(legacy)
+    assert summary.events == 3000 and summary.games_added == 3000
+    assert summary.unique_users == len(set(game.get('user_id', '') for game in data['details']))
+
+    peak = max(legacy.values())
+    assert summary.peak_hour == min(hour for hour, count in legacy.items() if count == peak)
+
+
+def test_timestamps_parse_like_strptime():
+    for timestamp in ['2024-06-02 08:15:22', '2024-06-02 7:5:9', '2024-06-02 24:00:00', '', 'x', None]:
+        try:
+            parsed = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+            assert hour_of(timestamp) == parsed.hour
+            assert time_of(timestamp) == parsed.strftime('%H:%M:%S')
+        except (TypeError, ValueError):
+            assert hour_of(timestamp) is None and time_of(timestamp) is None
+
+
+def test_empty_days_have_no_peak():
+    for data in [None, {}, {'date': '2024-06-02', 'games_added': 0, 'details': []}]:
+        summary = summarize_day(data, '2024-06-02')
+        assert summary.date == '2024-06-02'
+        assert summary.peak_hour is None and summary.hourly.tolist() == [0] * 24 and summary.unique_users == 0
+
+
+def make_days(start, count, seed=9):
+    """Summaries for consecutive days, keyed by date"""
+    rng = random.Random(seed)
+    days = {}
+    for i in range(count):
+        date_str = (start + timedelta(days=i)).strftime('%Y-%m-%d')
+        days[date_str] = summarize_day(make_day(rng.randint(0, 300), date_str, seed=i), date_str)
+    return days
+
+
+def brute_force_window(days, today_str, length):
+    """Reference: the window recomputed from the per-day summaries"""
+    today = datetime.strptime(today_str, '%Y-%m-%d')
+    dates = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(length - 1, -1, -1)]
+    hourly = [sum(days[date_str].hourly[hour] for date_str in dates) for hour in range(24)]
+    closed = [days[date_str].games_added for date_str in dates[:-1]]
+    half = (length - 1) // 2
+    return {
+        'values': [days[date_str].games_added for date_str in dates],
+        'total_games_added': sum(days[date_str].games_added for date_str in dates),
+        'peak_hour_raw': peak_of(hourly),
+        'newer': sum(closed[len(closed) - half:]) if half else 0,
+        'older': sum(closed[:half]),
+    }
+
+
+def test_rolling_windows_match_recomputation():
+    start = datetime(2024, 5, 1)
+    days = make_days(start, 80)
+    aggregator = PeriodAggregator(windows=(7, 30))
+    loads = []
+
+    def load(date_str):
+        loads.append(date_str)
+        return days[date_str]
+
+    # First call loads the longest window once; later days close one at a time
+    for offset in [40, 41, 42, 45, 46, 79]:
+        today_str = (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+        aggregator.advance(today_str, load)
+        aggregator.set_today(days[today_str])
+        for length in (7, 30):
+            expected = brute_force_window(days, today_str, length)
+            window = aggregator.window(length)
+            assert window['values'] == expected['values'], (today_str, length)
+            assert window['total_games_added'] == expected['total_games_added']
+            assert window['peak_hour_raw'] == expected['peak_hour_raw']
+            assert window['average_games_per_day'] == round(expected['total_games_added'] / length, 1)
+            assert [day['date'] for day in window['days']][-1] == today_str
+            newer, older = expected['newer'], expected['older']
+            if older:
+                assert window['trend_percent'] == round((newer - older) * 100.0 / older, 1)
+
+    # Days are loaded once each, and only those that can still be in a window
+    assert len(loads) == len(set(loads))
+    assert loads[0] == (start + timedelta(days=10)).strftime('%Y-%m-%d')
+
+
+def test_window_results_are_cached_until_something_changes():
+    start = datetime(2024, 5, 1)
+    days = make_days(start, 10)
+    aggregator = PeriodAggregator(windows=(7,))
+    today_str = (start + timedelta(days=9)).strftime('%Y-%m-%d')
+    aggregator.advance(today_str, days.get)
+    aggregator.set_today(days[today_str])
+
+    first = aggregator.window(7)
+    assert aggregator.window(7) is first
+    assert aggregator.advance(today_str, days.get) == 0
+    aggregator.set_today(days[today_str])
+    assert aggregator.window(7) is first
+
+    # A refreshed summary for today replaces the cached result
+    refreshed = summarize_day(make_day(500, today_str), today_str)
+    aggregator.set_today(refreshed)
+    assert aggregator.window(7)['values'][-1] == 500
+
+    try:
+        aggregator.window(30)
+        assert False, "windows that are not kept must be rejected"
+    except ValueError:
+        pass
+
+
+def benchmark_hourly_requests(events=20000, requests=50):
+    """Compare parsing every timestamp per request with reading the day's summary"""
+    data = make_day(events)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        legacy_hourly(data)
+        len(set(game.get('user_id', '') for game in data['details']))
+    legacy = (time.perf_counter() - started) / requests
+
+    started = time.perf_counter()
+    summary = summarize_day(data)
+    ingest = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        summary.hourly.tolist()
+        summary.hourly_distribution()
+    served = (time.perf_counter() - started) / requests
+
+    print(f"Hourly stats over {events} events:")
+    print(f"  strptime per request:      {legacy * 1000:8.2f} ms")
+    print(f"  summary once per load:     {ingest * 1000:8.2f} ms")
+    print(f"  summary read per request:  {served * 1000:8.3f} ms")
+
+
+def benchmark_period_requests(requests=200):
+    """Compare the per-call 30-day loop with the rolling windows"""
+    start = datetime(2024, 5, 1)
+    days = make_days(start, 31)
+    today_str = (start + timedelta(days=30)).strftime('%Y-%m-%d')
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        brute_force_window(days, today_str, 30)
+    legacy = (time.perf_counter() - started) / requests
+
+    aggregator = PeriodAggregator()
+    aggregator.advance(today_str, days.get)
+    aggregator.set_today(days[today_str])
+    started = time.perf_counter()
+    for _ in range(requests):
+        aggregator.advance(today_str, days.get)
+        aggregator.set_today(days[today_str])
+        aggregator.window(30)
+    cached = (time.perf_counter() - started) / requests
+
+    print(f"30-day period stats ({requests} calls):")
+    print(f"  recomputed per call:       {legacy * 1000:8.3f} ms")
+    print(f"  rolling window per call:   {cached * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    test_histogram_matches_strptime_bucketing()
+    test_timestamps_parse_like_strptime()
+    test_empty_days_have_no_peak()
+    test_rolling_windows_match_recomputation()
+    test_window_results_are_cached_until_something_changes()
+    print("Game stats tests passed")
+    benchmark_hourly_requests()
+    benchmark_period_requests()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test launcher status change events and long-poll delivery
+"""
+
+import json
+import tempfile
+import threading
+import time
+
+from launcher_events import LauncherEventBus
+from launcher_presence import LauncherPresence
+from test_launcher_presence import make_presence, make_users
+
+
+def make_bus(presence, check_interval=0.05):
+    bus = LauncherEventBus(check_interval=check_interval, check_for_changes=presence.ensure_current)
+    presence.add_listener(bus.publish)
+    return bus
+
+
+def test_rebuilds_publish_launcher_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(4)
+        users[1]['primary_device'] = {'device_id': 'DEV-1'}
+        presence, store = make_presence(tmp, users)
+        bus = make_bus(presence)
+        presence.ensure_current()
+        cursor = bus.cursor()
+
+        users = store.load()
+        users[1]['status'] = 'Standard'
+        del users[1]['primary_device']
+        users[3]['active_devices'][0].update(disconnected=True, force_disconnect=True, disconnect_reason='premium_lost')
+        store.save(users)
+
+        events, _ = bus.wait('user-1', 'DEV-1', cursor, timeout=0)
+        assert [event['type'] for event in events] == ['premium_revoked', 'primary_reset']
+
+        events, next_cursor = bus.wait('user-3', 'DEV-3', cursor, timeout=0)
+        assert len(events) == 1
+        assert events[0]['type'] == 'device_disconnected'
+        assert events[0]['reason'] == 'premium_lost' and events[0]['force_disconnect']
+
+        # Another device of the same user does not see it; the cursor moves past it
+        assert bus.wait('user-3', 'DEV-other', cursor, timeout=0)[0] == []
+        assert bus.wait('user-3', 'DEV-3', next_cursor, timeout=0)[0] == []
+
+        # Saves that change nothing launcher-visible publish nothing
+        published = bus.get_stats()['published']
+        store.save(store.load())
+        assert bus.get_stats()['published'] == published
+
+
+def test_waiting_subscriber_is_woken_by_a_save():
+    with tempfile.TemporaryDirectory() as tmp:
+        presence, store = make_presence(tmp, make_users(2))
+        bus = make_bus(presence, check_interval=5)
+        presence.ensure_current()
+        cursor = bus.cursor()
+
+        def revoke():
+            time.sleep(0.1)
+            users = store.load()
+            users[1]['status'] = 'Standard'
+            store.save(users)
+
+        threading.Thread(target=revoke).start()
+        started = time.perf_counter()
+        events, _ = bus.wait('user-1', 'DEV-1', cursor, timeout=3)
+        assert events and events[0]['type'] == 'premium_revoked'
+        assert time.perf_counter() - started < 1
+
+
+def test_changes_from_another_process_reach_subscribers():
+    with tempfile.TemporaryDirectory() as tmp:
+        presence, store = make_presence(tmp, make_users(2))
+        bus = make_bus(presence)
+        presence.ensure_current()
+        cursor = bus.cursor()
+
+        # A second worker with its own table writes the shared file
+        other_worker = LauncherPresence(store.path, store.load, store.save)
+        users = other_worker.load_users()
+        users[1]['active_devices'] = []
+        users[1]['devices'] = []
+        time.sleep(0.01)
+        with open(store.path, 'w') as f:
+            json.dump(users, f)
+
+        events, _ = bus.wait('user-1', 'DEV-1', cursor, timeout=2)
+        assert events[0]['type'] == 'device_disconnected'
+        assert events[0]['reason'] == 'removed'
+
+
+def test_foreign_cursor_and_timeout():
+    bus = LauncherEventBus(check_interval=0.01)
+    bus.publish([{'type': 'premium_revoked', 'user_id': 'user-1'}])
+
+    # A cursor from another process starts from now instead of replaying
+    events, cursor = bus.wait('user-1', None, 'deadbeef:0', timeout=0.05)
+    assert events == []
+    assert cursor == bus.cursor()
+    assert bus.get_stats()['timeouts'] == 1
+
+    # The buffer still serves a subscriber that read before the event
+    events, _ = bus.wait('user-1', None, bus.cursor(0), timeout=0)
+    assert events[0]['id'] == 1
+
+
+if __name__ == "__main__":
+    test_rebuilds_publish_launcher_changes()
+    test_waiting_subscriber_is_woken_by_a_save()
+    test_changes_from_another_process_reach_subscribers()
+    test_foreign_cursor_and_timeout()
+    print("Launcher event tests passed")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Test the launcher presence table against a temporary user store
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from file_lock import FileLock
+from launcher_presence import LauncherPresence
+
+
+def make_users(count):
+    """Build a user list shaped like users.json with one launcher device per user"""
+    users = []
+    for i in range(count):
+        users.append({
+            'id': f"user-{i}",
+            'username': f"user{i}",
+            'email': f"user{i}@example.com",
+            'status': 'Premium' if i % 2 else 'Standard',
+            'launcher_code': f"SWA2-{i:04d}-TEST",
+            'premium_history': [{'date': '2024-01-01 00:00:00', 'action': 'Premium Status Granted'}] * 5,
+            'devices': [{'device_id': f"DEV-{i}", 'last_connection': '2024-01-01 00:00:00'}],
+            'active_devices': [{'device_id': f"DEV-{i}", 'last_connection': '2024-01-01 00:00:00', 'disconnected': False}],
+        })
+    return users
+
+
+class UserStore:
+    """Minimal stand-in for get_users/save_users over a JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.saves = 0
+        self.presence = None
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, users):
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(users, f, indent=4)
+        shutil.move(temp_file, self.path)
+        self.saves += 1
+        if self.presence:
+            self.presence.sync(users)
+
+
+def make_presence(tmp, users, **options):
+    path = os.path.join(tmp, 'users.json')
+    with open(path, 'w') as f:
+        json.dump(users, f)
+    store = UserStore(path)
+    presence = LauncherPresence(path, store.load, store.save, **options)
+    store.presence = presence
+    return presence, store
+
+
+def test_polls_are_answered_from_memory():
+    with tempfile.TemporaryDirectory() as tmp:
+        presence, store = make_presence(tmp, make_users(3))
+
+        assert presence.get_user('user-1') == {'status': 'Premium', 'status_expires': '0', 'has_launcher_code': True,
+                                               'primary_device_id': None, 'primary_device': None}
+        assert presence.get_user('missing') is None
+        device = presence.get_device('user-1', 'DEV-1')
+        assert device['active'] and not device['disconnected'] and not device['force_disconnect']
+        assert presence.get_stats()['rebuilds'] == 1
+
+        # Polling again does not reload the store
+        for _ in range(100):
+            presence.get_device('user-1', 'DEV-1')
+        assert presence.get_stats()['rebuilds'] == 1
+
+        # A change written by another process is picked up
+        time.sleep(0.01)
+        users = store.load()
+        users[1]['active_devices'][0]['force_disconnect'] = True
+        users[1]['active_devices'][0]['disconnected'] = True
+        with open(store.path, 'w') as f:
+            json.dump(users, f)
+        assert presence.get_device('user-1', 'DEV-1')['force_disconnect']
+
+
+def test_heartbeats_are_flushed_in_one_save():
+    with tempfile.TemporaryDirectory() as tmp:
+        presence, store = make_presence(tmp, make_users(3))
+        seen_at = datetime(2024, 6, 1, 12, 0, 0)
+
+        assert presence.touch('user-0', 'DEV-0', seen_at)
+        assert presence.touch('user-2', 'DEV-2', seen_at)
+        assert not presence.touch('user-0', 'DEV-unknown', seen_at)
+        assert store.saves == 0
+        assert presence.get_device('user-0', 'DEV-0')['last_seen'] == '2024-06-01 12:00:00'
+
+        assert presence.flush() == 2
+        assert store.saves == 1
+        users = store.load()
+        assert users[0]['devices'][0]['last_connection'] == '2024-06-01 12:00:00'
+        assert users[1]['devices'][0]['last_connection'] == '2024-01-01 00:00:00'
+
+        # Nothing pending, nothing written
+        assert presence.flush() == 0
+        assert store.saves == 1
+
+
+def test_first_heartbeat_starts_the_flusher():
+    with tempfile.TemporaryDirectory() as tmp:
+        presence, store = make_presence(tmp, make_users(2), flush_interval=0.05)
+        assert presence._flusher is None
+
+        presence.touch('user-1', 'DEV-1', datetime(2024, 6, 1, 12, 0, 0))
+        for _ in range(200):
+            if store.saves:
+                break
+            time.sleep(0.01)
+        assert store.load()[1]['devices'][0]['last_connection'] == '2024-06-01 12:00:00'
+
+        # Later heartbeats reuse the running thread
+        flusher = presence._flusher
+        presence.touch('user-0', 'DEV-0')
+        assert presence._flusher is flusher and flusher.is_alive()
+        presence.flush()
+
+
+def test_flush_waits_for_the_store_lock():
+    with tempfile.TemporaryDirectory() as tmp:
+        lock = FileLock(os.path.join(tmp, 'users.json.lock'))
+        presence, store = make_presence(tmp, make_users(2), lock=lock)
+        presence.touch('user-0', 'DEV-0', datetime(2024, 6, 1, 12, 0, 0))
+
+        with lock:
+            # Another writer's transaction is in progress
+            users = store.load()
+            flusher = threading.Thread(target=presence.flush)
+            flusher.start()
+            time.sleep(0.1)
+            assert store.saves == 0
+            users[1]['status'] = 'Standard'
+            store.save(users)
+        flusher.join()
+
+        users = store.load()
+        assert users[1]['status'] == 'Standard'
+        assert users[0]['devices'][0]['last_connection'] == '2024-06-01 12:00:00'
+
+
+def test_pending_heartbeats_survive_unrelated_saves():
+    with tempfile.TemporaryDirectory() as tmp:
+        presence, store = make_presence(tmp, make_users(2))
+        presence.touch('user-0', 'DEV-0', datetime(2024, 6, 1, 12, 0, 0))
+
+        # Some other request rewrites the store before the flush
+        users = store.load()
+        users[0]['status'] = 'Standard'
+        store.save(users)
+
+        assert presence.get_user('user-0')['status'] == 'Standard'
+        assert presence.get_device('user-0', 'DEV-0')['last_seen'] == '2024-06-01 12:00:00'
+
+
+def test_device_registry_maps_devices_to_owners():
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(3)
+        users[0]['primary_device'] = {'device_id': 'DEV-0', 'device_name': 'Desk'}
+        users[1]['active_devices'][0].update(disconnected=True, force_disconnect=True)
+        users[2]['devices'].append({'device_id': 'DEV-shared', 'last_connection': '2024-03-01 00:00:00'})
+        users[0]['devices'].append({'device_id': 'DEV-shared', 'last_connection': '2024-02-01 00:00:00'})
+        presence, store = make_presence(tmp, users)
+
+        assert presence.get_device_owner('DEV-0') == {'user_id': 'user-0', 'status': 'active', 'last_seen': '2024-01-01 00:00:00'}
+        assert presence.get_device_owner('DEV-1')['status'] == 'force_disconnected'
+        assert presence.get_device_owner('DEV-missing') is None
+
+        # A device used by several accounts belongs to the one that used it last
+        assert presence.get_device_owner('DEV-shared')['user_id'] == 'user-2'
+        assert presence.get_device_owner('DEV-shared')['status'] == 'inactive'
+
+        assert [device_id for device_id, _ in presence.list_devices('user-0')] == ['DEV-0', 'DEV-shared']
+        assert presence.get_user('user-0')['primary_device'] == {'device_id': 'DEV-0', 'device_name': 'Desk'}
+
+        presence.touch('user-0', 'DEV-0', datetime(2024, 6, 1, 12, 0, 0))
+        assert presence.get_device_owner('DEV-0')['last_seen'] == '2024-06-01 12:00:00'
+
+
+def benchmark_polling(user_count=2000, polls=5000):
+    """Compare the file-reading poll with the presence table poll"""
+    with tempfile.TemporaryDirectory() as tmp:
+        presence, store = make_presence(tmp, make_users(user_count))
+
+        def legacy_poll(user_id, device_id):
+            for user in store.load():
+                if user['id'] == user_id:
+                    for device in user.get('active_devices', []):
+                        if device.get('device_id') == device_id:
+                            return not device.get('disconnected', False)
+            return False
+
+        legacy_polls = max(1, polls // 50)
+        started = time.perf_counter()
+        for i in range(legacy_polls):
+            legacy_poll(f"user-{i % user_count}", f"DEV-{i % user_count}")
+        legacy = (time.perf_counter() - started) / legacy_polls
+
+        started = time.perf_counter()
+        for i in range(polls):
+            presence.get_user(f"user-{i % user_count}")
+            presence.get_device(f"user-{i % user_count}", f"DEV-{i % user_count}")
+            presence.touch(f"user-{i % user_count}", f"DEV-{i % user_count}")
+        table = (time.perf_counter() - started) / polls
+
+        started = time.perf_counter()
+        written = presence.flush()
+        flush = time.perf_counter() - started
+
+        print(f"Launcher polling with {user_count} users:")
+        print(f"  users.json scan per poll: {legacy * 1000:8.3f} ms ({1 / legacy:10.0f} polls/s)")
+        print(f"  presence table per poll:  {table * 1000:8.3f} ms ({1 / table:10.0f} polls/s)")
+        print(f"  flush of {written} heartbeats:   {flush * 1000:8.1f} ms (one save)")
+
+
+if __name__ == "__main__":
+    test_polls_are_answered_from_memory()
+    test_heartbeats_are_flushed_in_one_save()
+    test_first_heartbeat_starts_the_flusher()
+    test_flush_waits_for_the_store_lock()
+    test_pending_heartbeats_survive_unrelated_saves()
+    test_device_registry_maps_devices_to_owners()
+    print("Launcher presence tests passed")
+    benchmark_polling()
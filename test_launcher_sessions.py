@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test batched launcher session ingestion against a temporary user store
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import app as swa_app
+
+
+class TemporaryUserStore:
+    """Point the app at a throwaway users.json for the duration of a test"""
+
+    def __init__(self, users):
+        self.users = users
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'users.json')
+        with open(self.path, 'w') as f:
+            json.dump(self.users, f)
+        self.saved_path = swa_app.USERS_FILE
+        self._point_at(self.path)
+        return self
+
+    def __exit__(self, *exc):
+        self._point_at(self.saved_path)
+        self.tmp.cleanup()
+
+    def _point_at(self, path):
+        swa_app.USERS_FILE = path
+        swa_app.launcher_presence.path = path
+        swa_app.users_store_lock.path = path + '.lock'
+
+    def load(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+
+def make_user():
+    return {
+        'id': 'user-1',
+        'username': 'player',
+        'email': 'player@example.com',
+        'status': 'Premium',
+        'devices': [{'device_id': 'DEV-1', 'last_connection': '2024-01-01 00:00:00'}],
+    }
+
+
+def test_batch_is_applied_in_one_write_and_is_idempotent():
+    with TemporaryUserStore([make_user()]) as store:
+        client = swa_app.app.test_client()
+        events = [
+            {'event_id': 'e1', 'game_id': '10', 'playtime': 90, 'timestamp': '2024-06-01 10:00:00'},
+            {'event_id': 'e2', 'game_id': '10', 'playtime': 30},
+            {'event_id': 'e3', 'game_id': '70', 'playtime': 5},
+            {'event_id': 'bad', 'game_id': '70'},
+        ]
+
+        mtime_before = os.stat(store.path).st_mtime_ns
+        response = client.post('/api/launcher/sessions', json={'user_id': 'user-1', 'device_id': 'DEV-1', 'events': events})
+        assert response.json['applied'] == 3
+        assert response.json['rejected'][0]['index'] == 3
+        assert os.stat(store.path).st_mtime_ns != mtime_before
+
+        user = store.load()[0]
+        assert user['total_play_time'] == '2h 5m'
+        assert user['games_played'] == 2
+        assert len(user['game_sessions']) == 3
+        assert user['game_sessions'][0]['timestamp'] == '2024-06-01 10:00:00'
+        assert user['devices'][0]['last_connection'] > '2024-01-01 00:00:00'
+
+        # A retried batch is not counted twice
+        retry = client.post('/api/launcher/sessions', json={'user_id': 'user-1', 'device_id': 'DEV-1', 'events': events[:3]})
+        assert retry.json['applied'] == 0
+        assert retry.json['duplicates'] == ['e1', 'e2', 'e3']
+        assert store.load()[0]['total_play_time'] == '2h 5m'
+
+
+def test_batch_that_changes_nothing_is_not_written():
+    with TemporaryUserStore([make_user()]) as store:
+        client = swa_app.app.test_client()
+        events = [{'event_id': 'e1', 'game_id': '10', 'playtime': 5}]
+        client.post('/api/launcher/sessions', json={'user_id': 'user-1', 'device_id': 'DEV-1', 'events': events})
+
+        # Duplicates and rejects from a device the user does not have
+        mtime_before = os.stat(store.path).st_mtime_ns
+        response = client.post('/api/launcher/sessions', json={
+            'user_id': 'user-1', 'device_id': 'DEV-unknown', 'events': events + [{'game_id': '70'}]})
+        assert response.json['applied'] == 0 and response.json['duplicates'] == ['e1']
+        assert os.stat(store.path).st_mtime_ns == mtime_before
+
+
+def test_batch_waits_for_other_writers_of_the_store():
+    with TemporaryUserStore([make_user()]) as store:
+        client = swa_app.app.test_client()
+        events = [{'event_id': 'e1', 'game_id': '10', 'playtime': 5}]
+        request = threading.Thread(target=client.post, args=('/api/launcher/sessions',),
+                                   kwargs={'json': {'user_id': 'user-1', 'events': events}})
+
+        with swa_app.users_store_lock:
+            # An admin edit loads the users while the batch arrives
+            users = swa_app.get_users()
+            request.start()
+            time.sleep(0.1)
+            users[0]['status'] = 'Standard'
+            swa_app.save_users(users)
+        request.join()
+
+        user = store.load()[0]
+        assert user['status'] == 'Standard' and user['total_play_time'] == '0h 5m'
+
+
+def test_update_session_wraps_the_batch_endpoint():
+    with TemporaryUserStore([make_user()]) as store:
+        client = swa_app.app.test_client()
+
+        response = client.post('/api/launcher/update-session', json={'user_id': 'user-1', 'game_id': '10', 'playtime': 15})
+        assert response.json == {'success': True}
+        assert store.load()[0]['total_play_time'] == '0h 15m'
+
+        missing = client.post('/api/launcher/update-session', json={'user_id': 'nobody', 'game_id': '10', 'playtime': 15})
+        assert missing.json == {'success': False, 'error': 'User not found'}
+
+
+if __name__ == "__main__":
+    test_batch_is_applied_in_one_write_and_is_idempotent()
+    test_batch_that_changes_nothing_is_not_written()
+    test_batch_waits_for_other_writers_of_the_store()
+    test_update_session_wraps_the_batch_endpoint()
+    print("Launcher session tests passed")
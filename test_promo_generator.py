@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test bulk promo code generation, append-only persistence and CSV export
+"""
+
+import csv
+import io
+import json
+import os
+import random
+import string
+import tempfile
+import time
+from collections import Counter
+
+from promo_generator import PromoCodeGenerator, append_to_json_array, iter_csv, CODE_ALPHABET
+
+
+def test_codes_are_distinct_and_use_the_alphabet():
+    generator = PromoCodeGenerator()
+    taken = {'AAAAAAAAAAAAAA'}
+
+    def is_taken(code):
+        if code in taken:
+            return True
+        taken.add(code)
+        return False
+
+    codes = list(generator.generate(5000, is_taken, chunk_size=512))
+    assert len(codes) == len(set(codes)) == 5000
+    assert all(len(code) == 14 and set(code) <= set(CODE_ALPHABET) for code in codes)
+
+    # Every character is about equally likely (no modulo bias towards A-D)
+    counts = Counter(''.join(codes))
+    expected = 5000 * 14 / len(CODE_ALPHABET)
+    assert all(abs(counts[char] - expected) < expected * 0.15 for char in CODE_ALPHABET)
+
+    assert len(generator.token(4)) == 4
+
+
+def test_collisions_are_skipped():
+    generator = PromoCodeGenerator(alphabet='AB', length=3)
+    seen = set()
+
+    def is_taken(code):
+        if code in seen:
+            return True
+        seen.add(code)
+        return False
+
+    # Only 8 codes exist over this alphabet
+    assert sorted(generator.generate(8, is_taken)) == sorted({a + b + c for a in 'AB' for b in 'AB' for c in 'AB'})
+
+
+def test_append_keeps_the_store_a_json_array():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'promo_codes.json')
+
+        assert append_to_json_array(path, [{'id': '1'}]) == 1
+        assert json.load(open(path)) == [{'id': '1'}]
+
+        existing = [{'id': '2', 'redeemed_by': []}]
+        with open(path, 'w') as f:
+            json.dump(existing, f, indent=4)
+        assert append_to_json_array(path, ({'id': str(i), 'redeemed_by': [{'user': 'u'}]} for i in range(3, 6))) == 3
+        stored = json.load(open(path))
+        assert [p['id'] for p in stored] == ['2', '3', '4', '5']
+
+        # One appended item per line at the array indentation
+        lines = open(path).read().splitlines()
+        assert lines[-4:] == ['    ' + json.dumps(item) + (',' if i < 2 else '') for i, item in enumerate(stored[1:])] + [']']
+
+        # Empty arrays and nothing to append
+        with open(path, 'w') as f:
+            f.write('[]\n')
+        assert append_to_json_array(path, []) == 0
+        assert json.load(open(path)) == []
+        assert append_to_json_array(path, [{'id': 'x'}]) == 1
+        assert json.load(open(path)) == [{'id': 'x'}]
+
+
+def test_failed_generation_leaves_a_valid_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'promo_codes.json')
+        with open(path, 'w') as f:
+            json.dump([{'id': '1'}], f, indent=4)
+
+        def broken():
+            yield {'id': '2'}
+            raise RuntimeError('generator failed')
+
+        try:
+            append_to_json_array(path, broken())
+            assert False, "the error must propagate"
+        except RuntimeError:
+            pass
+        assert [p['id'] for p in json.load(open(path))] == ['1', '2']
+
+
+def test_failed_write_leaves_the_old_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'promo_codes.json')
+        with open(path, 'w') as f:
+            json.dump([{'id': '1'}], f, indent=4)
+        before = open(path).read()
+
+        # Writing the second item fails half way through the batch
+        try:
+            append_to_json_array(path, [{'id': '2'}, {'id': '3', 'bad': object()}])
+            assert False, "the error must propagate"
+        except TypeError:
+            pass
+        assert open(path).read() == before
+        assert os.listdir(tmp) == ['promo_codes.json']
+
+
+def test_csv_export_streams_rows():
+    rows = ({'code': f"CODE{i}", 'group': 'partner', 'uses_limit': 1, 'extra': 'ignored'} for i in range(3))
+    chunks = list(iter_csv(rows, fields=('code', 'group', 'uses_limit')))
+    assert len(chunks) == 3
+    parsed = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert [row['code'] for row in parsed] == ['CODE0', 'CODE1', 'CODE2']
+    assert ''.join(iter_csv([], fields=('code',))).strip() == 'code'
+
+
+def benchmark_bulk_generation(count=100000):
+    """Compare the random.choice loop with rejection-sampled token_bytes chunks"""
+    chars = string.ascii_uppercase + string.digits
+
+    started = time.perf_counter()
+    existing = set()
+    for _ in range(count):
+        code = ''.join(random.choice(chars) for _ in range(14))
+        while code in existing:
+            code = ''.join(random.choice(chars) for _ in range(14))
+        existing.add(code)
+    legacy = time.perf_counter() - started
+
+    generator = PromoCodeGenerator()
+    taken = set()
+    started = time.perf_counter()
+    for code in generator.generate(count, taken.__contains__):
+        taken.add(code)
+    bulk = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'promo_codes.json')
+        with open(path, 'w') as f:
+            json.dump([{'id': str(i), 'code': code} for i, code in enumerate(existing)], f, indent=4)
+        promos = ({'id': f"new-{i}", 'code': code, 'redeemed_by': []} for i, code in enumerate(taken))
+
+        started = time.perf_counter()
+        append_to_json_array(path, promos)
+        append = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with open(path) as f:
+            stored = json.load(f)
+        with open(path, 'w') as f:
+            json.dump(stored, f, indent=4)
+        rewrite = time.perf_counter() - started
+
+    print(f"Generating {count} promo codes:")
+    print(f"  random.choice per character: {legacy * 1000:8.1f} ms")
+    print(f"  token_bytes + translate:     {bulk * 1000:8.1f} ms")
+    print(f"  append batch to store:       {append * 1000:8.1f} ms")
+    print(f"  load and rewrite the store:  {rewrite * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    test_codes_are_distinct_and_use_the_alphabet()
+    test_collisions_are_skipped()
+    test_append_keeps_the_store_a_json_array()
+    test_failed_generation_leaves_a_valid_store()
+    test_failed_write_leaves_the_old_store()
+    test_csv_export_streams_rows()
+    print("Promo generator tests passed")
+    benchmark_bulk_generation()
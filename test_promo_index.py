@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Test the promo group index behind the admin promo codes page
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from promo_index import PromoIndex
+
+NOW = datetime(2024, 6, 2, 15, 30, 0)
+
+
+def make_codes(count, seed=11):
+    """Codes shaped like promo_codes.json across groups, limits, expiries and redemptions"""
+    rng = random.Random(seed)
+    codes = []
+    for i in range(count):
+        uses_limit = rng.choice([0, 1, 1, 5])
+        redeemed = rng.randint(0, uses_limit or 3)
+        codes.append({
+            'id': f"promo-{i}",
+            'code': f"CODE{i:06d}",
+            'description': 'Test code',
+            'uses_limit': uses_limit,
+            'expires_at': rng.choice([None, None, '2024-06-01 23:59:00', '2024-07-01 23:59:00', '2024-05-01']),
+            'gives_premium': True,
+            'premium_duration': '3',
+            'slots': 0,
+            'slots_duration': '3',
+            'redeemed_by': [{'user_id': f"user-{n}", 'username': f"user{n}"} for n in range(redeemed)],
+            'group': rng.choice(['default', 'vip', 'partner', None]),
+        })
+    return codes
+
+
+def legacy_status(promo, now):
+    """Reference: the badge logic promo_codes.html used to evaluate per row"""
+    uses_count = len(promo.get('redeemed_by', []))
+    if promo['uses_limit'] > 0 and uses_count >= promo['uses_limit']:
+        return 'used'
+    expires_at = promo.get('expires_at')
+    if expires_at:
+        try:
+            expires = datetime.strptime(expires_at, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            expires = datetime.strptime(expires_at, '%Y-%m-%d')
+        if expires < now:
+            return 'expired'
+    return 'active'
+
+
+def legacy_summaries(codes, now):
+    summaries = {}
+    for promo in codes:
+        group = promo.get('group') or 'default'
+        summary = summaries.setdefault(group, {'group': group, 'total': 0, 'used': 0, 'expired': 0, 'remaining': 0})
+        summary['total'] += 1
+        summary[{'used': 'used', 'expired': 'expired', 'active': 'remaining'}[legacy_status(promo, now)]] += 1
+    return [summaries[group] for group in sorted(summaries)]
+
+
+def make_index(tmp, codes):
+    path = os.path.join(tmp, 'promo_codes.json')
+    with open(path, 'w') as f:
+        json.dump(codes, f)
+    index = PromoIndex(path, lambda: json.load(open(path)))
+    index.sync(codes)
+    return index
+
+
+def test_group_summaries_match_row_statuses():
+    with tempfile.TemporaryDirectory() as tmp:
+        codes = make_codes(600)
+        index = make_index(tmp, codes)
+        assert index.group_summaries(NOW) == legacy_summaries(codes, NOW)
+
+
+def test_group_pages_follow_store_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        codes = make_codes(300)
+        index = make_index(tmp, codes)
+        expected = [promo['id'] for promo in codes if (promo.get('group') or 'default') == 'vip']
+
+        seen, page = [], 1
+        while True:
+            result = index.query_group('vip', page=page, per_page=17)
+            assert result['total'] == len(expected)
+            if not result['codes']:
+                break
+            seen.extend(row['id'] for row in result['codes'])
+            page += 1
+        assert seen == expected
+
+        row = index.query_group('vip', per_page=1)['codes'][0]
+        promo = next(promo for promo in codes if promo['id'] == row['id'])
+        assert row['uses_count'] == len(promo['redeemed_by'])
+        assert row['status'] == legacy_status(promo, datetime.now())
+        assert index.query_group('missing') == {'codes': [], 'total': 0}
+
+
+def test_group_pages_follow_in_place_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        codes = make_codes(300)
+        index = make_index(tmp, codes)
+        vip = [promo for promo in codes if (promo.get('group') or 'default') == 'vip']
+
+        index.remove([vip[0]['id'], vip[10]['id']])
+        new_code = dict(vip[1], id='promo-new', code='NEWVIP1')
+        index.add(new_code)
+        expected = [promo['id'] for promo in vip if promo['id'] not in (vip[0]['id'], vip[10]['id'])] + ['promo-new']
+
+        pages = [index.query_group('vip', page=page, per_page=7) for page in range(1, len(expected) // 7 + 3)]
+        assert [row['id'] for result in pages for row in result['codes']] == expected
+        assert all(result['total'] == len(expected) for result in pages)
+
+        # A group emptied and refilled starts a fresh list
+        index.remove(index.group_code_ids('partner'))
+        index.add(dict(vip[2], id='promo-partner', code='PARTNER1', group='partner'))
+        assert [row['id'] for row in index.query_group('partner')['codes']] == ['promo-partner']
+
+
+def test_changes_on_disk_are_picked_up():
+    with tempfile.TemporaryDirectory() as tmp:
+        codes = make_codes(20)
+        index = make_index(tmp, codes)
+
+        time.sleep(0.01)
+        codes.append(dict(codes[0], id='promo-new', group='seasonal'))
+        with open(index.path, 'w') as f:
+            json.dump(codes, f)
+        assert index.group_summaries(NOW) == legacy_summaries(codes, NOW)
+
+
+def test_in_place_updates_match_a_rebuild():
+    with tempfile.TemporaryDirectory() as tmp:
+        codes = make_codes(200)
+        index = make_index(tmp, codes)
+
+        # Create, redeem until used up, move between groups and delete
+        new_code = dict(codes[0], id='promo-new', group='seasonal', redeemed_by=[], uses_limit=1, expires_at='2024-06-03 00:00:00')
+        codes.append(new_code)
+        index.add(new_code)
+        new_code['redeemed_by'] = [{'user_id': 'user-9'}]
+        index.update(new_code)
+        codes[1]['group'] = 'partner'
+        index.update(codes[1])
+        removed = [codes.pop(5)['id'], codes.pop(5)['id']]
+        assert index.remove(removed + ['promo-missing']) == 2
+
+        signature = index._signature
+        rebuilt_dir = os.path.join(tmp, 'rebuilt')
+        os.mkdir(rebuilt_dir)
+        rebuilt = make_index(rebuilt_dir, codes)
+        assert index._signature == signature
+        assert index.group_summaries(NOW) == rebuilt.group_summaries(NOW) == legacy_summaries(codes, NOW)
+        # A code moved to another group is listed last there until the next rebuild
+        by_id = lambda row: row['id']
+        for group in index.group_names():
+            assert (sorted(index.query_group(group, per_page=1000)['codes'], key=by_id)
+                    == sorted(rebuilt.query_group(group, per_page=1000)['codes'], key=by_id))
+
+
+def test_group_delete_ids_come_from_the_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        codes = make_codes(300)
+        index = make_index(tmp, codes)
+
+        used = index.group_code_ids('vip', used_only=True)
+        assert used == {promo['id'] for promo in codes
+                        if (promo.get('group') or 'default') == 'vip' and legacy_status(promo, NOW) == 'used'}
+        assert index.group_code_ids('vip') >= used
+
+        index.remove(used)
+        summary = next(summary for summary in index.group_summaries(NOW) if summary['group'] == 'vip')
+        assert summary['used'] == 0
+
+        index.remove(index.group_code_ids('partner'))
+        assert 'partner' not in index.group_names()
+        assert index.group_code_ids('partner') == set()
+
+
+def benchmark_admin_page(code_count=50000):
+    """Compare re-parsing and sorting every code per page load with the index"""
+    with tempfile.TemporaryDirectory() as tmp:
+        codes = make_codes(code_count)
+        index = make_index(tmp, codes)
+
+        started = time.perf_counter()
+        legacy_summaries(codes, NOW)
+        sorted(codes, key=lambda promo: promo.get('group') or 'default')
+        legacy = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.sync(codes)
+        resync = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.group_summaries(NOW)
+        index.query_group('vip', page=3)
+        indexed = time.perf_counter() - started
+
+        last_page = index.query_group('vip', per_page=50)['total'] // 50
+        started = time.perf_counter()
+        index.query_group('vip', page=last_page)
+        deep_page = time.perf_counter() - started
+
+        promo = codes[len(codes) // 2]
+        promo['redeemed_by'] = promo['redeemed_by'] + [{'user_id': 'user-new'}]
+        started = time.perf_counter()
+        index.update(promo)
+        in_place = time.perf_counter() - started
+
+        started = time.perf_counter()
+        [p for p in codes if p.get('group') != 'vip' or legacy_status(p, NOW) != 'used']
+        legacy_delete = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.remove(index.group_code_ids('vip', used_only=True))
+        indexed_delete = time.perf_counter() - started
+
+        print(f"Admin promo page over {code_count} codes:")
+        print(f"  parse and sort per page load: {legacy * 1000:8.2f} ms")
+        print(f"  index rebuild:                {resync * 1000:8.2f} ms")
+        print(f"  in-place update on redeem:    {in_place * 1000:8.2f} ms")
+        print(f"  summaries and one page:       {indexed * 1000:8.2f} ms")
+        print(f"  last page of the group:       {deep_page * 1000:8.2f} ms")
+        print(f"  used-code group delete scan:  {legacy_delete * 1000:8.2f} ms")
+        print(f"  used-code group delete index: {indexed_delete * 1000:8.2f} ms (before the one save)")
+
+
+if __name__ == "__main__":
+    test_group_summaries_match_row_statuses()
+    test_group_pages_follow_store_order()
+    test_group_pages_follow_in_place_changes()
+    test_changes_on_disk_are_picked_up()
+    test_in_place_updates_match_a_rebuild()
+    test_group_delete_ids_come_from_the_index()
+    print("Promo index tests passed")
+    benchmark_admin_page()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Test promo redemption as one locked transaction against temporary stores
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import app as swa_app
+from promo_index import PromoIndex
+
+
+class TemporaryPromoStore:
+    """Point the app at throwaway users.json and promo_codes.json files for the duration of a test"""
+
+    def __init__(self, users, promo_codes):
+        self.users = users
+        self.promo_codes = promo_codes
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.users_path = os.path.join(self.tmp.name, 'users.json')
+        self.promo_path = os.path.join(self.tmp.name, 'promo_codes.json')
+        self.redemptions_path = os.path.join(self.tmp.name, 'promo_redemptions.json')
+        with open(self.users_path, 'w') as f:
+            json.dump(self.users, f)
+        with open(self.promo_path, 'w') as f:
+            json.dump(self.promo_codes, f)
+
+        self.saved = (swa_app.USERS_FILE, swa_app.PROMO_CODES_FILE, swa_app.promo_index.redemptions_path,
+                      swa_app.promo_store_lock.path, swa_app.users_store_lock.path)
+        self._point_at(self.users_path, self.promo_path, self.redemptions_path, self.promo_path + '.lock',
+                       self.users_path + '.lock')
+        return self
+
+    def __exit__(self, *exc):
+        self._point_at(*self.saved)
+        self.tmp.cleanup()
+
+    def _point_at(self, users_path, promo_path, redemptions_path, lock_path, users_lock_path):
+        swa_app.USERS_FILE = users_path
+        swa_app.launcher_presence.path = users_path
+        swa_app.user_index.path = users_path
+        swa_app.PROMO_CODES_FILE = promo_path
+        swa_app.promo_index.path = promo_path
+        swa_app.promo_index.redemptions_path = redemptions_path
+        swa_app.promo_store_lock.path = lock_path
+        swa_app.users_store_lock.path = users_lock_path
+
+    def load_users(self):
+        with open(self.users_path) as f:
+            return json.load(f)
+
+    def load_promo(self, code):
+        with open(self.promo_path) as f:
+            return next(promo for promo in json.load(f) if promo['code'] == code)
+
+
+def make_users(count):
+    return [{'id': f"user-{i}", 'username': f"player{i}", 'email': f"player{i}@example.com", 'status': 'Standard'}
+            for i in range(count)]
+
+
+def make_promo(code, uses_limit, **fields):
+    promo = {
+        'id': f"promo-{code}",
+        'code': code,
+        'description': 'Test code',
+        'uses_limit': uses_limit,
+        'expires_at': None,
+        'gives_premium': True,
+        'premium_duration': '2',
+        'slots': 1,
+        'slots_duration': '3',
+        'redeemed_by': [],
+        'group': 'test',
+    }
+    promo.update(fields)
+    return promo
+
+
+def hammer(calls):
+    """Run the calls from as many threads, released at the same moment; returns their results"""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(index, call):
+        barrier.wait()
+        results[index] = call()
+
+    threads = [threading.Thread(target=run, args=(index, call)) for index, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_use_code_is_redeemed_once_under_contention():
+    with TemporaryPromoStore(make_users(50), [make_promo('ONCE', 1)]) as store:
+        results = hammer([lambda i=i: swa_app.redeem_promo(f"user-{i}", 'once') for i in range(50)])
+
+        assert sum(1 for success, _ in results if success) == 1
+        assert {message for success, message in results if not success} == {'Promo code has reached its usage limit'}
+
+        promo = store.load_promo('ONCE')
+        assert len(promo['redeemed_by']) == promo['uses_count'] == 1
+        winner = promo['redeemed_by'][0]['id']
+        users = {user['id']: user for user in store.load_users()}
+        assert users[winner]['status'] == 'Premium' and users[winner]['slots'] == 1
+        assert sum(1 for user in users.values() if user['status'] == 'Premium') == 1
+
+
+def redeem_in_worker(barrier, results, user_ids, code):
+    """A forked stand-in for a gunicorn worker: its own promo index and threads"""
+    try:
+        barrier.wait()
+        outcomes = hammer([lambda user_id=user_id: swa_app.redeem_promo(user_id, code) for user_id in user_ids])
+        results.put(sum(1 for success, _ in outcomes if success))
+    except Exception as e:
+        results.put(e)
+
+
+def test_single_use_code_is_redeemed_once_across_processes():
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return
+    context = multiprocessing.get_context('fork')
+    workers = 4
+    with TemporaryPromoStore(make_users(40), [make_promo('WORKERS', 1)]) as store:
+        swa_app.promo_index.ensure_current()
+        barrier, results = context.Barrier(workers), context.Queue()
+        processes = [context.Process(target=redeem_in_worker,
+                                     args=(barrier, results, [f"user-{w * 10 + i}" for i in range(10)], 'WORKERS'))
+                     for w in range(workers)]
+        for process in processes:
+            process.start()
+        successes = [results.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join()
+
+        assert not [result for result in successes if isinstance(result, Exception)], successes
+        assert sum(successes) == 1
+        promo = store.load_promo('WORKERS')
+        assert len(promo['redeemed_by']) == 1
+        assert sum(1 for user in store.load_users() if user['status'] == 'Premium') == 1
+
+
+def test_failed_user_write_gives_the_code_back():
+    with TemporaryPromoStore(make_users(2), [make_promo('RETRY', 1)]) as store:
+        original_save_users = swa_app.save_users
+
+        def failing_save_users(users):
+            raise OSError('disk full')
+
+        swa_app.save_users = failing_save_users
+        try:
+            swa_app.redeem_promo('user-0', 'RETRY')
+            assert False, "the user write error must reach the caller"
+        except OSError:
+            pass
+        finally:
+            swa_app.save_users = original_save_users
+
+        promo = store.load_promo('RETRY')
+        assert promo['redeemed_by'] == [] and promo['uses_count'] == 0
+        assert not swa_app.promo_index.has_redeemed('promo-RETRY', 'user-0')
+        assert swa_app.redeem_promo('user-1', 'RETRY') == (True, 'Promo code activated successfully!')
+
+
+def test_benefits_survive_a_concurrent_users_write():
+    with TemporaryPromoStore(make_users(2), [make_promo('GIFT', 1)]) as store:
+        results = []
+        redemption = threading.Thread(target=lambda: results.append(swa_app.redeem_promo('user-0', 'GIFT')))
+
+        with swa_app.users_store_lock:
+            # Another users.json writer (e.g. a heartbeat flush) loads the users as the code is redeemed
+            users = swa_app.get_users()
+            redemption.start()
+            time.sleep(0.1)
+            users[1]['status'] = 'Premium'
+            swa_app.save_users(users)
+        redemption.join()
+
+        assert results == [(True, 'Promo code activated successfully!')]
+        users = store.load_users()
+        assert users[0]['status'] == 'Premium' and users[0].get('premium_expires_at')
+        assert users[1]['status'] == 'Premium'
+
+
+def test_a_user_redeems_a_code_once():
+    with TemporaryPromoStore(make_users(2), [make_promo('MULTI', 0)]) as store:
+        results = hammer([lambda: swa_app.redeem_promo('user-0', 'MULTI') for _ in range(50)])
+
+        assert sum(1 for success, _ in results if success) == 1
+        assert {message for success, message in results if not success} == {'You have already used this promo code'}
+        assert swa_app.redeem_promo('user-1', 'MULTI') == (True, 'Promo code activated successfully!')
+        assert [entry['id'] for entry in store.load_promo('MULTI')['redeemed_by']] == ['user-0', 'user-1']
+
+
+def test_expired_and_unknown_codes_are_rejected():
+    codes = [make_promo('OLD', 1, expires_at='2020-01-01 00:00:00'), make_promo('OLDDATE', 1, expires_at='2020-01-01')]
+    with TemporaryPromoStore(make_users(1), codes) as store:
+        assert swa_app.redeem_promo('user-0', 'OLD') == (False, 'Promo code has expired')
+        assert swa_app.redeem_promo('user-0', 'olddate') == (False, 'Promo code has expired')
+        assert swa_app.redeem_promo('user-0', 'NOPE') == (False, 'Promo code not found or already used')
+        assert store.load_users()[0]['status'] == 'Standard'
+
+
+def test_redemptions_are_listed_per_user_and_persisted():
+    codes = [make_promo('FIRST', 0), make_promo('SECOND', 0, group='other'), make_promo('UNUSED', 0)]
+    users = make_users(3)
+    users[2]['is_admin'] = True
+    with TemporaryPromoStore(users, codes) as store:
+        assert swa_app.redeem_promo('user-0', 'FIRST')[0]
+        assert swa_app.redeem_promo('user-0', 'SECOND')[0]
+        assert swa_app.redeem_promo('user-1', 'FIRST')[0]
+
+        redeemed = swa_app.promo_index.redeemed_by_user('user-0')
+        assert sorted(entry['code'] for entry in redeemed) == ['FIRST', 'SECOND']
+        assert swa_app.promo_index.redeemed_by_user('user-2') == []
+
+        # The admin user dialog lists them too
+        with swa_app.app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['user_id'] = 'user-2'
+            user = client.get('/admin/users/get/user-1').get_json()['user']
+        assert [entry['code'] for entry in user['redeemed_promo_codes']] == ['FIRST']
+
+        # A fresh index takes the redemptions from the file saved next to the store
+        fresh = PromoIndex(store.promo_path, lambda: json.load(open(store.promo_path)), store.redemptions_path)
+        assert fresh._load_redemptions(fresh._file_signature()) is not None
+        fresh.ensure_current()
+        assert fresh.user_redemptions == swa_app.promo_index.user_redemptions
+        assert fresh.has_redeemed('promo-FIRST', 'user-1') and not fresh.has_redeemed('promo-UNUSED', 'user-1')
+
+        # An outside edit of the store invalidates the saved redemptions
+        promo_codes = json.load(open(store.promo_path))
+        promo_codes[0]['redeemed_by'] = []
+        with open(store.promo_path, 'w') as f:
+            json.dump(promo_codes, f)
+        fresh.ensure_current()
+        assert [entry['code'] for entry in fresh.redeemed_by_user('user-0')] == ['SECOND']
+
+
+def test_failed_bulk_write_leaves_no_codes_in_the_index():
+    users = make_users(1)
+    users[0]['is_admin'] = True
+    with TemporaryPromoStore(users, [make_promo('KEEP', 1)]) as store:
+        original_append = swa_app.append_to_json_array
+
+        def failing_append(path, items, indent=4):
+            def first_three():
+                for count, item in enumerate(items):
+                    if count == 3:
+                        raise OSError('disk full')
+                    yield item
+            return original_append(path, first_three(), indent)
+
+        swa_app.append_to_json_array = failing_append
+        try:
+            with swa_app.app.test_client() as client:
+                with client.session_transaction() as sess:
+                    sess['user_id'] = 'user-0'
+                response = client.post('/admin/promo-codes/bulk-create', json={'count': 10, 'group': 'bulk'})
+        finally:
+            swa_app.append_to_json_array = original_append
+        assert response.status_code == 500
+
+        # Only the codes that reached the store are indexed
+        on_disk = json.load(open(store.promo_path))
+        assert len(on_disk) == 4
+        assert sorted(swa_app.promo_index.codes) == sorted(promo['code'].upper() for promo in on_disk)
+
+
+def test_failed_group_delete_keeps_the_codes_redeemable():
+    users = make_users(2)
+    users[0]['is_admin'] = True
+    with TemporaryPromoStore(users, [make_promo('USED', 0), make_promo('SPARE', 1)]) as store:
+        assert swa_app.redeem_promo('user-0', 'USED')[0]
+        # The store cannot be replaced: the temporary file path is taken by a directory
+        os.mkdir(store.promo_path + '.tmp')
+
+        with swa_app.app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['user_id'] = 'user-0'
+            response = client.post('/admin/promo-codes/group/delete', data={'group_name': 'test', 'delete_type': 'all'})
+        assert response.status_code == 500
+        assert len(json.load(open(store.promo_path))) == 2
+
+        # The index still has what the file has
+        assert swa_app.promo_index.find('SPARE') == 'promo-SPARE'
+        assert swa_app.promo_index.group_code_ids('test', used_only=False)
+        os.rmdir(store.promo_path + '.tmp')
+        assert swa_app.redeem_promo('user-1', 'SPARE') == (True, 'Promo code activated successfully!')
+
+
+def test_batches_written_by_another_process_can_be_exported():
+    users = make_users(1)
+    users[0]['is_admin'] = True
+    with TemporaryPromoStore(users, [make_promo('KEEP', 1)]) as store:
+        swa_app.promo_index.ensure_current()
+        promo_codes = json.load(open(store.promo_path))
+        promo_codes.append(make_promo('OTHERWORKER', 1, batch_id='batch-elsewhere'))
+        time.sleep(0.01)
+        with open(store.promo_path, 'w') as f:
+            json.dump(promo_codes, f)
+
+        with swa_app.app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['user_id'] = 'user-0'
+            response = client.get('/admin/promo-codes/batches/batch-elsewhere/export.csv')
+        assert response.status_code == 200 and 'OTHERWORKER' in response.get_data(as_text=True)
+
+
+if __name__ == "__main__":
+    test_single_use_code_is_redeemed_once_under_contention()
+    test_single_use_code_is_redeemed_once_across_processes()
+    test_failed_user_write_gives_the_code_back()
+    test_benefits_survive_a_concurrent_users_write()
+    test_a_user_redeems_a_code_once()
+    test_expired_and_unknown_codes_are_rejected()
+    test_redemptions_are_listed_per_user_and_persisted()
+    test_failed_bulk_write_leaves_no_codes_in_the_index()
+    test_failed_group_delete_keeps_the_codes_redeemable()
+    test_batches_written_by_another_process_can_be_exported()
+    print("Promo redemption tests passed")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test the ring-buffer traffic and authorization logs of PermGuardAuth
+"""
+
+import logging
+import time
+
+from flask import Flask, Response
+
+from permguard_auth import PermGuardAuth, permguard_logger
+from test_traffic_stats import make_entry
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+
+    @app.route('/games/<game_id>')
+    def game(game_id):
+        return f"game {game_id}"
+
+    auth = PermGuardAuth(app)
+    return app, auth
+
+
+class CapturedLines(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def test_full_log_drops_the_oldest_entries():
+    app, auth = make_app()
+    auth.set_log_capacity(5)
+    client = app.test_client()
+    for i in range(8):
+        client.get(f'/games/{i}?page={i}&page=x')
+
+    assert len(auth.traffic_log) == 5
+    assert [entry['path'] for entry in auth.traffic_log] == [f'/games/{i}' for i in range(3, 8)]
+    assert auth.traffic_log[-1]['args'] == {'page': '7'}
+    # Ids stay unique after entries are dropped
+    assert len({entry['id'] for entry in auth.traffic_log}) == 5
+    assert auth.traffic_log[-1]['id'].startswith('traffic_7_')
+
+
+def test_resizing_keeps_the_newest_entries():
+    auth = PermGuardAuth(log_capacity=3)
+    auth.traffic_log.extend(make_entry(i) for i in range(10))
+    assert [entry['id'] for entry in auth.traffic_log] == ['traffic_7', 'traffic_8', 'traffic_9']
+
+    auth.set_log_capacity(2)
+    assert [entry['id'] for entry in auth.traffic_log] == ['traffic_8', 'traffic_9']
+    assert auth.get_traffic_stats()['total_requests'] == 2
+    assert auth.authorization_log.maxlen == 2
+    try:
+        auth.set_log_capacity(0)
+        assert False, "an empty log must be rejected"
+    except ValueError:
+        pass
+
+
+def test_authorization_log_is_bounded():
+    auth = PermGuardAuth(log_capacity=4)
+    for i in range(6):
+        auth._log_authorization(f'user{i}', 'game::view', 'game::1', {}, {'allowed': i % 2 == 0}, 1.0)
+    logs = auth.authorization_log
+    assert [log['user'] for log in logs] == ['user2', 'user3', 'user4', 'user5']
+    assert logs[-1]['id'].startswith('auth_5_')
+    assert auth.get_authorization_stats()['total_requests'] == 4
+
+
+def test_traffic_lines_can_be_switched_off():
+    handler = CapturedLines()
+    permguard_logger.addHandler(handler)
+    try:
+        app, _ = make_app()
+        app.test_client().get('/games/1')
+        quiet, _ = make_app(PERMGUARD_LOG_TRAFFIC=False)
+        quiet.test_client().get('/games/2')
+    finally:
+        permguard_logger.removeHandler(handler)
+
+    traffic = [line for line in handler.lines if 'TRAFFIC' in line]
+    assert len(traffic) == 1 and 'GET /games/1 -> 200' in traffic[0]
+
+
+def legacy_after_request(log, request, response, current_user, duration):
+    """Reference: the list-backed _after_request body"""
+    end_time = time.localtime()
+    traffic_entry = {
+        'id': f"traffic_{len(log)}_{time.strftime('%Y%m%d_%H%M%S', end_time)}",
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', end_time),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status_code': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'ip_address': request.remote_addr,
+        'user_agent': request.headers.get('User-Agent', 'unknown'),
+        'user': current_user,
+        'content_length': response.content_length or 0,
+        'referrer': request.referrer,
+        'args': dict(request.args) if request.args else {},
+    }
+    log.append(traffic_entry)
+    permguard_logger.debug(
+        f"🌐 TRAFFIC: {request.method} {request.path} -> {response.status_code} "
+        f"({round(duration * 1000, 2)}ms) user: {current_user} IP: {request.remote_addr}"
+    )
+    if len(log) > 1000:
+        log.pop(0)
+
+
+def benchmark_middleware(requests=20000, capacities=(1000, 100000)):
+    """Per-request cost of the traffic middleware with a full log"""
+    level = permguard_logger.level
+    # Measure the bookkeeping, not the log file
+    permguard_logger.setLevel(logging.INFO)
+    try:
+        for capacity in capacities:
+            app, auth = make_app()
+            auth.set_log_capacity(capacity)
+            auth.traffic_log.extend(make_entry(i) for i in range(capacity))
+            legacy_log = [make_entry(i) for i in range(capacity)]
+            response = Response('ok')
+
+            with app.test_request_context('/games/730?page=2', headers={'User-Agent': 'bench'}):
+                from flask import request
+
+                started = time.perf_counter()
+                for _ in range(requests):
+                    legacy_after_request(legacy_log, request, response, 'anonymous', 0.0123)
+                legacy = (time.perf_counter() - started) / requests
+
+                auth._before_request()
+                started = time.perf_counter()
+                for _ in range(requests):
+                    auth._after_request(response)
+                ring = (time.perf_counter() - started) / requests
+
+            print(f"Traffic middleware, full log of {capacity} entries ({requests} requests):")
+            print(f"  list + pop(0):   {legacy * 1e6:8.2f} us/request")
+            print(f"  ring buffer:     {ring * 1e6:8.2f} us/request")
+    finally:
+        permguard_logger.setLevel(level)
+
+
+if __name__ == "__main__":
+    test_full_log_drops_the_oldest_entries()
+    test_resizing_keeps_the_newest_entries()
+    test_authorization_log_is_bounded()
+    test_traffic_lines_can_be_switched_off()
+    print("Traffic log tests passed")
+    benchmark_middleware()
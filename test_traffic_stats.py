@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test the running traffic aggregates against rescanning the log
+"""
+
+import random
+import time
+
+from traffic_stats import TrafficLog
+
+ENDPOINTS = [
+    ('GET', '/', 'index'),
+    ('GET', '/gamelist', 'gamelist'),
+    ('GET', '/admin/traffic', 'admin_traffic'),
+    ('GET', '/api/admin/traffic/stats', 'api_admin_traffic_stats'),
+    ('POST', '/login', 'login'),
+    ('GET', '/nonexistent', None),
+]
+
+
+def make_entry(i, rng=None):
+    """A traffic entry in the shape PermGuardAuth._after_request records"""
+    rng = rng or random.Random(i)
+    method, path, endpoint = rng.choice(ENDPOINTS)
+    return {
+        'id': f"traffic_{i}",
+        'timestamp': f"2024-06-02T10:{i // 60 % 60:02d}:{i % 60:02d}",
+        'method': method,
+        'path': path,
+        'endpoint': endpoint,
+        'status_code': rng.choice([200, 200, 200, 302, 404, 500]),
+        'duration_ms': round(rng.uniform(0.5, 900), 2),
+        'ip_address': '127.0.0.1',
+        'user_agent': 'Test User Agent',
+        # Fewer users than the top list holds, so ties never decide who is listed
+        'user': f"user{rng.randint(0, 8)}@example.com",
+        'content_length': 1024,
+        'referrer': None,
+        'args': {},
+    }
+
+
+def rescan_stats(logs):
+    """Reference: get_traffic_stats recomputed from every entry, with each average kept separate"""
+    if not logs:
+        return {'error': 'No traffic data available'}
+    total_requests = len(logs)
+    durations = [log['duration_ms'] for log in logs]
+    status_counts, method_counts, endpoint_durations, user_counts = {}, {}, {}, {}
+    for log in logs:
+        status_counts[log['status_code']] = status_counts.get(log['status_code'], 0) + 1
+        method_counts[log['method']] = method_counts.get(log['method'], 0) + 1
+        endpoint_durations.setdefault(log['endpoint'] or 'unknown', []).append(log['duration_ms'])
+        user_counts[log['user']] = user_counts.get(log['user'], 0) + 1
+    error_requests = len([log for log in logs if log['status_code'] >= 400])
+
+    top_endpoints = [
+        {'endpoint': endpoint, 'count': len(values), 'avg_duration': round(sum(values) / len(values), 2)}
+        for endpoint, values in sorted(endpoint_durations.items(), key=lambda x: len(x[1]), reverse=True)[:10]
+    ]
+    top_users = [
+        {'user': user, 'requests': count}
+        for user, count in sorted(user_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+    ]
+    return {
+        'total_requests': total_requests,
+        'error_requests': error_requests,
+        'error_rate': round(error_requests / total_requests * 100, 2),
+        'avg_duration_ms': round(sum(durations) / total_requests, 2),
+        'max_duration_ms': max(durations),
+        'min_duration_ms': min(durations),
+        'status_codes': status_counts,
+        'methods': method_counts,
+        'top_endpoints': top_endpoints,
+        'top_users': top_users
+    }
+
+
+def assert_same_stats(stats, expected):
+    """Equal up to the order of ties in the top lists and rounding of averages that end in 5"""
+    averages = {}
+    for result in (stats, expected):
+        result['top_endpoints'] = sorted(result['top_endpoints'], key=lambda x: (-x['count'], x['endpoint']))
+        result['top_users'] = sorted(result['top_users'], key=lambda x: (-x['requests'], x['user']))
+        averages.setdefault('total', []).append(result.pop('avg_duration_ms'))
+        for endpoint in result['top_endpoints']:
+            averages.setdefault(endpoint['endpoint'], []).append(endpoint.pop('avg_duration'))
+    assert stats == expected
+    for name, (value, reference) in averages.items():
+        assert abs(value - reference) <= 0.0100001, (name, value, reference)
+
+
+def test_running_stats_match_a_rescan_while_entries_are_dropped():
+    rng = random.Random(3)
+    log = TrafficLog(50)
+    window = []
+    for i in range(600):
+        entry = make_entry(i, rng)
+        removed = log.append(entry)
+        window.append(entry)
+        if len(window) > 50:
+            assert removed is window.pop(0)
+        else:
+            assert removed is None
+        if i % 7 == 0 or i > 580:
+            assert_same_stats(log.stats(), rescan_stats(window))
+
+    assert list(log) == window and len(log) == 50
+
+
+def test_min_and_max_follow_the_entries_still_in_the_log():
+    log = TrafficLog(3)
+    for duration in [5, 900, 1, 40, 30, 20]:
+        entry = make_entry(0)
+        entry['duration_ms'] = duration
+        log.append(entry)
+    stats = log.stats()
+    assert (stats['min_duration_ms'], stats['max_duration_ms']) == (20, 40)
+    assert stats['avg_duration_ms'] == 30.0
+
+
+def test_global_average_is_not_an_endpoint_average():
+    log = TrafficLog(10)
+    for endpoint, duration in [('index', 100), ('index', 100), ('login', 10)]:
+        entry = make_entry(0)
+        entry.update(endpoint=endpoint, duration_ms=duration)
+        log.append(entry)
+    stats = log.stats()
+    assert stats['avg_duration_ms'] == 70.0
+    assert [(e['endpoint'], e['avg_duration']) for e in stats['top_endpoints']] == [('index', 100.0), ('login', 10.0)]
+
+
+def test_dropped_keys_disappear_and_clear_resets():
+    log = TrafficLog(2)
+    first = make_entry(0)
+    first.update(status_code=418, method='DELETE', endpoint=None)
+    log.append(first)
+    log.extend([make_entry(1), make_entry(2)])
+    stats = log.stats()
+    assert 418 not in stats['status_codes'] and 'DELETE' not in stats['methods']
+    assert sum(stats['status_codes'].values()) == 2
+
+    log.clear()
+    assert log.stats() == {'error': 'No traffic data available'} and len(log) == 0
+    log.append(make_entry(3))
+    assert log.stats()['total_requests'] == 1
+
+
+def benchmark_stats_polls(polls=200, sizes=(1000, 100000)):
+    """Compare rescanning the log per admin poll with reading the running aggregates"""
+    for size in sizes:
+        rng = random.Random(1)
+        entries = [make_entry(i, rng) for i in range(size)]
+        log = TrafficLog(size, entries)
+
+        started = time.perf_counter()
+        for _ in range(max(1, polls * 1000 // size)):
+            rescan_stats(entries)
+        rescan = (time.perf_counter() - started) / max(1, polls * 1000 // size)
+
+        started = time.perf_counter()
+        for _ in range(polls):
+            log.stats()
+        running = (time.perf_counter() - started) / polls
+
+        print(f"Traffic stats over {size} entries:")
+        print(f"  rescan per poll:          {rescan * 1000:9.3f} ms")
+        print(f"  running aggregates:       {running * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    test_running_stats_match_a_rescan_while_entries_are_dropped()
+    test_min_and_max_follow_the_entries_still_in_the_log()
+    test_global_average_is_not_an_endpoint_average()
+    test_dropped_keys_disappear_and_clear_resets()
+    print("Traffic stats tests passed")
+    benchmark_stats_polls()
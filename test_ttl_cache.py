@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Test the bounded TTL caches behind the stats pages
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from game_stats import PeriodAggregator, summarize_day
+from ttl_cache import TTLCache, CacheRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_together(count, call):
+    """Run call from count threads released at the same moment; returns results and exceptions"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = call()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_entries_expire_and_stay_readable_while_stale():
+    clock = FakeClock()
+    cache = TTLCache('stats', ttl=300, max_stale=3600, clock=clock)
+    cache.set('stats', {'online_users': 5})
+
+    clock.now += 299
+    assert cache.get('stats') == {'online_users': 5}
+    clock.now += 2
+    assert cache.get('stats') is None
+    assert cache.peek('stats') == ({'online_users': 5}, 301)
+
+    clock.now += 3600
+    assert cache.peek('stats') == (None, None)
+    metrics = cache.metrics()
+    assert (metrics['hits'], metrics['stale_hits'], metrics['expirations'], metrics['entries']) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache('daily', max_entries=3, ttl=60)
+    for day in ['01', '02', '03']:
+        cache.set(day, day)
+    cache.get('01')
+    cache.set('04', '04')
+
+    assert cache.get('02') is None
+    assert [cache.get(day) for day in ['01', '03', '04']] == ['01', '03', '04']
+    assert cache.metrics()['evictions'] == 1
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache('daily', ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return 'day'
+
+    results = run_together(20, lambda: cache.get_or_load('2024-06-02', loader))
+    assert results == ['day'] * 20 and len(loads) == 1
+    assert cache.metrics()['coalesced'] == 19
+
+    # Fresh values are served without loading; force reloads
+    assert cache.get_or_load('2024-06-02', loader) == 'day' and len(loads) == 1
+    cache.get_or_load('2024-06-02', loader, force=True)
+    assert len(loads) == 2
+
+
+def test_load_errors_reach_every_waiter_and_keep_the_old_value():
+    clock = FakeClock()
+    cache = TTLCache('period', ttl=10, max_stale=100, clock=clock)
+    cache.set('week', 'old')
+    clock.now += 11
+
+    def failing():
+        time.sleep(0.05)
+        raise RuntimeError('upstream down')
+
+    results = run_together(5, lambda: cache.get_or_load('week', failing))
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.metrics()['load_errors'] == 1
+    assert cache.peek('week') == ('old', 11)
+
+
+def test_background_loads_are_not_duplicated():
+    cache = TTLCache('stats', ttl=60)
+    release = threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        release.wait(2)
+        return {'online_users': 1}
+
+    assert cache.load_async('stats', loader)
+    time.sleep(0.05)
+    assert not cache.load_async('stats', loader)
+    release.set()
+    for _ in range(100):
+        if cache.get('stats'):
+            break
+        time.sleep(0.01)
+    assert cache.get('stats') == {'online_users': 1} and len(loads) == 1
+
+
+def test_registry_reports_every_namespace():
+    caches = CacheRegistry()
+    caches.create('stats', max_entries=1)
+    caches.create('daily', max_entries=10)
+    assert sorted(caches.metrics()) == ['daily', 'stats']
+    try:
+        caches.create('stats')
+        assert False, "namespaces must be unique"
+    except ValueError:
+        pass
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class HomepageStats:
+    """Run the app's stats cache on a fake clock with a stub upstream loader that waits to be released"""
+
+    def __init__(self, swa_app, clock):
+        self.app = swa_app
+        self.clock = clock
+        self.release = threading.Event()
+        self.loads = []
+        self.fail = False
+
+    def load_stats(self):
+        self.loads.append(1)
+        self.release.wait(2)
+        if self.fail:
+            raise RuntimeError('upstream down')
+        return {'online_users': 99, 'daily_users': 990, 'total_users': 9900}
+
+    def __enter__(self):
+        swa_app = self.app
+        self.saved = (swa_app.stats_cache.clock, swa_app.load_stats)
+        swa_app.stats_cache.clock = self.clock
+        swa_app.load_stats = self.load_stats
+        swa_app.stats_cache.clear()
+        return self
+
+    def __exit__(self, *exc):
+        self.release.set()
+        wait_until(lambda: self.app.stats_cache.metrics()['loading'] == 0)
+        self.app.stats_cache.clock, self.app.load_stats = self.saved
+        self.app.stats_cache.clear()
+
+    def settled(self):
+        """The background load started by the last get_stats call has finished"""
+        wait_until(lambda: self.loads and self.app.stats_cache.metrics()['loading'] == 0)
+
+
+def test_expired_stats_are_served_at_once_while_they_refresh():
+    import app as swa_app
+    clock = FakeClock()
+    old = {'online_users': 1, 'daily_users': 10, 'total_users': 100}
+    with HomepageStats(swa_app, clock) as stub:
+        swa_app.stats_cache.set('stats', old)
+        assert swa_app.get_stats() == old and not stub.loads
+
+        clock.now += swa_app.CACHE_LIFETIME['stats'] + 1
+        started = time.perf_counter()
+        assert swa_app.get_stats() == old
+        assert time.perf_counter() - started < 0.5
+        wait_until(lambda: stub.loads)
+        # Still loading: later requests get the stale value without a second load
+        assert swa_app.get_stats() == old and len(stub.loads) == 1
+
+        stub.release.set()
+        stub.settled()
+        assert swa_app.get_stats()['online_users'] == 99 and len(stub.loads) == 1
+
+
+def test_stats_past_max_stale_are_not_served():
+    import app as swa_app
+    clock = FakeClock()
+    with HomepageStats(swa_app, clock) as stub:
+        swa_app.stats_cache.set('stats', {'online_users': 1, 'daily_users': 10, 'total_users': 100})
+        clock.now += swa_app.STATS_MAX_STALE + 1
+
+        # Too old to show: the homepage gets the defaults, still without waiting, and a reload starts
+        started = time.perf_counter()
+        assert swa_app.get_stats() == swa_app.DEFAULT_STATS
+        assert time.perf_counter() - started < 0.5
+        stub.release.set()
+        stub.settled()
+        assert swa_app.get_stats()['online_users'] == 99
+
+
+def test_failed_stats_refresh_keeps_the_stale_value():
+    import app as swa_app
+    clock = FakeClock()
+    old = {'online_users': 1, 'daily_users': 10, 'total_users': 100}
+    with HomepageStats(swa_app, clock) as stub:
+        swa_app.stats_cache.set('stats', old)
+        clock.now += swa_app.CACHE_LIFETIME['stats'] + 1
+        stub.fail = True
+        stub.release.set()
+
+        assert swa_app.get_stats() == old
+        stub.settled()
+        assert swa_app.stats_cache.metrics()['load_errors'] == 1
+        assert swa_app.get_stats() == old
+
+
+class GameStatsCaches:
+    """Run the app's daily and period caches on a fake clock with a stub day loader"""
+
+    def __init__(self, swa_app, clock):
+        self.app = swa_app
+        self.clock = clock
+        self.games_added = {}
+        self.fail = False
+
+    def load_game_day(self, date_str):
+        if self.fail:
+            raise RuntimeError('upstream down')
+        data = {'date': date_str, 'games_added': self.games_added.get(date_str, 1), 'details': []}
+        return data, summarize_day(data, date_str)
+
+    def __enter__(self):
+        swa_app = self.app
+        self.saved = (swa_app.daily_cache.clock, swa_app.period_cache.clock, swa_app.load_game_day,
+                      swa_app.period_aggregator)
+        swa_app.daily_cache.clock = swa_app.period_cache.clock = self.clock
+        swa_app.load_game_day = self.load_game_day
+        swa_app.period_aggregator = PeriodAggregator(windows=swa_app.PERIOD_WINDOWS)
+        swa_app.daily_cache.clear()
+        swa_app.period_cache.clear()
+        return self
+
+    def __exit__(self, *exc):
+        swa_app = self.app
+        (swa_app.daily_cache.clock, swa_app.period_cache.clock, swa_app.load_game_day,
+         swa_app.period_aggregator) = self.saved
+        swa_app.daily_cache.clear()
+        swa_app.period_cache.clear()
+
+
+def test_expired_game_stats_are_served_when_a_reload_fails():
+    import app as swa_app
+    clock = FakeClock()
+    with GameStatsCaches(swa_app, clock) as stub:
+        stub.games_added['2024-06-02'] = 7
+        day = swa_app._game_day('2024-06-02')
+        week = swa_app.get_game_added_stats_period(7)
+        assert day[0]['games_added'] == 7 and week['days']
+
+        clock.now += swa_app.CACHE_LIFETIME['period'] + 1
+        stub.fail = True
+        original_compute = swa_app.compute_period_stats
+
+        def failing_compute(*args):
+            raise RuntimeError('aggregation failed')
+
+        swa_app.compute_period_stats = failing_compute
+        try:
+            assert swa_app._game_day('2024-06-02') == day
+            assert swa_app.get_game_added_stats_period(7) == week
+        finally:
+            swa_app.compute_period_stats = original_compute
+        assert swa_app.daily_cache.metrics()['load_errors'] >= 1
+
+
+def test_period_stats_follow_a_refresh_of_today():
+    import app as swa_app
+    clock = FakeClock()
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    with GameStatsCaches(swa_app, clock) as stub:
+        stub.games_added[today_str] = 5
+        assert swa_app.get_game_added_stats_period(7)['values'][-1] == 5
+
+        # The daily cache reloads today long before the period entry expires
+        stub.games_added[today_str] = 50
+        clock.now += swa_app.CACHE_LIFETIME['daily'] + 1
+        assert clock.now - 1000 < swa_app.CACHE_LIFETIME['period']
+        assert swa_app.get_game_added_stats_period(7)['values'][-1] == 50
+        assert swa_app.get_game_added_stats_period(30)['values'][-1] == 50
+
+
+def benchmark_cold_requests(clients=50, load_seconds=0.05):
+    """Compare every cold request loading a day with one shared load"""
+    lock = threading.Lock()
+
+    def timed(use_cache):
+        cache = TTLCache('daily', ttl=60)
+        loads = []
+
+        def loader():
+            with lock:
+                loads.append(1)
+            time.sleep(load_seconds)
+            return 'day'
+
+        call = (lambda: cache.get_or_load('2024-06-02', loader)) if use_cache else loader
+        started = time.perf_counter()
+        run_together(clients, call)
+        return time.perf_counter() - started, len(loads)
+
+    legacy, legacy_loads = timed(False)
+    shared, shared_loads = timed(True)
+    print(f"{clients} concurrent requests for an uncached day ({load_seconds * 1000:.0f} ms load):")
+    print(f"  load per request:  {legacy_loads:3d} loads in {legacy * 1000:7.1f} ms")
+    print(f"  single-flight:     {shared_loads:3d} loads in {shared * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    test_entries_expire_and_stay_readable_while_stale()
+    test_least_recently_used_entries_are_evicted()
+    test_concurrent_misses_share_one_load()
+    test_load_errors_reach_every_waiter_and_keep_the_old_value()
+    test_background_loads_are_not_duplicated()
+    test_registry_reports_every_namespace()
+    test_expired_stats_are_served_at_once_while_they_refresh()
+    test_stats_past_max_stale_are_not_served()
+    test_failed_stats_refresh_keeps_the_stale_value()
+    test_expired_game_stats_are_served_when_a_reload_fails()
+    test_period_stats_follow_a_refresh_of_today()
+    print("TTL cache tests passed")
+    benchmark_cold_requests()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Test conditional upstream fetching against a local HTTP stub
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+
+from upstream_client import UpstreamClient
+
+ETAG = '"catalog-v1"'
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+PAYLOAD = {"10": {"name": "Counter-Strike", "access": "1"}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves one JSON document and honours If-None-Match"""
+
+    requests_seen = []
+
+    def do_GET(self):
+        StubHandler.requests_seen.append(dict(self.headers))
+
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = json.dumps(PAYLOAD).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    server = HTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/catalog"
+
+
+def test_conditional_fetch_uses_304():
+    StubHandler.requests_seen = []
+    server, url = start_stub()
+    try:
+        client = UpstreamClient(timeout=(1, 2))
+
+        first = client.fetch_json(url)
+        assert first.ok and first.status_code == 200
+        assert not first.not_modified
+        assert first.data == PAYLOAD
+        assert 'If-None-Match' not in StubHandler.requests_seen[0]
+
+        second = client.fetch_json(url)
+        assert second.ok and second.status_code == 304
+        assert second.not_modified
+        assert second.data == PAYLOAD
+        assert StubHandler.requests_seen[1]['If-None-Match'] == ETAG
+        assert StubHandler.requests_seen[1]['If-Modified-Since'] == LAST_MODIFIED
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Answers after a delay; /flaky fails once with 503 before succeeding"""
+
+    delay = 0.3
+    flaky_calls = 0
+
+    def do_GET(self):
+        if self.path == '/flaky':
+            SlowHandler.flaky_calls += 1
+            if SlowHandler.flaky_calls == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+        time.sleep(SlowHandler.delay)
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_fetch_many_runs_concurrently_and_retries():
+    SlowHandler.flaky_calls = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        client = UpstreamClient()
+        urls = [f"{base}/online", f"{base}/users", f"{base}/catalog"]
+
+        started = time.perf_counter()
+        results = client.fetch_many(urls, deadline=2, retries=0)
+        elapsed = time.perf_counter() - started
+
+        assert all(results[url].ok for url in urls)
+        assert results[urls[2]].data == {'path': '/catalog'}
+        # Roughly the slowest single call, not the sum of all three
+        assert elapsed < SlowHandler.delay * 2.5
+
+        flaky = client.fetch_many([f"{base}/flaky"], deadline=2, retries=2, backoff=0.01)
+        assert flaky[f"{base}/flaky"].ok
+        assert client.get_metrics()[f"{base}/flaky"]['failures'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class TrickleHandler(BaseHTTPRequestHandler):
+    """Sends its body one byte at a time, each within any read timeout"""
+
+    def do_GET(self):
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            for byte in body:
+                self.wfile.write(bytes([byte]))
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_fetch_many_enforces_deadline():
+    SlowHandler.delay = 1.0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/slow"
+    try:
+        started = time.perf_counter()
+        results = UpstreamClient().fetch_many([url], deadline=0.2, retries=0)
+        # fetch_many itself returns, not just the awaiting coroutine
+        assert time.perf_counter() - started < 0.8
+        assert not results[url].ok
+        assert results[url].error
+    finally:
+        SlowHandler.delay = 0.3
+        server.shutdown()
+        server.server_close()
+
+
+def test_deadline_covers_a_trickling_body():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TrickleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/trickle"
+    try:
+        started = time.perf_counter()
+        results = UpstreamClient().fetch_many([url], deadline=0.3, retries=0)
+        assert time.perf_counter() - started < 0.8
+        assert not results[url].ok and 'Deadline' in results[url].error
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_unreachable_upstream_reports_error():
+    client = UpstreamClient(timeout=(0.5, 0.5))
+    response = client.fetch_json('http://127.0.0.1:9/unreachable')
+    assert not response.ok
+    assert response.error
+
+
+if __name__ == "__main__":
+    test_conditional_fetch_uses_304()
+    test_fetch_many_runs_concurrently_and_retries()
+    test_fetch_many_enforces_deadline()
+    test_deadline_covers_a_trickling_body()
+    test_unreachable_upstream_reports_error()
+    print("Upstream client tests passed")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test the user store aggregates behind the admin pages
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from user_index import UserIndex
+
+NOW = datetime(2024, 6, 2, 15, 30, 0)
+
+
+def make_users(count, seed=7):
+    """Users with a mix of statuses, join dates and recent and old game sessions"""
+    rng = random.Random(seed)
+    users = []
+    for i in range(count):
+        sessions = []
+        for _ in range(rng.randint(0, 6)):
+            played_at = NOW - timedelta(minutes=rng.randint(0, 4 * 24 * 60))
+            sessions.append({'game_id': str(rng.randint(1, 50)), 'timestamp': played_at.strftime('%Y-%m-%d %H:%M:%S')})
+        sessions.sort(key=lambda session: session['timestamp'])
+        users.append({
+            'id': f"user-{i}",
+            'username': f"{rng.choice(['alex', 'maria', 'gamer', 'Pro_'])}{i}",
+            'email': f"{rng.choice(['mail', 'box', 'gamer'])}{i}@{rng.choice(['example.com', 'test.org'])}",
+            'status': rng.choice(['Standard', 'Premium', 'Premium (Aligned)', 'Admin']),
+            'launcher_connected': rng.random() < 0.2,
+            'join_date': (NOW - timedelta(days=rng.randint(0, 5))).strftime('%Y-%m-%d'),
+            'game_sessions': sessions,
+        })
+    return users
+
+
+def legacy_dashboard(users, now):
+    """Reference: the full scan admin_dashboard used to do per page load"""
+    yesterday = now - timedelta(days=1)
+    daily_users = 0
+    for user in users:
+        for session in user.get("game_sessions", []):
+            if datetime.strptime(session["timestamp"], '%Y-%m-%d %H:%M:%S') >= yesterday:
+                daily_users += 1
+                break
+    return {
+        'total_users': len(users),
+        'premium_users': sum(1 for user in users if user.get("status") in ("Premium", "Premium (Aligned)")),
+        'online_users': sum(1 for user in users if user.get("launcher_connected", False)),
+        'game_sessions': sum(len(user.get("game_sessions", [])) for user in users),
+        'daily_users': daily_users,
+        'new_users': sum(1 for user in users if datetime.strptime(user.get("join_date", "2000-01-01"), '%Y-%m-%d') >= yesterday),
+    }
+
+
+def make_index(tmp, users):
+    path = os.path.join(tmp, 'users.json')
+    with open(path, 'w') as f:
+        json.dump(users, f)
+    index = UserIndex(path, lambda: json.load(open(path)))
+    index.sync(users, now=NOW)
+    return index
+
+
+def test_dashboard_matches_full_scan():
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(500)
+        index = make_index(tmp, users)
+        assert index.dashboard_stats(NOW) == legacy_dashboard(users, NOW)
+
+
+def test_appended_sessions_and_deleted_users_are_tracked():
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(50)
+        index = make_index(tmp, users)
+
+        # A new session for an inactive user and a deleted active user
+        inactive = next(user for user in users if not user['game_sessions'])
+        inactive['game_sessions'].append({'game_id': '1', 'timestamp': (NOW - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')})
+        del users[[i for i, user in enumerate(users) if user['game_sessions'] and user is not inactive][0]]
+
+        index.sync(users, now=NOW)
+        assert index.dashboard_stats(NOW) == legacy_dashboard(users, NOW)
+
+        # Clearing a user's sessions re-indexes that user
+        users[0]['game_sessions'] = []
+        index.sync(users, now=NOW)
+        assert index.dashboard_stats(NOW) == legacy_dashboard(users, NOW)
+
+
+def legacy_user_filter(users, status, q):
+    """Reference: the list comprehensions api_admin_users used to run"""
+    if status and status != 'all':
+        users = [u for u in users if u.get('status', '').lower() == status.lower()]
+    if q:
+        users = [u for u in users if q in u.get('username', '').lower() or q in u.get('email', '').lower()]
+    return [u['id'] for u in users]
+
+
+def test_user_queries_match_list_filtering():
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(800)
+        index = make_index(tmp, users)
+
+        for status in [None, 'all', 'premium', 'Standard', 'missing']:
+            for q in ['', 'a', 'ga', 'gamer', 'gamer1', '@test.org', 'xyz', 'o_1']:
+                expected = legacy_user_filter(users, status, q)
+                result = index.query_users(status=status, q=q, page=2, per_page=7)
+                assert result['total'] == len(expected), (status, q)
+                assert [row['id'] for row in result['users']] == expected[7:14], (status, q)
+
+
+def test_cursor_pagination_walks_every_match_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(300)
+        index = make_index(tmp, users)
+        expected = legacy_user_filter(users, 'premium', 'a')
+
+        seen, cursor = [], None
+        while True:
+            result = index.query_users(status='premium', q='a', per_page=25, cursor=cursor)
+            seen.extend(row['id'] for row in result['users'])
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
+        assert seen == expected
+
+        try:
+            index.query_users(cursor='no-such-user')
+            assert False, "unknown cursors must be rejected"
+        except ValueError:
+            pass
+
+
+def benchmark_dashboard(user_count=5000):
+    """Compare the full scan per page load with reading the maintained counters"""
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(user_count)
+        index = make_index(tmp, users)
+
+        started = time.perf_counter()
+        legacy_dashboard(users, NOW)
+        legacy = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.sync(users, now=NOW)
+        resync = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.dashboard_stats(NOW)
+        snapshot = time.perf_counter() - started
+
+        print(f"Admin dashboard over {user_count} users:")
+        print(f"  full scan per page load:   {legacy * 1000:8.2f} ms")
+        print(f"  index refresh on save:     {resync * 1000:8.2f} ms")
+        print(f"  dashboard from counters:   {snapshot * 1000:8.2f} ms")
+
+
+def benchmark_user_search(user_count=20000, rounds=20):
+    """Compare list-comprehension filtering with the status and trigram indexes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        users = make_users(user_count)
+        index = make_index(tmp, users)
+        index.query_users(q='gamer')  # build the trigram index
+
+        queries = [('premium', ''), (None, 'gamer12'), ('standard', 'maria1'), (None, 'example')]
+        for status, q in queries:
+            started = time.perf_counter()
+            for _ in range(rounds):
+                legacy_user_filter(users, status, q)
+            legacy = (time.perf_counter() - started) / rounds
+
+            started = time.perf_counter()
+            for _ in range(rounds):
+                index.query_users(status=status, q=q, per_page=20)
+            indexed = (time.perf_counter() - started) / rounds
+            print(f"  status={status!s:9} q={q!r:10} list filter {legacy * 1000:7.2f} ms  index {indexed * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    test_dashboard_matches_full_scan()
+    test_appended_sessions_and_deleted_users_are_tracked()
+    test_user_queries_match_list_filtering()
+    test_cursor_pagination_walks_every_match_once()
+    print("User index tests passed")
+    benchmark_dashboard()
+    print("Admin user search over 20000 users (excluding the JSON load):")
+    benchmark_user_search()
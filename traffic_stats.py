@@ -0,0 +1,178 @@
+"""
+Traffic Stats Module
+Ring buffer of web traffic entries that keeps its statistics up to date as
+entries are added and dropped, so stats calls do not rescan the log
+"""
+
+import threading
+from collections import Counter, deque
+from typing import Dict, Any, Optional, Iterable, Iterator
+
+# Entries in the top endpoints and top users lists
+TOP_COUNT = 10
+
+# Status codes from this one up count as errors
+ERROR_STATUS = 400
+
+
+def _hundredths(duration_ms) -> int:
+    """Duration as an integer number of 0.01 ms, so running sums do not drift"""
+    return int(round(duration_ms * 100))
+
+
+def _decrement(counter: Counter, key):
+    if counter[key] <= 1:
+        del counter[key]
+    else:
+        counter[key] -= 1
+
+
+class TrafficLog:
+    """
+    Fixed-capacity log of traffic entries with running aggregates
+
+    Appending to a full log drops the oldest entry. Every append and drop
+    updates the counters per status code, method, endpoint and user, the
+    per-endpoint and total duration sums, and two monotonic queues whose
+    fronts are the slowest and fastest durations still in the log. stats()
+    reads those instead of the entries; only picking the top endpoints and
+    users depends on how many distinct ones there are, not on the log size.
+    """
+
+    def __init__(self, maxlen: int, entries: Iterable[Dict[str, Any]] = ()):
+        if maxlen < 1:
+            raise ValueError('Log capacity must be at least 1')
+        self._entries = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._clear_aggregates()
+        self.extend(entries)
+
+    def _clear_aggregates(self):
+        self._appended = 0  # sequence number of the next entry
+        self.status_counts: Counter = Counter()
+        self.method_counts: Counter = Counter()
+        self.endpoint_counts: Counter = Counter()
+        self.endpoint_durations: Counter = Counter()  # endpoint -> sum in 0.01 ms
+        self.user_counts: Counter = Counter()
+        self.error_requests = 0
+        self.total_duration = 0  # 0.01 ms
+        self._slowest = deque()  # (sequence, duration_ms), durations decreasing
+        self._fastest = deque()  # (sequence, duration_ms), durations increasing
+
+    @property
+    def maxlen(self) -> int:
+        return self._entries.maxlen
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._entries)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self._entries[index]
+
+    def append(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Add an entry; returns the entry dropped to make room, if any"""
+        with self._lock:
+            return self._append(entry)
+
+    def extend(self, entries: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for entry in entries:
+                self._append(entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._clear_aggregates()
+
+    def _append(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        entries = self._entries
+        removed = None
+        if len(entries) == entries.maxlen:
+            removed = entries[0]
+            self._forget(removed, self._appended - len(entries))
+        entries.append(entry)
+
+        sequence = self._appended
+        self._appended += 1
+        status = entry['status_code']
+        endpoint = entry['endpoint'] or 'unknown'
+        duration = entry['duration_ms']
+        hundredths = _hundredths(duration)
+
+        self.status_counts[status] += 1
+        self.method_counts[entry['method']] += 1
+        self.endpoint_counts[endpoint] += 1
+        self.endpoint_durations[endpoint] += hundredths
+        self.user_counts[entry['user']] += 1
+        self.total_duration += hundredths
+        if status >= ERROR_STATUS:
+            self.error_requests += 1
+
+        slowest, fastest = self._slowest, self._fastest
+        while slowest and slowest[-1][1] <= duration:
+            slowest.pop()
+        slowest.append((sequence, duration))
+        while fastest and fastest[-1][1] >= duration:
+            fastest.pop()
+        fastest.append((sequence, duration))
+        return removed
+
+    def _forget(self, entry: Dict[str, Any], sequence: int):
+        """Take a dropped entry out of the aggregates"""
+        status = entry['status_code']
+        endpoint = entry['endpoint'] or 'unknown'
+        hundredths = _hundredths(entry['duration_ms'])
+
+        _decrement(self.status_counts, status)
+        _decrement(self.method_counts, entry['method'])
+        _decrement(self.endpoint_counts, endpoint)
+        if endpoint in self.endpoint_counts:
+            self.endpoint_durations[endpoint] -= hundredths
+        else:
+            del self.endpoint_durations[endpoint]
+        _decrement(self.user_counts, entry['user'])
+        self.total_duration -= hundredths
+        if status >= ERROR_STATUS:
+            self.error_requests -= 1
+
+        # The oldest entry can only be at the front of either queue
+        if self._slowest[0][0] == sequence:
+            self._slowest.popleft()
+        if self._fastest[0][0] == sequence:
+            self._fastest.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        """Traffic statistics in the shape of PermGuardAuth.get_traffic_stats"""
+        with self._lock:
+            total_requests = len(self._entries)
+            if not total_requests:
+                return {'error': 'No traffic data available'}
+
+            top_endpoints = [
+                {
+                    'endpoint': endpoint,
+                    'count': count,
+                    'avg_duration': round(self.endpoint_durations[endpoint] / count / 100, 2)
+                }
+                for endpoint, count in self.endpoint_counts.most_common(TOP_COUNT)
+            ]
+            top_users = [
+                {'user': user, 'requests': count}
+                for user, count in self.user_counts.most_common(TOP_COUNT)
+            ]
+
+            return {
+                'total_requests': total_requests,
+                'error_requests': self.error_requests,
+                'error_rate': round(self.error_requests / total_requests * 100, 2),
+                'avg_duration_ms': round(self.total_duration / total_requests / 100, 2),
+                'max_duration_ms': self._slowest[0][1],
+                'min_duration_ms': self._fastest[0][1],
+                'status_codes': dict(self.status_counts),
+                'methods': dict(self.method_counts),
+                'top_endpoints': top_endpoints,
+                'top_users': top_users
+            }
@@ -0,0 +1,210 @@
+"""
+TTL Cache Module
+Size-bounded caches with expiry, single-flight loading and per-namespace
+metrics for the stats data served by the app
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Optional, Callable, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Defaults for a new cache namespace
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_TTL = 300.0  # seconds
+
+# Counters reported by every cache, even before they are first incremented
+METRIC_NAMES = ('hits', 'misses', 'stale_hits', 'loads', 'load_errors', 'coalesced', 'evictions', 'expirations')
+
+
+class _Flight:
+    """A load in progress; callers for the same key wait on it"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Mapping with an entry limit and expiring entries
+
+    Entries are fresh for ttl seconds. Expired entries can still be read
+    with peek() until they are max_stale seconds old (stale-while-
+    revalidate), after which they are dropped. At most max_entries are
+    kept; the least recently used one is evicted first.
+
+    get_or_load runs at most one loader per key at a time: callers that
+    arrive while a key is loading wait for that load and share its value
+    or its exception instead of starting their own.
+    """
+
+    def __init__(self, name: str, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 max_stale: Optional[float] = None, clock: Callable[[], float] = time.time):
+        if max_entries < 1:
+            raise ValueError('A cache needs room for at least one entry')
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_stale = ttl if max_stale is None else max(max_stale, ttl)
+        self.clock = clock
+        self.counters: Counter = Counter()
+        self._entries: OrderedDict = OrderedDict()  # key -> (value, stored_at)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable) -> Tuple[Optional[tuple], float]:
+        """(entry, age) with entries past max_stale dropped; call with the lock held"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, 0.0
+        age = self.clock() - entry[1]
+        if age > self.max_stale:
+            del self._entries[key]
+            self.counters['expirations'] += 1
+            return None, 0.0
+        return entry, age
+
+    def get(self, key: Hashable, default=None):
+        """Fresh value of a key, or default"""
+        with self._lock:
+            entry, age = self._lookup(key)
+            if entry is None or age > self.ttl:
+                self.counters['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry[0]
+
+    def peek(self, key: Hashable) -> Tuple[Any, Optional[float]]:
+        """(value, age in seconds) of a key even if it expired, while it is within max_stale; (None, None) otherwise"""
+        with self._lock:
+            entry, age = self._lookup(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None, None
+            self._entries.move_to_end(key)
+            self.counters['hits' if age <= self.ttl else 'stale_hits'] += 1
+            return entry[0], age
+
+    def updated_at(self, key: Hashable) -> Optional[float]:
+        """Clock time a key was last stored, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value):
+        self._entries[key] = (value, self.clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], force: bool = False):
+        """
+        Fresh value of a key, loading it with loader() if needed
+
+        force skips the fresh value (but still joins a load in progress).
+        The loader's exception reaches every waiting caller and nothing is
+        stored, so an older value stays available to peek().
+        """
+        with self._lock:
+            if not force:
+                entry, age = self._lookup(key)
+                if entry is not None and age <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return entry[0]
+                self.counters['misses'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.counters['load_errors'] += 1
+            raise
+        else:
+            with self._lock:
+                self.counters['loads'] += 1
+                self._store(key, flight.value)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def load_async(self, key: Hashable, loader: Callable[[], Any]) -> bool:
+        """Reload a key in a daemon thread unless it is already loading; returns whether a thread was started"""
+        with self._lock:
+            if key in self._flights:
+                return False
+
+        def worker():
+            try:
+                self.get_or_load(key, loader, force=True)
+            except Exception as e:
+                logger.warning(f"Background load of {self.name}:{key} failed: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = {name: self.counters.get(name, 0) for name in METRIC_NAMES}
+            lookups = metrics['hits'] + metrics['stale_hits'] + metrics['misses']
+            metrics.update({
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'max_stale_seconds': self.max_stale,
+                'loading': len(self._flights),
+                'hit_ratio': round((metrics['hits'] + metrics['stale_hits']) / lookups, 3) if lookups else None
+            })
+            return metrics
+
+
+class CacheRegistry:
+    """Named caches of one process, for reporting their metrics together"""
+
+    def __init__(self):
+        self.caches: Dict[str, TTLCache] = {}
+
+    def create(self, name: str, **options) -> TTLCache:
+        if name in self.caches:
+            raise ValueError(f'Cache {name!r} already exists')
+        cache = self.caches[name] = TTLCache(name, **options)
+        return cache
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: cache.metrics() for name, cache in self.caches.items()}
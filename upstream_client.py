@@ -0,0 +1,283 @@
+"""
+Upstream HTTP Client Module
+Shared connection-pooled client for the swa-recloud upstream APIs with
+conditional request (ETag / Last-Modified) support
+"""
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple, Iterable
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as RawReadError
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds for every upstream call
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Defaults for parallel fetches
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DEADLINE = 12.0  # seconds per call, including the read
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5  # base delay in seconds, doubled per attempt and jittered
+
+# Bytes read at a time from a response whose total time is bounded
+DEADLINE_CHUNK_SIZE = 16 * 1024
+
+
+class UpstreamResponse:
+    """Result of an upstream fetch"""
+
+    __slots__ = ('url', 'status_code', 'data', 'not_modified', 'ok', 'error', 'latency_ms')
+
+    def __init__(self, url, status_code=0, data=None, not_modified=False, ok=False, error=None, latency_ms=0.0):
+        self.url = url
+        self.status_code = status_code
+        self.data = data
+        self.not_modified = not_modified
+        self.ok = ok
+        self.error = error
+        self.latency_ms = latency_ms
+
+    def __repr__(self):
+        return (f"UpstreamResponse(url={self.url!r}, status_code={self.status_code}, "
+                f"ok={self.ok}, not_modified={self.not_modified})")
+
+
+class UpstreamClient:
+    """Pooled HTTP client that remembers validators per URL"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_connections=4, pool_maxsize=16):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Connection': 'keep-alive',
+        })
+
+        # Pooled keep-alive connections; retries are handled by callers
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Validators and last parsed payload per URL {url: {'etag', 'last_modified', 'data'}}
+        self.validators: Dict[str, Dict[str, Any]] = {}
+
+        # Latency and failure counters per URL
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, url: str, result: 'UpstreamResponse'):
+        """Update per-URL latency and failure counters"""
+        with self._lock:
+            entry = self.metrics.get(url)
+            if entry is None:
+                entry = self.metrics[url] = {
+                    'requests': 0,
+                    'failures': 0,
+                    'not_modified': 0,
+                    'total_latency_ms': 0.0,
+                    'max_latency_ms': 0.0,
+                    'last_latency_ms': 0.0,
+                    'last_status': None,
+                    'last_error': None,
+                    'last_success': None,
+                    'last_failure': None,
+                }
+
+            now = time.time()
+            entry['requests'] += 1
+            entry['total_latency_ms'] += result.latency_ms
+            entry['last_latency_ms'] = round(result.latency_ms, 2)
+            entry['max_latency_ms'] = max(entry['max_latency_ms'], round(result.latency_ms, 2))
+            entry['last_status'] = result.status_code
+
+            if result.ok:
+                entry['last_success'] = now
+                if result.not_modified:
+                    entry['not_modified'] += 1
+            else:
+                entry['failures'] += 1
+                entry['last_error'] = result.error
+                entry['last_failure'] = now
+
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers for a URL"""
+        headers = {}
+        with self._lock:
+            entry = self.validators.get(url)
+        if not entry or entry.get('data') is None:
+            return headers
+
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def fetch_json(self, url: str, timeout: Optional[Tuple[float, float]] = None, conditional: bool = True) -> UpstreamResponse:
+        """
+        Fetch a JSON document from upstream
+
+        On 304 Not Modified the body is not parsed; the previously parsed
+        payload is returned with not_modified=True.
+        """
+        result = self._fetch_json(url, timeout, conditional)
+        self._record(url, result)
+        return result
+
+    def _fetch_json(self, url: str, timeout: Optional[Tuple[float, float]], conditional: bool,
+                    deadline: Optional[float] = None) -> UpstreamResponse:
+        """
+        Perform a single upstream GET without touching the metrics
+
+        The requests timeout only bounds each socket read, so with a deadline
+        the body is streamed in chunks and the call gives up once the total
+        time passes it, even if the upstream keeps trickling bytes.
+        """
+        headers = self._conditional_headers(url) if conditional else {}
+        start = time.perf_counter()
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=timeout or self.timeout,
+                                        stream=deadline is not None)
+            body = None
+            if deadline is not None:
+                with response:
+                    # read1 returns what has arrived instead of waiting for a full chunk
+                    # (urllib3 2); older urllib3 falls back to short blocking reads
+                    raw = response.raw
+                    read = getattr(raw, 'read1', None) or raw.read
+                    chunks = []
+                    while True:
+                        if time.perf_counter() - start > deadline:
+                            raise requests.Timeout(f"Deadline of {deadline}s exceeded")
+                        chunk = read(DEADLINE_CHUNK_SIZE, decode_content=True)
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                    body = b''.join(chunks)
+                if time.perf_counter() - start > deadline:
+                    raise requests.Timeout(f"Deadline of {deadline}s exceeded")
+        except (requests.RequestException, RawReadError) as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            logger.warning(f"Upstream request failed for {url}: {e}")
+            return UpstreamResponse(url, error=str(e), latency_ms=latency_ms)
+
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        if response.status_code == 304:
+            with self._lock:
+                cached = self.validators.get(url, {}).get('data')
+            return UpstreamResponse(url, 304, cached, not_modified=True, ok=True, latency_ms=latency_ms)
+
+        if response.status_code != 200:
+            return UpstreamResponse(url, response.status_code, error=f"HTTP {response.status_code}", latency_ms=latency_ms)
+
+        try:
+            data = response.json() if body is None else json.loads(body)
+        except ValueError as e:
+            return UpstreamResponse(url, response.status_code, error=f"Invalid JSON: {e}", latency_ms=latency_ms)
+
+        with self._lock:
+            self.validators[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'data': data,
+            }
+
+        return UpstreamResponse(url, 200, data, ok=True, latency_ms=latency_ms)
+
+    @staticmethod
+    def _is_retryable(result: UpstreamResponse) -> bool:
+        """Network errors, throttling and server errors are worth retrying"""
+        return result.status_code == 0 or result.status_code == 429 or result.status_code >= 500
+
+    async def _fetch_with_retry(self, url: str, semaphore: asyncio.Semaphore, deadline: float,
+                                retries: int, backoff: float) -> UpstreamResponse:
+        """
+        Fetch one URL under the concurrency bound with a deadline and jittered backoff
+
+        The deadline is enforced inside the worker thread (socket timeouts plus
+        a total-time check while reading), so the thread itself stops and
+        asyncio.run does not wait on it past the deadline.
+        """
+        timeout = (min(DEFAULT_TIMEOUT[0], deadline), deadline)
+
+        for attempt in range(retries + 1):
+            async with semaphore:
+                result = await asyncio.to_thread(self._fetch_json, url, timeout, True, deadline)
+            self._record(url, result)
+
+            if result.ok or not self._is_retryable(result) or attempt == retries:
+                return result
+
+            delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.info(f"Retrying {url} in {delay:.2f}s (attempt {attempt + 2}/{retries + 1})")
+            await asyncio.sleep(delay)
+
+        return result
+
+    async def fetch_many_async(self, urls: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY,
+                               deadline: float = DEFAULT_DEADLINE, retries: int = DEFAULT_RETRIES,
+                               backoff: float = DEFAULT_BACKOFF) -> Dict[str, UpstreamResponse]:
+        """Fetch several URLs concurrently"""
+        urls = list(dict.fromkeys(urls))
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        results = await asyncio.gather(*(
+            self._fetch_with_retry(url, semaphore, deadline, retries, backoff) for url in urls
+        ))
+        return dict(zip(urls, results))
+
+    def fetch_many(self, urls: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY,
+                   deadline: float = DEFAULT_DEADLINE, retries: int = DEFAULT_RETRIES,
+                   backoff: float = DEFAULT_BACKOFF) -> Dict[str, UpstreamResponse]:
+        """
+        Fetch several URLs concurrently from synchronous code
+
+        Runs its own event loop, so it must be called from a thread that is
+        not already running one (the background cache threads).
+        """
+        return asyncio.run(self.fetch_many_async(urls, concurrency, deadline, retries, backoff))
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get a snapshot of the per-URL upstream counters"""
+        with self._lock:
+            snapshot = {}
+            for url, entry in self.metrics.items():
+                stats = dict(entry)
+                stats['avg_latency_ms'] = round(entry['total_latency_ms'] / entry['requests'], 2) if entry['requests'] else 0
+                stats['total_latency_ms'] = round(entry['total_latency_ms'], 2)
+                snapshot[url] = stats
+            return snapshot
+
+    def forget(self, url: Optional[str] = None):
+        """Drop remembered validators (all URLs if url is None)"""
+        with self._lock:
+            if url is None:
+                self.validators.clear()
+            else:
+                self.validators.pop(url, None)
+
+
+# Global instance
+upstream_client = UpstreamClient()
+
+# Convenience functions
+def fetch_upstream_json(url: str, timeout: Optional[Tuple[float, float]] = None, conditional: bool = True) -> UpstreamResponse:
+    """Fetch JSON from upstream using the global client"""
+    return upstream_client.fetch_json(url, timeout=timeout, conditional=conditional)
+
+def fetch_upstream_many(urls: Iterable[str], **kwargs) -> Dict[str, UpstreamResponse]:
+    """Fetch several upstream URLs concurrently using the global client"""
+    return upstream_client.fetch_many(urls, **kwargs)
+
+def get_upstream_metrics() -> Dict[str, Dict[str, Any]]:
+    """Get upstream latency and failure counters"""
+    return upstream_client.get_metrics()
@@ -0,0 +1,280 @@
+"""
+User Index Module
+Aggregates over the user store kept up to date on every save, so admin
+pages read counters instead of scanning every user
+"""
+
+import logging
+import os
+import threading
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Format of session timestamps in the user store; compares lexicographically
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Hours of session activity kept in the active-user buckets
+ACTIVITY_RETENTION_HOURS = 48
+
+# Statuses counted as premium on the admin dashboard
+PREMIUM_STATUSES = ('Premium', 'Premium (Aligned)')
+
+# Length of the n-grams indexed for username/email search
+NGRAM = 3
+
+
+def ngrams(text: str) -> set:
+    """Distinct NGRAM-character substrings of a text"""
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class UserIndex:
+    """
+    Derived view of the user store
+
+    Like the launcher presence table it is rebuilt from the user list on
+    every save_users call and when users.json changes on disk. The pass
+    over users only reads cheap fields; game sessions are bucketed
+    incrementally, so only sessions appended since the previous sync are
+    looked at.
+
+    active_hours: 'YYYY-mm-dd HH' -> {user_id: latest session timestamp in that hour}
+
+    For the admin user list it also keeps one compact row per user in
+    store order, a status index and a trigram index over lowercased
+    usernames and emails. Index entries are row positions in ascending
+    order, so filters intersect postings and pages are bisected without
+    building the matching user records. The trigram index is built on the
+    first search after a change.
+    """
+
+    def __init__(self, path: str, load_users: Callable[[], List[Dict[str, Any]]]):
+        self.path = path
+        self.load_users = load_users
+        self.counters: Dict[str, int] = {}
+        self.join_dates: Counter = Counter()
+        self.active_hours: Dict[str, Dict[str, str]] = {}
+        self._indexed_sessions: Dict[str, int] = {}  # user_id -> sessions already bucketed
+        self.rows: List[Dict[str, Any]] = []
+        self.positions: Dict[str, int] = {}
+        self.status_index: Dict[str, List[int]] = {}
+        self.trigrams: Optional[Dict[str, List[int]]] = None
+        self.search_keys: List[str] = []
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def ensure_current(self):
+        """Reload from the store if another process changed it since the last sync"""
+        signature = self._file_signature()
+        if signature is not None and signature == self._signature:
+            return
+        self.sync(self.load_users())
+
+    def sync(self, users: List[Dict[str, Any]], now: Optional[datetime] = None):
+        """Refresh the aggregates from a user list that was just written to the store"""
+        signature = self._file_signature()
+        now = now or datetime.now()
+        retention_cutoff = (now - timedelta(hours=ACTIVITY_RETENTION_HOURS)).strftime(TIMESTAMP_FORMAT)
+
+        counters = Counter()
+        join_dates = Counter()
+        rows = []
+        positions = {}
+        status_index = {}
+        search_keys = []
+
+        with self._lock:
+            seen_ids = set()
+            for user in users:
+                user_id = user.get('id')
+                if user_id is None:
+                    continue
+                seen_ids.add(user_id)
+
+                position = len(rows)
+                positions[user_id] = position
+                rows.append({
+                    'id': user_id,
+                    'username': user.get('username', ''),
+                    'email': user.get('email', ''),
+                    'status': user.get('status', ''),
+                    'joined': user.get('join_date', ''),
+                    'is_admin': user.get('is_admin', False),
+                    'launcher_connected': user.get('launcher_connected', False),
+                    'unique_id': user.get('unique_id', '')
+                })
+                status_index.setdefault((user.get('status') or '').lower(), []).append(position)
+                search_keys.append(f"{user.get('username', '').lower()}\x00{user.get('email', '').lower()}")
+
+                counters['total_users'] += 1
+                if user.get('status') in PREMIUM_STATUSES:
+                    counters['premium_users'] += 1
+                if user.get('launcher_connected', False):
+                    counters['online_users'] += 1
+                join_dates[user.get('join_date', '2000-01-01')] += 1
+
+                sessions = user.get('game_sessions', [])
+                counters['game_sessions'] += len(sessions)
+                self._index_sessions(user_id, sessions, retention_cutoff)
+
+            # Users deleted since the last sync
+            for user_id in list(self._indexed_sessions):
+                if user_id not in seen_ids:
+                    self._forget_sessions(user_id)
+
+            # Drop hours that fell out of the retention window
+            cutoff_hour = retention_cutoff[:13]
+            for hour in [hour for hour in self.active_hours if hour < cutoff_hour]:
+                del self.active_hours[hour]
+
+            self.counters = dict(counters)
+            self.join_dates = join_dates
+            self.rows = rows
+            self.positions = positions
+            self.status_index = status_index
+            self.search_keys = search_keys
+            self.trigrams = None
+            self._signature = signature
+
+    def _forget_sessions(self, user_id: str):
+        self._indexed_sessions.pop(user_id, None)
+        for bucket in self.active_hours.values():
+            bucket.pop(user_id, None)
+
+    def _index_sessions(self, user_id: str, sessions: List[Dict[str, Any]], retention_cutoff: str):
+        """Bucket sessions appended since the previous sync; re-index the user if sessions were removed"""
+        indexed = self._indexed_sessions.get(user_id, 0)
+        if len(sessions) < indexed:
+            self._forget_sessions(user_id)
+            indexed = 0
+
+        for session in sessions[indexed:]:
+            timestamp = session.get('timestamp', '')
+            if timestamp < retention_cutoff:
+                continue
+            bucket = self.active_hours.setdefault(timestamp[:13], {})
+            if timestamp > bucket.get(user_id, ''):
+                bucket[user_id] = timestamp
+
+        self._indexed_sessions[user_id] = len(sessions)
+
+    def active_users(self, since: datetime) -> int:
+        """Users with a game session at or after a point in time within the retention window"""
+        cutoff = since.strftime(TIMESTAMP_FORMAT)
+        cutoff_hour = cutoff[:13]
+        active = set()
+        with self._lock:
+            for hour, bucket in self.active_hours.items():
+                if hour > cutoff_hour:
+                    active.update(bucket)
+                elif hour == cutoff_hour:
+                    active.update(user_id for user_id, timestamp in bucket.items() if timestamp >= cutoff)
+        return len(active)
+
+    def new_users(self, since: datetime, now: datetime) -> int:
+        """Users whose join date (taken as midnight) falls between since and now"""
+        total = 0
+        day = since.date()
+        while day <= now.date():
+            if datetime.combine(day, datetime.min.time()) >= since:
+                total += self.join_dates.get(day.strftime('%Y-%m-%d'), 0)
+            day += timedelta(days=1)
+        return total
+
+    def dashboard_stats(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Counters for the admin dashboard"""
+        self.ensure_current()
+        now = now or datetime.now()
+        yesterday = now - timedelta(days=1)
+        counters = self.counters
+        return {
+            'total_users': counters.get('total_users', 0),
+            'premium_users': counters.get('premium_users', 0),
+            'online_users': counters.get('online_users', 0),
+            'game_sessions': counters.get('game_sessions', 0),
+            'daily_users': self.active_users(yesterday),
+            'new_users': self.new_users(yesterday, now),
+        }
+
+    def _search_index(self) -> Dict[str, List[int]]:
+        """Trigram postings over search keys, built on first use after a change"""
+        with self._lock:
+            if self.trigrams is None:
+                trigrams = {}
+                for position, key in enumerate(self.search_keys):
+                    for gram in ngrams(key):
+                        trigrams.setdefault(gram, []).append(position)
+                self.trigrams = trigrams
+            return self.trigrams
+
+    def _search(self, q: str) -> List[int]:
+        """Positions whose username or email contains q (lowercase)"""
+        search_keys = self.search_keys
+        if len(q) < NGRAM:
+            return [position for position, key in enumerate(search_keys) if q in key]
+
+        trigrams = self._search_index()
+        postings = sorted((trigrams.get(gram, []) for gram in ngrams(q)), key=len)
+        if not postings[0]:
+            return []
+
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return sorted(position for position in candidates if q in search_keys[position])
+
+    def query_users(self, status: Optional[str] = None, q: str = '', page: int = 1, per_page: int = 5,
+                    cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of the admin user list
+
+        status and q filter like the original list comprehension (status
+        equality and username/email substring, case-insensitive). With a
+        cursor (the id of the last user of the previous page) the page
+        starts after that user and page is ignored.
+        Returns {'users', 'total', 'next_cursor'}; raises ValueError for an unknown cursor.
+        """
+        self.ensure_current()
+        rows = self.rows
+
+        matches = range(len(rows))
+        if status and status != 'all':
+            matches = self.status_index.get(status.lower(), [])
+        if q:
+            found = self._search(q.lower())
+            if isinstance(matches, range):
+                matches = found
+            else:
+                in_status = set(matches)
+                matches = [position for position in found if position in in_status]
+
+        if cursor is not None:
+            if cursor not in self.positions:
+                raise ValueError('Unknown cursor')
+            start = bisect_right(matches, self.positions[cursor])
+        else:
+            start = (max(page, 1) - 1) * per_page
+
+        page_positions = matches[start:start + per_page]
+        next_cursor = None
+        if start + per_page < len(matches) and len(page_positions):
+            next_cursor = rows[page_positions[-1]]['id']
+
+        return {
+            'users': [dict(rows[position]) for position in page_positions],
+            'total': len(matches),
+            'next_cursor': next_cursor
+        }